@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Async (ASGI) serving mode for the leaf analysis API
+Request and upload I/O run on the event loop; decoding, OpenCV analysis and
+inference run on a dedicated thread pool. At most ASYNC_MAX_PENDING analyses
+are admitted at once and further requests get an immediate 503 with
+Retry-After instead of queueing behind a saturated pool.
+
+Run with:
+    uvicorn asgi_server:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Match, Route
+
+# Shares Config, the model manager, inference batcher, prediction cache and pipeline with the Flask app
+import metrics
+import server
+
+logger = logging.getLogger(__name__)
+
+config = server.app.config
+
+class AdmissionGate:
+    """Non-blocking bound on the number of requests inside the analysis pipeline"""
+    
+    def __init__(self, max_pending: int):
+        self.max_pending = max(1, max_pending)
+        self.pending = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+    
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self.pending += 1
+            return True
+    
+    def release(self):
+        with self._lock:
+            self.pending -= 1
+    
+    def stats(self):
+        with self._lock:
+            return {'pending': self.pending, 'max_pending': self.max_pending, 'rejected': self.rejected}
+
+analysis_executor = ThreadPoolExecutor(max_workers=max(1, config['ASYNC_WORKERS']), thread_name_prefix='analysis')
+admission = AdmissionGate(config['ASYNC_MAX_PENDING'])
+
+def error_response(message, status_code, headers=None):
+    return JSONResponse({'error': message}, status_code=status_code, headers=headers)
+
+def saturated_response():
+    """Fast rejection while the analysis pipeline is full"""
+    return error_response('Server busy, retry shortly', 503,
+                          headers={'Retry-After': str(config['ASYNC_RETRY_AFTER'])})
+
+def too_large_response(max_bytes):
+    return JSONResponse({'error': 'File too large', 'max_size': server.format_mb(max_bytes)}, status_code=413)
+
+class BodyTooLarge(Exception):
+    """The request body grew past the upload limit while being read"""
+
+def limit_body(request, max_bytes):
+    """The same request, with a body stream that raises BodyTooLarge after max_bytes
+    
+    Content-Length can be missing (chunked uploads) or wrong, so the bytes are
+    counted as they arrive and reading stops at the limit.
+    """
+    received = 0
+    
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > max_bytes:
+                raise BodyTooLarge(f"Request body exceeds {server.format_mb(max_bytes)}")
+        return message
+    
+    return Request(request.scope, receive)
+
+async def read_form(request, max_bytes):
+    """Parse a multipart form, reading at most max_bytes of body"""
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise BodyTooLarge(f"Content-Length exceeds {server.format_mb(max_bytes)}")
+    return await limit_body(request, max_bytes).form()
+
+async def run_in_pool(func, *args):
+    """Run a CPU-bound pipeline stage on the analysis pool"""
+    return await asyncio.get_running_loop().run_in_executor(analysis_executor, func, *args)
+
+async def analyze_leaf(request):
+    """Main endpoint for leaf analysis"""
+    # Reject before reading the body so a saturated server sheds load cheaply
+    if not admission.try_acquire():
+        return saturated_response()
+    
+    try:
+        try:
+            form = await read_form(request, config['MAX_CONTENT_LENGTH'])
+        except BodyTooLarge:
+            return too_large_response(config['MAX_CONTENT_LENGTH'])
+        try:
+            image_file = form.get('image')
+            if image_file is None or isinstance(image_file, str):
+                return error_response('No image file provided', 400)
+            if image_file.filename == '':
+                return error_response('No image selected', 400)
+            
+            model_id = form.get('model', 'model1')
+            if not server.is_known_model(model_id):
+                return error_response(f'Invalid model: {model_id}', 400)
+            
+            if not server.allowed_file(image_file.filename):
+                return error_response(f'Invalid file type. Allowed: {", ".join(config["ALLOWED_EXTENSIONS"])}', 400)
+            
+            if not server.is_model_ready(model_id):
+                return error_response(f'Model not loaded: {model_id}', 503)
+            
+            logger.info(f"Processing image: {image_file.filename} with model: {model_id}")
+            
+            if config['MOCK_MODE']:
+                await asyncio.sleep(2)  # Simulated processing delay without holding a thread
+                return JSONResponse(server.generate_mock_analysis(model_id, delay=0))
+            
+            image_bytes = await image_file.read()
+            filename = image_file.filename
+        finally:
+            await form.close()
+        
+        profile_id = None
+        requested = server.profile_requested(request.headers.get('x-profile', request.query_params.get('profile')),
+                                             request.headers.get('x-admin-token'))
+        if server.request_profiler.should_profile(requested):
+            response, cache_status, tier, profile_id = await run_in_pool(
+                server.analyze_upload_profiled, model_id, image_bytes, filename, requested)
+        else:
+            response, cache_status, tier = await run_in_pool(server.analyze_upload, model_id, image_bytes, filename)
+        headers = {'X-Cache': cache_status}
+        if tier:
+            headers['X-Cache-Tier'] = tier
+        if profile_id:
+            headers['X-Profile-Id'] = profile_id
+        return JSONResponse(response, headers=headers)
+    
+    except Exception as e:
+        logger.error(f"Error in analyze_leaf: {str(e)}")
+        return error_response(f'Analysis failed: {str(e)}', 500)
+    finally:
+        admission.release()
+
+async def get_available_models(request):
+    """Get list of available models"""
+    try:
+        return JSONResponse({'models': server.model_manager.get_available_models()})
+    except Exception as e:
+        logger.error(f"Error getting models: {str(e)}")
+        return error_response('Failed to get models list', 500)
+
+async def health_check(request):
+    """Health check endpoint"""
+    try:
+        ready = server.models_ready()
+        return JSONResponse({
+            'status': 'healthy' if ready else 'warming_up',
+            'ready': ready,
+            'models_loaded': server.count_loaded_models(),
+            'total_models': len(config['MODEL_CONFIG']),
+            'upload_folder_exists': os.path.exists(config['UPLOAD_FOLDER']),
+            'model_folder_exists': os.path.exists(config['MODEL_FOLDER']),
+            'mode': server.serving_mode()
+        }, status_code=200 if ready else 503)
+    except Exception as e:
+        logger.error(f"Health check failed: {str(e)}")
+        return JSONResponse({'status': 'unhealthy', 'error': str(e)}, status_code=500)
+
+async def liveness_check(request):
+    """Liveness probe: answered on the event loop, independent of the analysis pool and models"""
+    return JSONResponse(server.liveness())
+
+async def readiness_check(request):
+    """Readiness probe: 503 until startup model loading and warmup finish"""
+    body, status_code = server.readiness()
+    return JSONResponse(body, status_code=status_code)
+
+async def admin_reload_model(request):
+    """Load, warm up and atomically swap in the model file currently on disk"""
+    if not server.admin_authorized(request.headers.get('x-admin-token')):
+        return error_response('Admin token required', 403)
+    body, status_code = await run_in_pool(server.reload_model, request.path_params['model_id'])
+    return JSONResponse(body, status_code=status_code)
+
+async def admin_list_profiles(request):
+    """Saved request profiles, newest first"""
+    if not server.admin_authorized(request.headers.get('x-admin-token')):
+        return error_response('Admin token required', 403)
+    profiler = server.request_profiler
+    return JSONResponse({
+        'sample_every': profiler.sample_every,
+        'tf_trace': profiler.tf_trace,
+        'profiles': await run_in_pool(profiler.list_profiles)
+    })
+
+async def admin_download_profile(request):
+    """Download a profile as raw cProfile stats (?format=prof), a text summary (text) or a TF trace (tf)"""
+    if not server.admin_authorized(request.headers.get('x-admin-token')):
+        return error_response('Admin token required', 403)
+    profile_id = request.path_params['profile_id']
+    exported = await run_in_pool(server.request_profiler.export, profile_id, request.query_params.get('format', 'prof'))
+    if exported is None:
+        return error_response(f'Profile not found: {profile_id}', 404)
+    filename, data, content_type = exported
+    return Response(data, headers={'Content-Type': content_type,
+                                   'Content-Disposition': f'attachment; filename="{filename}"'})
+
+async def admission_stats(request):
+    """Admission queue occupancy and rejection count"""
+    return JSONResponse({'workers': config['ASYNC_WORKERS'], **admission.stats()})
+
+async def prometheus_metrics(request):
+    """Prometheus text exposition of this process's metrics"""
+    return Response(metrics.render(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+class MetricsMiddleware:
+    """Count, time and track in-flight HTTP requests by route template"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not config['METRICS_ENABLED']:
+            await self.app(scope, receive, send)
+            return
+        
+        started = time.perf_counter()
+        route = route_of(scope)
+        status = {'code': 500}
+        metrics.HTTP_IN_FLIGHT.inc(route=route)
+        
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+                metrics.HTTP_SECONDS.observe(time.perf_counter() - started, route=route)
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.HTTP_IN_FLIGHT.dec(route=route)
+            metrics.HTTP_REQUESTS.inc(route=route, method=scope['method'], status=status['code'])
+
+def route_of(scope):
+    """Path template of the route matching scope, so path parameters do not explode label cardinality"""
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return 'unmatched'
+
+async def not_found(request, exc):
+    if request.url.path.startswith('/api/'):
+        return error_response('API endpoint not found', 404)
+    return PlainTextResponse('Page not found', status_code=404)
+
+@asynccontextmanager
+async def lifespan(app):
+    server.start_model_watcher()
+    yield
+    analysis_executor.shutdown(wait=False)
+
+app = Starlette(
+    routes=[
+        Route('/api/analyze-leaf', analyze_leaf, methods=['POST']),
+        Route('/api/models', get_available_models, methods=['GET']),
+        Route('/api/health', health_check, methods=['GET']),
+        Route('/api/health/live', liveness_check, methods=['GET']),
+        Route('/api/health/ready', readiness_check, methods=['GET']),
+        Route('/api/admission/stats', admission_stats, methods=['GET']),
+        Route('/api/admin/models/{model_id}/reload', admin_reload_model, methods=['POST']),
+        Route('/api/admin/profiles', admin_list_profiles, methods=['GET']),
+        Route('/api/admin/profiles/{profile_id}', admin_download_profile, methods=['GET']),
+        Route('/metrics', prometheus_metrics, methods=['GET'])
+    ],
+    middleware=[Middleware(MetricsMiddleware),
+                Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    exception_handlers={404: not_found},
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    
+    port = int(os.environ.get('PORT', 5000))
+    logger.info(f"Starting async server on http://localhost:{port} "
+                f"({config['ASYNC_WORKERS']} analysis threads, up to {config['ASYNC_MAX_PENDING']} pending)")
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -0,0 +1 @@
+"""Benchmarks for the image preprocessing, analysis and inference hot paths"""
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Accuracy/speed report for reduced-resolution colour-mask analysis
+Compares LAI and disease severity computed at several ANALYSIS_MAX_SIDE
+settings against full resolution, so a setting can be picked per deployment.
+
+Example:
+    python -m benchmarks.analysis_resolution samples/ --max-sides 512 1024 2048
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from config import Config
+from model_utils import ImageProcessor, LeafImage
+
+def iter_sample_files(paths):
+    """Yield image files from the given files and directories"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.rsplit('.', 1)[-1].lower() in Config.ALLOWED_EXTENSIONS:
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def compare_analysis_resolution(data, settings: List[Tuple[str, int]]) -> List[Dict]:
+    """Measure LAI/severity error and cost of reduced analysis resolutions
+    
+    settings is a list of (analysis_mode, analysis_max_side); the first row
+    of the result is always the full-resolution reference.
+    """
+    if hasattr(data, 'read'):
+        data = data.read()
+    
+    rows = []
+    reference = None
+    for mode, max_side in [('resize', None)] + list(settings):
+        started = time.perf_counter()
+        leaf_image = LeafImage.from_bytes(data, analysis_max_side=max_side, analysis_mode=mode)
+        if leaf_image is None:
+            raise ValueError('Could not decode image')
+        lai = ImageProcessor.leaf_area_index_from_hsv(leaf_image.hsv)
+        severity = ImageProcessor.disease_severity_from_hsv(leaf_image.hsv)
+        elapsed = time.perf_counter() - started
+        
+        if reference is None:
+            reference = (lai, severity)
+        rows.append({
+            'mode': 'full' if max_side is None else mode,
+            'max_side': max_side,
+            'analysis_size': leaf_image.rgb.shape[1::-1],
+            'leaf_area_index': lai,
+            'disease_severity': severity,
+            'lai_error': round(abs(lai - reference[0]), 2),
+            'severity_error': abs(severity - reference[1]),
+            'seconds': elapsed
+        })
+    return rows
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Compare reduced-resolution LAI/severity against full resolution')
+    parser.add_argument('samples', nargs='+', help='Sample images or directories')
+    parser.add_argument('--max-sides', type=int, nargs='+', default=[512, 1024, 2048],
+                        help='Analysis max side lengths to evaluate')
+    parser.add_argument('--modes', nargs='+', default=['resize', 'stride'], choices=['resize', 'stride'],
+                        help='Reduction modes to evaluate')
+    args = parser.parse_args(argv)
+    
+    settings = [(mode, max_side) for mode in args.modes for max_side in args.max_sides]
+    totals = defaultdict(lambda: {'count': 0, 'lai_error': 0.0, 'lai_max': 0.0,
+                                  'severity_error': 0, 'severity_max': 0, 'seconds': 0.0})
+    
+    for path in iter_sample_files(args.samples):
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            rows = compare_analysis_resolution(data, settings)
+        except ValueError as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            continue
+        
+        for row in rows:
+            total = totals[(row['mode'], row['max_side'])]
+            total['count'] += 1
+            total['lai_error'] += row['lai_error']
+            total['lai_max'] = max(total['lai_max'], row['lai_error'])
+            total['severity_error'] += row['severity_error']
+            total['severity_max'] = max(total['severity_max'], row['severity_error'])
+            total['seconds'] += row['seconds']
+    
+    if not totals:
+        print("No readable sample images found", file=sys.stderr)
+        return 1
+    
+    print(f"{'setting':<16}{'images':>8}{'ms/img':>10}{'speedup':>9}"
+          f"{'LAI err':>10}{'LAI max':>9}{'sev err':>9}{'sev max':>9}")
+    reference_ms = None
+    for (mode, max_side), total in totals.items():
+        count = total['count']
+        ms = total['seconds'] / count * 1000
+        reference_ms = reference_ms or ms
+        label = 'full' if max_side is None else f"{mode}@{max_side}"
+        print(f"{label:<16}{count:>8}{ms:>10.1f}{reference_ms / ms:>8.1f}x"
+              f"{total['lai_error'] / count:>10.2f}{total['lai_max']:>9.1f}"
+              f"{total['severity_error'] / count:>9.1f}{total['severity_max']:>9}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
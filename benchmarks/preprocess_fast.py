@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Speed/accuracy report for fast model preprocessing
+Compares JPEG draft decoding plus a cheap resize against the full decode and
+LANCZOS resize, as pixel differences and (optionally) top-1 model agreement.
+
+Example:
+    python -m benchmarks.preprocess_fast samples/ --model model1
+    python -m benchmarks.preprocess_fast --synthetic 0.3 3 12
+"""
+import argparse
+import io
+import sys
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.analysis_resolution import iter_sample_files
+from benchmarks.samples import synthetic_set
+from model_utils import ImageProcessor
+
+def iter_inputs(args):
+    """Yield (name, bytes) for sample files and synthetic images"""
+    for path in iter_sample_files(args.samples):
+        with open(path, 'rb') as f:
+            yield path, f.read()
+    yield from synthetic_set(args.synthetic, args.per_size)
+
+def compare_preprocessing(data, target_size: Tuple[int, int]) -> Dict:
+    """Time the LANCZOS and fast preprocessing paths on one encoded image
+    
+    Both include decoding; the tensor difference is measured in 0-255 pixel units.
+    """
+    if hasattr(data, 'read'):
+        data = data.read()
+    target_size = tuple(target_size)
+    
+    tensors = {}
+    seconds = {}
+    for mode in ('lanczos', 'fast'):
+        started = time.perf_counter()
+        tensors[mode] = ImageProcessor.preprocess_bytes_for_model(data, target_size, fast=(mode == 'fast'))
+        seconds[mode] = time.perf_counter() - started
+        if tensors[mode] is None:
+            raise ValueError('Could not decode image')
+    
+    difference = np.abs(tensors['fast'] - tensors['lanczos']) * 255.0
+    return {
+        'tensors': tensors,
+        'seconds': seconds,
+        'mean_abs_diff': float(difference.mean()),
+        'max_abs_diff': float(difference.max())
+    }
+
+def load_model(model_id):
+    """Load one configured model or exit"""
+    from config import Config
+    from model_utils import ModelManager
+    
+    if model_id not in Config.MODEL_CONFIG:
+        raise SystemExit(f"Unknown model: {model_id}")
+    manager = ModelManager({model_id: Config.MODEL_CONFIG[model_id]}, lazy=True)
+    model = manager.get_model(model_id)
+    if model is None:
+        raise SystemExit(f"Could not load {model_id}")
+    return model
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Compare fast preprocessing against the LANCZOS path')
+    parser.add_argument('samples', nargs='*', help='Sample images or directories')
+    parser.add_argument('--synthetic', type=float, nargs='*', default=[],
+                        help='Also generate synthetic JPEGs of these sizes in megapixels')
+    parser.add_argument('--per-size', type=int, default=3, help='Synthetic images per size (default: 3)')
+    parser.add_argument('--size', type=int, nargs=2, default=[224, 224], help='Model input size (default: 224 224)')
+    parser.add_argument('--model', help='Model ID from MODEL_CONFIG for a top-1 agreement check')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per image, best kept (default: 3)')
+    args = parser.parse_args(argv)
+    
+    model = load_model(args.model) if args.model else None
+    target_size = tuple(args.size)
+    
+    print(f"{'image':<36}{'pixels':>12}{'lanczos ms':>12}{'fast ms':>9}{'speedup':>9}"
+          f"{'mean diff':>11}{'max diff':>10}{'top-1':>7}")
+    rows = []
+    for name, data in iter_inputs(args):
+        try:
+            runs = [compare_preprocessing(data, target_size) for _ in range(max(1, args.repeat))]
+        except ValueError as e:
+            print(f"Skipping {name}: {e}", file=sys.stderr)
+            continue
+        
+        result = runs[0]
+        lanczos = min(run['seconds']['lanczos'] for run in runs)
+        fast = min(run['seconds']['fast'] for run in runs)
+        agree = ''
+        if model is not None:
+            predictions = np.asarray(model.predict_on_batch(
+                np.concatenate([result['tensors']['lanczos'], result['tensors']['fast']], axis=0)))
+            agree = 'yes' if np.argmax(predictions[0]) == np.argmax(predictions[1]) else 'no'
+        
+        width, height = Image.open(io.BytesIO(data)).size
+        rows.append((lanczos, fast, result['mean_abs_diff'], agree))
+        print(f"{name[-36:]:<36}{width * height / 1e6:>11.1f}M{lanczos * 1000:>12.1f}{fast * 1000:>9.1f}"
+              f"{lanczos / fast:>8.1f}x{result['mean_abs_diff']:>11.2f}{result['max_abs_diff']:>10.1f}{agree:>7}")
+    
+    if not rows:
+        print("No readable images; pass sample paths or --synthetic sizes", file=sys.stderr)
+        return 1
+    
+    total_lanczos = sum(row[0] for row in rows)
+    total_fast = sum(row[1] for row in rows)
+    summary = f"\n{len(rows)} images: {total_lanczos / total_fast:.1f}x faster overall, " \
+              f"mean pixel diff {np.mean([row[2] for row in rows]):.2f}/255"
+    if model is not None:
+        summary += f", top-1 agreement {sum(row[3] == 'yes' for row in rows)}/{len(rows)}"
+    print(summary)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
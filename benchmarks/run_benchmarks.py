@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Repeatable benchmarks for the preprocessing, analysis and inference hot paths
+Times decoding, model preprocessing, LAI, disease severity and damage scoring
+on synthetic leaf photos of several resolutions, and ModelManager inference at
+several batch sizes (with a stand-in Keras model when the .h5 is missing).
+Results can be saved as a JSON baseline and compared against a later run.
+
+Example:
+    python -m benchmarks.run_benchmarks --save benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --compare benchmarks/baseline.json --tolerance 0.15
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+import lazy_imports
+from benchmarks.samples import synthetic_jpeg
+from model_utils import ImageProcessor, LeafImage, ModelManager, PredictionAnalyzer
+
+DEFAULT_MEGAPIXELS = [0.3, 3, 12, 48]
+DEFAULT_BATCH_SIZES = [1, 8, 32]
+
+def time_runs(func: Callable, repeat: int, warmup: int = 1, setup: Optional[Callable] = None,
+              calls: int = 1) -> Dict:
+    """Median/min/max milliseconds per call of func over repeat runs; setup's result is passed in untimed"""
+    timings = []
+    for run in range(warmup + repeat):
+        argument = setup() if setup else None
+        started = time.perf_counter()
+        for _ in range(calls):
+            func(argument) if setup else func()
+        elapsed = (time.perf_counter() - started) * 1000 / calls
+        if run >= warmup:
+            timings.append(elapsed)
+    return {
+        'median_ms': round(float(np.median(timings)), 3),
+        'min_ms': round(float(np.min(timings)), 3),
+        'max_ms': round(float(np.max(timings)), 3),
+        'runs': repeat
+    }
+
+def stand_in_model(config: Dict, directory: str) -> str:
+    """Save an untrained MobileNetV2 with the model's input and class count, returning its path"""
+    import tensorflow as tf
+    
+    model = tf.keras.applications.MobileNetV2(
+        input_shape=(*config['image_size'], config.get('input_channels', 3)),
+        weights=None, classes=len(config['classes'])
+    )
+    path = os.path.join(directory, 'stand_in.h5')
+    model.save(path)
+    return path
+
+def image_benchmarks(megapixels: List[float], target_size, repeat: int) -> Dict[str, Dict]:
+    """Per-image pipeline stages at each resolution"""
+    results = {}
+    for mp in megapixels:
+        data = synthetic_jpeg(mp)
+        pixels = Image.open(io.BytesIO(data))
+        pixels.load()
+        
+        def fresh_image():
+            # A new wrapper each run, so memoized RGB/HSV/metrics are recomputed
+            return LeafImage(pixels)
+        
+        stages = {
+            'decode': time_runs(lambda: LeafImage.from_bytes(data), repeat),
+            'preprocess': time_runs(lambda: ImageProcessor.preprocess_bytes_for_model(data, target_size), repeat),
+            'preprocess_fast': time_runs(
+                lambda: ImageProcessor.preprocess_bytes_for_model(data, target_size, fast=True), repeat),
+            'leaf_area_index': time_runs(ImageProcessor.calculate_leaf_area_index, repeat, setup=fresh_image),
+            'disease_severity': time_runs(ImageProcessor.analyze_disease_severity, repeat, setup=fresh_image)
+        }
+        for stage, result in stages.items():
+            results[f"{stage}@{mp:g}mp"] = result
+        print(f"  {mp:g} MP ({pixels.size[0]}x{pixels.size[1]}): "
+              + ', '.join(f"{stage} {result['median_ms']:.1f}ms" for stage, result in stages.items()),
+              flush=True)
+    return results
+
+def damage_benchmark(classes: List[str], repeat: int) -> Dict:
+    """calculate_damage_percentage per call, given a precomputed image severity"""
+    predictions = np.random.default_rng(0).dirichlet(np.ones(len(classes)), size=1).astype(np.float32)
+    result = time_runs(lambda: PredictionAnalyzer.calculate_damage_percentage(predictions, classes, image_damage=40),
+                       repeat, calls=1000)
+    print(f"  damage_percentage: {result['median_ms'] * 1000:.1f}us per call", flush=True)
+    return result
+
+def inference_benchmarks(model_id: str, config: Dict, batch_sizes: List[int], repeat: int) -> Dict[str, Dict]:
+    """ModelManager load, warmup and predict_on_batch at each batch size"""
+    manager = ModelManager({model_id: config}, lazy=True, prefer_optimized=False, warmup_batch_sizes=batch_sizes)
+    started = time.perf_counter()
+    if not manager.load_model(model_id):
+        raise SystemExit(f"Could not load {config['model_path']}")
+    results = {'model_load_and_warmup': {'median_ms': round((time.perf_counter() - started) * 1000, 3), 'runs': 1}}
+    
+    rng = np.random.default_rng(0)
+    shape = (*config['image_size'], config.get('input_channels', 3))
+    for batch_size in batch_sizes:
+        inputs = rng.random((batch_size, *shape), dtype=np.float32)
+        with manager.lease(model_id) as model:
+            result = time_runs(lambda: model.predict_on_batch(inputs), repeat)
+        result['ms_per_image'] = round(result['median_ms'] / batch_size, 3)
+        results[f"inference@bs{batch_size}"] = result
+        print(f"  batch {batch_size}: {result['median_ms']:.1f}ms ({result['ms_per_image']:.2f}ms/image)", flush=True)
+    return results
+
+def environment() -> Dict:
+    # Read from package metadata, so --skip-inference runs never start TensorFlow
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'tensorflow': lazy_imports.module_version('tensorflow'),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> int:
+    """Print median changes against a baseline and return the number of regressions"""
+    for key in ('environment', 'model'):
+        if current.get(key) != baseline.get(key):
+            print(f"Warning: {key} differs from the baseline ({baseline.get(key)} vs {current.get(key)})")
+    
+    regressions = 0
+    print(f"\n{'benchmark':<32}{'baseline ms':>13}{'current ms':>12}{'change':>9}")
+    for name, result in current['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            print(f"{name:<32}{'-':>13}{result['median_ms']:>12.3f}{'new':>9}")
+            continue
+        ratio = result['median_ms'] / reference['median_ms'] if reference['median_ms'] else 1.0
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif ratio < 1 - tolerance:
+            flag = '  faster'
+        print(f"{name:<32}{reference['median_ms']:>13.3f}{result['median_ms']:>12.3f}{(ratio - 1) * 100:>+8.0f}%{flag}")
+    
+    print(f"\n{regressions} regression(s) beyond {tolerance * 100:.0f}%")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the preprocessing, analysis and inference hot paths')
+    parser.add_argument('--megapixels', type=float, nargs='+', default=DEFAULT_MEGAPIXELS,
+                        help='Synthetic image sizes (default: 0.3 3 12 48)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES,
+                        help='Inference batch sizes (default: 1 8 32)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (default: 5)')
+    parser.add_argument('--model', default='model1', help='Model ID from MODEL_CONFIG (default: model1)')
+    parser.add_argument('--stand-in', action='store_true', help='Use the stand-in model even if the .h5 exists')
+    parser.add_argument('--skip-inference', action='store_true', help='Only benchmark the image stages')
+    parser.add_argument('--save', help='Write results to this JSON baseline file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Median slowdown flagged as a regression (default: 0.15 = 15%%)')
+    args = parser.parse_args(argv)
+    
+    from config import Config
+    if args.model not in Config.MODEL_CONFIG:
+        print(f"Unknown model: {args.model}", file=sys.stderr)
+        return 2
+    config = dict(Config.MODEL_CONFIG[args.model])
+    target_size = tuple(config['image_size'])
+    
+    print(f"Image stages ({args.repeat} runs each, median shown):")
+    results = image_benchmarks(args.megapixels, target_size, args.repeat)
+    results['damage_percentage'] = damage_benchmark(config['classes'], args.repeat)
+    
+    model_source = None
+    if not args.skip_inference:
+        with tempfile.TemporaryDirectory() as directory:
+            model_source = 'real'
+            if args.stand_in or not os.path.exists(config['model_path']):
+                config['model_path'] = stand_in_model(config, directory)
+                model_source = 'stand-in'
+            print(f"\nInference ({model_source} {args.model} model):")
+            results.update(inference_benchmarks(args.model, config, args.batch_sizes, args.repeat))
+    
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'model': {'id': args.model, 'source': model_source},
+        'settings': {'megapixels': args.megapixels, 'batch_sizes': args.batch_sizes, 'repeat': args.repeat},
+        'results': results
+    }
+    
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+    
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        return 1 if compare(report, baseline, args.tolerance) else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Synthetic leaf photos for benchmarks when no sample images are at hand"""
+import io
+from typing import Iterator, List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Aspect ratio of typical phone photos
+ASPECT = 4 / 3
+
+def synthetic_leaf(megapixels: float, seed: int = 0) -> np.ndarray:
+    """H x W x 3 uint8 RGB image: a green leaf with brown/yellow lesions on soil"""
+    rng = np.random.default_rng(seed)
+    height = max(16, int(round((megapixels * 1e6 / ASPECT) ** 0.5)))
+    width = max(16, int(round(height * ASPECT)))
+    
+    image = np.empty((height, width, 3), np.uint8)
+    image[:] = (96, 72, 48)  # Soil background
+    center = (width // 2, height // 2)
+    axes = (int(width * 0.4), int(height * 0.3))
+    cv2.ellipse(image, center, axes, int(rng.integers(0, 180)), 0, 360, (60, 150, 50), -1)
+    
+    # Lesions scaled to the image so every resolution has similar coverage
+    for _ in range(24):
+        radius = max(1, int(min(height, width) * rng.uniform(0.01, 0.05)))
+        spot = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        colour = (140, 90, 30) if rng.random() < 0.6 else (210, 190, 40)
+        cv2.circle(image, spot, radius, colour, -1)
+    
+    # Sensor-like noise keeps JPEG sizes and colour masks realistic
+    noise = rng.normal(0, 6, size=(height, width, 1)).astype(np.int16)
+    return np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+def synthetic_jpeg(megapixels: float, seed: int = 0, quality: int = 90) -> bytes:
+    """Encoded JPEG bytes for a synthetic leaf photo"""
+    buffer = io.BytesIO()
+    Image.fromarray(synthetic_leaf(megapixels, seed)).save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+def synthetic_set(megapixels: List[float], per_size: int = 1) -> Iterator[Tuple[str, bytes]]:
+    """Yield (name, JPEG bytes) for each requested resolution"""
+    for mp in megapixels:
+        for seed in range(per_size):
+            yield f"synthetic_{mp:g}mp_{seed}.jpg", synthetic_jpeg(mp, seed)
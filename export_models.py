@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Export MODEL_CONFIG models to optimized serving artifacts
+Writes a SavedModel with a traced tf.function signature (and optionally a
+TFLite flatbuffer) next to each .h5 file, where ModelManager picks it up in
+preference to the .h5. Reports load time, per-image latency and output parity
+of every artifact against the .h5 it was exported from.
+
+Example:
+    python export_models.py --model model1 --format savedmodel tflite --samples samples/
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from config import Config
+from model_utils import SERVING_FORMATS, ImageProcessor, SavedModelAdapter, TFLiteAdapter, serving_artifact_path
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('export_models')
+
+def export_savedmodel(model, config: Dict, path: str):
+    """Save the model's forward pass as a serving signature with a fixed input spec"""
+    input_spec = tf.TensorSpec([None, *config['image_size'], config.get('input_channels', 3)],
+                               tf.float32, name='inputs')
+    
+    @tf.function(input_signature=[input_spec])
+    def serve(inputs):
+        return {'predictions': model(inputs, training=False)}
+    
+    module = tf.Module()
+    module.model = model  # Tracks the weights
+    module.serve = serve
+    
+    # Write beside the target and swap in, so a running server never sees half an export
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tf.saved_model.save(module, tmp_path, signatures={'serving_default': serve})
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+def export_tflite(model, path: str, quantization: Optional[str] = None, representative_data=None):
+    """Convert the model to a TFLite flatbuffer
+    
+    quantization is None (float32), 'dynamic' (int8 weights, float activations)
+    or 'int8' (integer-only kernels calibrated on representative_data, a
+    callable yielding [float32 batch] lists, with uint8 input).
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'int8':
+        converter.representative_dataset = representative_data
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(converter.convert())
+    os.replace(tmp_path, path)
+
+def load_artifact(path: str, serving_format: str):
+    """Load an exported artifact the way ModelManager does"""
+    if serving_format == 'savedmodel':
+        return SavedModelAdapter(path)
+    return TFLiteAdapter(path)
+
+def parity_inputs(config: Dict, samples: List[str], count: int) -> np.ndarray:
+    """Preprocessed sample images, topped up with random inputs"""
+    size = tuple(config['image_size'])
+    tensors = []
+    for path in samples[:count]:
+        tensor = ImageProcessor.preprocess_for_model(path, size)
+        if tensor is not None:
+            tensors.append(tensor)
+    
+    rng = np.random.default_rng(0)
+    while len(tensors) < count:
+        tensors.append(rng.random((1, *size, config.get('input_channels', 3)), dtype=np.float32))
+    return np.concatenate(tensors, axis=0)
+
+def median_latency_ms(model, inputs: np.ndarray, repeat: int) -> float:
+    """Median per-image latency of predict_on_batch after one warmup call"""
+    model.predict_on_batch(inputs)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        model.predict_on_batch(inputs)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings)) * 1000 / len(inputs)
+
+def measure(name: str, model, load_seconds: float, inputs: np.ndarray, reference: Optional[np.ndarray],
+            batch_sizes: List[int], repeat: int) -> Tuple[Dict, np.ndarray]:
+    outputs = np.asarray(model.predict_on_batch(inputs))
+    row = {
+        'artifact': name,
+        'load_s': load_seconds,
+        'latency_ms': {batch_size: median_latency_ms(model, inputs[:batch_size], repeat) for batch_size in batch_sizes}
+    }
+    if reference is not None:
+        row['max_abs_diff'] = float(np.abs(outputs - reference).max())
+        row['top1_agreement'] = float(np.mean(np.argmax(outputs, axis=1) == np.argmax(reference, axis=1)))
+    return row, outputs
+
+def export_model(model_id: str, config: Dict, formats: List[str], samples: List[str],
+                 batch_sizes: List[int], repeat: int) -> List[Dict]:
+    """Export one model and measure every artifact against the .h5"""
+    model_path = config['model_path']
+    started = time.perf_counter()
+    model = tf.keras.models.load_model(model_path, compile=False)
+    h5_load = time.perf_counter() - started
+    
+    inputs = parity_inputs(config, samples, max(batch_sizes))
+    row, reference = measure('h5', model, h5_load, inputs, None, batch_sizes, repeat)
+    rows = [row]
+    
+    for serving_format in formats:
+        artifact_path = serving_artifact_path(model_path, serving_format)
+        if serving_format == 'savedmodel':
+            export_savedmodel(model, config, artifact_path)
+        else:
+            export_tflite(model, artifact_path)
+        logger.info(f"Exported {model_id} to {artifact_path}")
+        
+        started = time.perf_counter()
+        artifact = load_artifact(artifact_path, serving_format)
+        row, _ = measure(serving_format, artifact, time.perf_counter() - started, inputs, reference,
+                         batch_sizes, repeat)
+        rows.append(row)
+    return rows
+
+def print_report(model_id: str, rows: List[Dict], batch_sizes: List[int]):
+    print(f"\n{model_id}")
+    header = f"  {'artifact':<12}{'load s':>8}" + ''.join(f"{f'ms/img @{size}':>14}" for size in batch_sizes)
+    print(header + f"{'max diff':>11}{'top-1':>8}")
+    for row in rows:
+        line = f"  {row['artifact']:<12}{row['load_s']:>8.2f}"
+        line += ''.join(f"{row['latency_ms'][size]:>14.2f}" for size in batch_sizes)
+        if 'max_abs_diff' in row:
+            line += f"{row['max_abs_diff']:>11.2e}{row['top1_agreement'] * 100:>7.0f}%"
+        print(line)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Export models to optimized serving artifacts')
+    parser.add_argument('--model', nargs='+', help='Model IDs to export (default: all with a .h5 file)')
+    parser.add_argument('--format', nargs='+', choices=SERVING_FORMATS, default=['savedmodel'],
+                        help='Artifacts to write (default: savedmodel)')
+    parser.add_argument('--samples', help='Directory of sample images for the parity check (default: random inputs)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16], help='Latency batch sizes')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per batch size (default: 20)')
+    args = parser.parse_args(argv)
+    
+    model_ids = args.model or [model_id for model_id, config in Config.MODEL_CONFIG.items()
+                               if os.path.exists(config['model_path'])]
+    samples = []
+    if args.samples:
+        samples = sorted(os.path.join(args.samples, name) for name in os.listdir(args.samples)
+                         if name.rsplit('.', 1)[-1].lower() in Config.ALLOWED_EXTENSIONS)
+    
+    exit_code = 0
+    for model_id in model_ids:
+        config = Config.MODEL_CONFIG.get(model_id)
+        if config is None or not os.path.exists(config['model_path']):
+            logger.error(f"Skipping {model_id}: no model file")
+            exit_code = 1
+            continue
+        
+        try:
+            rows = export_model(model_id, config, args.format, samples, args.batch_sizes, args.repeat)
+        except Exception as e:
+            logger.error(f"Failed to export {model_id}: {str(e)}")
+            exit_code = 1
+            continue
+        print_report(model_id, rows, args.batch_sizes)
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import functools
+import importlib
+import importlib.metadata
+import logging
+import sys
+import threading
+import time
+import types
+from typing import Dict, Iterable, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_lazy_modules: Dict[str, 'LazyModule'] = {}
+_import_seconds: Dict[str, float] = {}
+_lock = threading.Lock()
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a heavy module that imports it on first attribute access"""
+    
+    def _load(self):
+        module = self.__dict__.get('_module')
+        if module is not None:
+            return module
+        # importlib serializes concurrent imports of the same module
+        already_imported = self.__name__ in sys.modules
+        started = time.perf_counter()
+        module = importlib.import_module(self.__name__)
+        if not already_imported:
+            seconds = time.perf_counter() - started
+            with _lock:
+                _import_seconds.setdefault(self.__name__, seconds)
+            logger.info(f"Imported {self.__name__} in {seconds:.2f}s")
+        # Later lookups hit the copied attributes directly instead of __getattr__
+        self.__dict__.update(module.__dict__)
+        self.__dict__['_module'] = module
+        return module
+    
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+    
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name: str) -> LazyModule:
+    """Module proxy for name, shared by every importer, that loads it on first use"""
+    with _lock:
+        if name not in _lazy_modules:
+            _lazy_modules[name] = LazyModule(name)
+        return _lazy_modules[name]
+
+def preload(names: Optional[Iterable[str]] = None):
+    """Import lazily declared modules now (all of them by default)"""
+    for name in list(names if names is not None else _lazy_modules):
+        lazy_import(name)._load()
+
+def is_loaded(name: str) -> bool:
+    return name in sys.modules
+
+def import_seconds() -> Dict[str, float]:
+    """Seconds each lazily declared module took to import on first use"""
+    with _lock:
+        return dict(_import_seconds)
+
+@functools.lru_cache(maxsize=1)
+def _distributions() -> Dict[str, list]:
+    return importlib.metadata.packages_distributions()
+
+def module_version(name: str) -> Optional[str]:
+    """Installed version of a package without importing it"""
+    module = sys.modules.get(name)
+    if module is not None and hasattr(module, '__version__'):
+        return module.__version__
+    # Import names can differ from distribution names (tensorflow -> tensorflow-cpu)
+    for distribution in _distributions().get(name, [name]):
+        try:
+            return importlib.metadata.version(distribution)
+        except importlib.metadata.PackageNotFoundError:
+            continue
+    return None
+
+def declared_modules() -> Dict[str, bool]:
+    """Lazily declared modules and whether each has been imported yet"""
+    with _lock:
+        names = list(_lazy_modules)
+    return {name: is_loaded(name) for name in names}
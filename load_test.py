@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Load generator for the leaf analysis API
+Drives /api/analyze-leaf (or the batch route) at a fixed concurrency (closed
+loop) or request rate (open loop) with a mix of image sizes and models, and
+reports throughput, latency percentiles and error rates per load level. A
+sweep over several levels also reports where throughput stops scaling.
+
+Example:
+    python load_test.py --concurrency 8 --duration 30 --sizes 0.3 3 12 --models model1:3 model2 auto
+    python load_test.py --rate 20 --duration 60 --route batch --batch-size 8
+    python load_test.py --sweep 1 2 4 8 16 32 --duration 20 --json load.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from benchmarks.analysis_resolution import iter_sample_files
+from benchmarks.samples import synthetic_jpeg
+
+ROUTES = {
+    'single': '/api/analyze-leaf',
+    'batch': '/api/analyze-leaf/batch'
+}
+
+def load_payloads(args) -> List[Tuple[str, bytes]]:
+    """(name, bytes) of sample files plus synthetic JPEGs of the requested sizes"""
+    payloads = []
+    for path in iter_sample_files(args.images):
+        with open(path, 'rb') as f:
+            payloads.append((os.path.basename(path), f.read()))
+    for mp in args.sizes:
+        payloads.append((f"synthetic_{mp:g}mp.jpg", synthetic_jpeg(mp)))
+    return payloads
+
+def parse_mix(entries: List[str]) -> Tuple[List[str], List[float]]:
+    """'model1:3 model2' -> model IDs and relative weights"""
+    models, weights = [], []
+    for entry in entries:
+        model_id, _, weight = entry.partition(':')
+        models.append(model_id)
+        weights.append(float(weight) if weight else 1.0)
+    return models, weights
+
+class LoadGenerator:
+    """Sends randomly mixed analysis requests and records their outcomes"""
+    
+    def __init__(self, args, payloads: List[Tuple[str, bytes]]):
+        self.url = args.url.rstrip('/') + ROUTES[args.route]
+        self.route = args.route
+        self.batch_size = args.batch_size
+        self.timeout = args.timeout
+        self.unique = not args.allow_cache
+        self.payloads = payloads
+        self.models, self.weights = parse_mix(args.models)
+        self._local = threading.local()
+    
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+            self._local.rng = random.Random(threading.get_ident())
+        return self._local.session
+    
+    def _image(self, rng: random.Random) -> Tuple[str, bytes]:
+        name, data = rng.choice(self.payloads)
+        if self.unique:
+            # Bytes after the image end are ignored by decoders but defeat the prediction cache
+            data = data + os.urandom(16)
+        return name, data
+    
+    def send(self, scheduled: Optional[float] = None) -> Dict:
+        """One request; latency counts from scheduled (open loop) so client-side queueing is included"""
+        session = self._session()
+        rng = self._local.rng
+        model_id = rng.choices(self.models, self.weights)[0]
+        count = self.batch_size if self.route == 'batch' else 1
+        images = [self._image(rng) for _ in range(count)]
+        field = 'images' if self.route == 'batch' else 'image'
+        files = [(field, (name, data, 'image/jpeg')) for name, data in images]
+        
+        started = scheduled if scheduled is not None else time.perf_counter()
+        record = {'model': model_id, 'image': images[0][0], 'images': count}
+        try:
+            response = session.post(self.url, files=files, data={'model': model_id}, timeout=self.timeout)
+            record['status'] = response.status_code
+            if response.status_code != 200:
+                record['error'] = response.text[:200]
+        except requests.RequestException as e:
+            record['status'] = 0
+            record['error'] = type(e).__name__
+        record['latency_ms'] = (time.perf_counter() - started) * 1000
+        return record
+    
+    def run_closed(self, concurrency: int, duration: float, max_requests: Optional[int]) -> Tuple[List[Dict], float]:
+        """concurrency clients each sending back-to-back requests"""
+        records = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+        
+        def client():
+            while time.perf_counter() < deadline:
+                record = self.send()
+                with lock:
+                    if max_requests and len(records) >= max_requests:
+                        return
+                    records.append(record)
+        
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return records, time.perf_counter() - started
+    
+    def run_open(self, rate: float, duration: float, max_requests: Optional[int],
+                 max_workers: int) -> Tuple[List[Dict], float]:
+        """Requests started at a fixed rate regardless of how fast responses come back"""
+        total = int(rate * duration)
+        if max_requests:
+            total = min(total, max_requests)
+        
+        started = time.perf_counter()
+        futures = []
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for index in range(total):
+                scheduled = started + index / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self.send, scheduled))
+            records = [future.result() for future in futures]
+        return records, time.perf_counter() - started
+
+def summarize(level: str, records: List[Dict], elapsed: float) -> Dict:
+    """Throughput, latency percentiles and error breakdown of one load level"""
+    ok = [record for record in records if record['status'] == 200]
+    latencies = np.array([record['latency_ms'] for record in ok]) if ok else np.zeros(1)
+    status_counts: Dict[str, int] = {}
+    sample_errors: Dict[str, str] = {}
+    for record in records:
+        status = str(record['status'])
+        status_counts[status] = status_counts.get(status, 0) + 1
+        if 'error' in record:
+            sample_errors.setdefault(status, record['error'])
+    
+    by_model = {}
+    for model_id in sorted({record['model'] for record in records}):
+        model_ok = [record['latency_ms'] for record in ok if record['model'] == model_id]
+        by_model[model_id] = {
+            'requests': sum(1 for record in records if record['model'] == model_id),
+            'ok': len(model_ok),
+            'p50_ms': round(float(np.percentile(model_ok, 50)), 1) if model_ok else None
+        }
+    
+    return {
+        'level': level,
+        'requests': len(records),
+        'ok': len(ok),
+        'errors': len(records) - len(ok),
+        'error_rate': round((len(records) - len(ok)) / len(records), 4) if records else 0.0,
+        'rejected_503': status_counts.get('503', 0),
+        'status_counts': status_counts,
+        'sample_errors': sample_errors,
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'images_per_sec': round(sum(record['images'] for record in ok) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(float(latencies.mean()), 1),
+            'p50': round(float(np.percentile(latencies, 50)), 1),
+            'p95': round(float(np.percentile(latencies, 95)), 1),
+            'p99': round(float(np.percentile(latencies, 99)), 1),
+            'max': round(float(latencies.max()), 1)
+        },
+        'by_model': by_model
+    }
+
+def find_saturation(levels: List[Dict], min_gain: float = 0.1, max_error_rate: float = 0.01) -> Optional[Dict]:
+    """First level where throughput stops growing by min_gain or errors exceed max_error_rate"""
+    for previous, current in zip(levels, levels[1:]):
+        if current['error_rate'] > max_error_rate:
+            return {'level': current['level'], 'reason': f"error rate {current['error_rate'] * 100:.1f}%"}
+        if previous['throughput_rps'] and current['throughput_rps'] < previous['throughput_rps'] * (1 + min_gain):
+            return {'level': previous['level'],
+                    'reason': f"throughput {(current['throughput_rps'] / previous['throughput_rps'] - 1) * 100:+.0f}% "
+                              f"at {current['level']} while p99 went "
+                              f"{previous['latency_ms']['p99']:.0f} -> {current['latency_ms']['p99']:.0f}ms"}
+    return None
+
+def print_table(levels: List[Dict]):
+    print(f"\n{'level':<14}{'reqs':>7}{'ok/s':>8}{'img/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'max ms':>9}{'errors':>8}{'503s':>6}")
+    for level in levels:
+        latency = level['latency_ms']
+        print(f"{level['level']:<14}{level['requests']:>7}{level['throughput_rps']:>8.1f}{level['images_per_sec']:>8.1f}"
+              f"{latency['p50']:>9.0f}{latency['p95']:>9.0f}{latency['p99']:>9.0f}{latency['max']:>9.0f}"
+              f"{level['error_rate'] * 100:>7.1f}%{level['rejected_503']:>6}")
+    for level in levels:
+        for status, error in level['sample_errors'].items():
+            print(f"  {level['level']}: {level['status_counts'][status]} x HTTP {status}, e.g. {error.strip()[:120]}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Load-test the leaf analysis API')
+    parser.add_argument('--url', default='http://localhost:5000', help='Server base URL')
+    parser.add_argument('--route', choices=list(ROUTES), default='single', help='Endpoint to drive (default: single)')
+    parser.add_argument('--batch-size', type=int, default=8, help='Images per request on the batch route (default: 8)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--concurrency', type=int, help='Closed loop: clients sending back-to-back (default: 4)')
+    mode.add_argument('--rate', type=float, help='Open loop: requests started per second')
+    mode.add_argument('--sweep', type=int, nargs='+', help='Closed loop at each of these concurrencies')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds per load level (default: 30)')
+    parser.add_argument('--requests', type=int, help='Stop each level after this many requests')
+    parser.add_argument('--max-workers', type=int, default=256, help='Client threads in open-loop mode (default: 256)')
+    parser.add_argument('--sizes', type=float, nargs='*', default=[0.3, 3],
+                        help='Synthetic JPEG sizes in megapixels (default: 0.3 3)')
+    parser.add_argument('--images', nargs='*', default=[], help='Sample images or directories to mix in')
+    parser.add_argument('--models', nargs='+', default=['model1'],
+                        help='Models to mix, optionally weighted as model:weight (default: model1)')
+    parser.add_argument('--allow-cache', action='store_true',
+                        help='Resend identical bytes so the prediction cache can answer')
+    parser.add_argument('--timeout', type=float, default=60, help='Per-request timeout in seconds (default: 60)')
+    parser.add_argument('--min-gain', type=float, default=0.1,
+                        help='Sweep throughput gain below which a level counts as saturated (default: 0.1)')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    args = parser.parse_args(argv)
+    
+    try:
+        health = requests.get(f"{args.url.rstrip('/')}/api/health", timeout=5)
+        print(f"Server at {args.url}: {health.json().get('status')} ({health.json().get('mode')})")
+    except (requests.RequestException, ValueError) as e:
+        print(f"Cannot reach {args.url}: {str(e)}", file=sys.stderr)
+        return 2
+    
+    payloads = load_payloads(args)
+    if not payloads:
+        print("No images: pass --sizes and/or --images", file=sys.stderr)
+        return 2
+    generator = LoadGenerator(args, payloads)
+    
+    levels = []
+    if args.rate:
+        print(f"Open loop at {args.rate:g} req/s for {args.duration:g}s...")
+        records, elapsed = generator.run_open(args.rate, args.duration, args.requests, args.max_workers)
+        levels.append(summarize(f"{args.rate:g} req/s", records, elapsed))
+    else:
+        for concurrency in args.sweep or [args.concurrency or 4]:
+            print(f"Concurrency {concurrency} for {args.duration:g}s...", flush=True)
+            records, elapsed = generator.run_closed(concurrency, args.duration, args.requests)
+            levels.append(summarize(f"{concurrency} clients", records, elapsed))
+    
+    print_table(levels)
+    saturation = find_saturation(levels, min_gain=args.min_gain) if len(levels) > 1 else None
+    if saturation:
+        print(f"\nSaturation at {saturation['level']}: {saturation['reason']}")
+    
+    if args.json:
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'url': args.url,
+            'route': args.route,
+            'models': args.models,
+            'sizes_mp': args.sizes,
+            'levels': levels,
+            'saturation': saturation
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.json}")
+    return 1 if any(level['ok'] == 0 for level in levels) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""
+In-process metrics in the Prometheus text exposition format
+Counters, gauges and histograms are plain dicts behind a lock, cheap enough
+to sit on every request and pipeline stage. Pipeline stages are labelled with
+the model_id of the request being served, carried in a context variable so
+model_utils code does not have to pass it around.
+"""
+import abc
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; spans cache hits (sub-millisecond) to 48 MP decodes and cold model loads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_model_label = contextvars.ContextVar('metrics_model_id', default='')
+_enabled = True
+
+def set_enabled(enabled: bool):
+    """Turn recording on or off process-wide (rendering still works)"""
+    global _enabled
+    _enabled = enabled
+
+@contextmanager
+def model_label(model_id: str):
+    """Label stage metrics recorded in this context with model_id"""
+    token = _model_label.set(model_id or '')
+    try:
+        yield
+    finally:
+        _model_label.reset(token)
+
+def current_model_label() -> str:
+    return _model_label.get()
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric(abc.ABC):
+    kind = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+    
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines for every label set"""
+
+def _function_values(values: Dict[Tuple[str, ...], float], function: Optional[Callable]) -> Dict:
+    """Merge a scrape-time callback's result into directly recorded values"""
+    if function is not None:
+        result = function()
+        if result is None:
+            result = {}
+        elif not isinstance(result, dict):
+            result = {(): result}
+        values.update({key if isinstance(key, tuple) else (key,): value for key, value in result.items()})
+    return values
+
+class Counter(_Metric):
+    """Monotonically increasing total per label set, incremented or read from a callback at scrape time"""
+    kind = 'counter'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 function: Optional[Callable] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function = function
+    
+    def inc(self, amount: float = 1.0, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def set_function(self, function: Callable):
+        """function() returns a running total, or {label value tuple: total} for labelled counters"""
+        self._function = function
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        values = _function_values(values, self._function)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items()) if value is not None]
+
+class Gauge(_Metric):
+    """Current value per label set, set directly or read from a callback at scrape time"""
+    kind = 'gauge'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 function: Optional[Callable] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function = function
+    
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+    
+    def set_function(self, function: Callable):
+        """function() returns a number, or {label value tuple: number} for labelled gauges"""
+        self._function = function
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        values = _function_values(values, self._function)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items()) if value is not None]
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count of observations per label set"""
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}  # key -> [bucket counts..., sum, count]
+    
+    def observe(self, value: float, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        lines = []
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                bucket = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{labels} {values[-1]}")
+        return lines
+
+class Registry:
+    """Ordered collection of metrics rendered together"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+    
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def render() -> str:
+    return REGISTRY.render()
+
+# Request pipeline
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'leaf_stage_duration_seconds', 'Time spent in each analysis pipeline stage', ['stage', 'model_id']))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'leaf_http_requests_total', 'HTTP requests by route, method and status', ['route', 'method', 'status']))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    'leaf_http_request_duration_seconds', 'HTTP request latency until the response starts', ['route']))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    'leaf_http_requests_in_flight', 'HTTP requests being handled', ['route']))
+
+# Inference
+INFERENCE_BATCH_ROWS = REGISTRY.register(Histogram(
+    'leaf_inference_batch_rows', 'Rows per forward pass', ['model_id'], buckets=(1, 2, 4, 8, 16, 32, 64, 128)))
+INFERENCE_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'leaf_inference_queue_depth', 'Requests waiting for a forward pass', ['model_id']))
+INFERENCE_ERRORS = REGISTRY.register(Counter(
+    'leaf_inference_errors_total', 'Requests failed by a forward pass', ['model_id']))
+
+# Models
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    'leaf_model_load_seconds', 'Duration of the last load of each model', ['model_id', 'format']))
+MODEL_WARMUP_SECONDS = REGISTRY.register(Gauge(
+    'leaf_model_warmup_seconds', 'Duration of the last warmup of each model', ['model_id']))
+MODEL_LOADS = REGISTRY.register(Counter(
+    'leaf_model_loads_total', 'Model loads and reloads by outcome', ['model_id', 'result']))
+MODELS_LOADED = REGISTRY.register(Gauge('leaf_models_loaded', 'Models resident in memory'))
+MODEL_MEMORY_BYTES = REGISTRY.register(Gauge(
+    'leaf_model_memory_bytes', 'Estimated weight memory per resident model', ['model_id']))
+
+# Prediction cache
+CACHE_EVENTS = REGISTRY.register(Counter(
+    'leaf_prediction_cache_events_total', 'Prediction cache hits, misses, stores and evictions', ['event']))
+
+# Process
+def process_memory(pid: int) -> Optional[Dict[str, float]]:
+    """RSS, PSS and shared/private MB of a process from /proc (None where unavailable)"""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    
+    return {
+        'rss_mb': round(fields.get('Rss', 0.0), 1),
+        'pss_mb': round(fields.get('Pss', 0.0), 1),
+        'shared_mb': round(fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0), 1),
+        'private_mb': round(fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0), 1)
+    }
+
+def _process_memory_bytes():
+    memory = process_memory(os.getpid())
+    if memory is None:
+        return None
+    return {(kind,): memory[f'{kind}_mb'] * 1024 * 1024 for kind in ('rss', 'pss', 'shared', 'private')}
+
+REGISTRY.register(Gauge(
+    'process_memory_bytes', 'Resident memory of this process by kind (PSS splits shared pages)', ['kind'],
+    function=_process_memory_bytes))
+REGISTRY.register(Counter(
+    'process_cpu_seconds_total', 'User plus system CPU time of this process',
+    function=lambda: sum(os.times()[:2])))
+REGISTRY.register(Gauge('process_threads', 'Live Python threads', function=threading.active_count))
+PROCESS_START_TIME = time.time()
+REGISTRY.register(Gauge(
+    'process_start_time_seconds', 'Start time of the process since the Unix epoch',
+    function=lambda: PROCESS_START_TIME))
+
+@contextmanager
+def stage(name: str, model_id: Optional[str] = None):
+    """Time a pipeline stage, labelled with model_id or the current request's model"""
+    if not _enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name,
+                              model_id=_model_label.get() if model_id is None else model_id)
+
+def timed(name: str):
+    """Decorator form of stage()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
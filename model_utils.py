@@ -1,21 +1,264 @@
-import tensorflow as tf
 import numpy as np
 from PIL import Image
-import cv2
+import gc
+import io
 import os
 import logging
-from typing import Optional, Dict, List, Tuple
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Tuple, Union
+
+import metrics
+from lazy_imports import lazy_import
+
+# TensorFlow alone takes seconds to import; it and OpenCV load on first use
+tf = lazy_import('tensorflow')
+cv2 = lazy_import('cv2')
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Optimized serving artifacts written by export_models.py, in order of preference
+SERVING_FORMATS = ('savedmodel', 'tflite')
+# Per-model 'variant' in MODEL_CONFIG; quantized variants are TFLite files from quantize_models.py
+MODEL_VARIANTS = ('float', 'dynamic', 'int8')
+
+def serving_artifact_path(model_path: str, serving_format: str, variant: str = 'float') -> str:
+    """Where export_models.py / quantize_models.py write the artifact for a .h5 model"""
+    base = os.path.splitext(model_path)[0]
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant: {variant}")
+    if variant != 'float':
+        return f"{base}_{variant}.tflite"
+    if serving_format == 'savedmodel':
+        return f"{base}_savedmodel"
+    if serving_format == 'tflite':
+        return f"{base}.tflite"
+    raise ValueError(f"Unknown serving format: {serving_format}")
+
+
+class SavedModelAdapter:
+    """An exported SavedModel's traced serving signature behind Keras' predict_on_batch"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._loaded = tf.saved_model.load(path)
+        self._serve = self._loaded.signatures['serving_default']
+        
+        self._input_name, input_spec = next(iter(self._serve.structured_input_signature[1].items()))
+        self._output_name = next(iter(self._serve.structured_outputs))
+        self.input_shape = tuple(input_spec.shape.as_list())
+        self.memory_bytes = sum(int(np.prod(variable.shape)) * variable.dtype.size
+                                for variable in self._serve.variables)
+    
+    def predict_on_batch(self, inputs: np.ndarray) -> np.ndarray:
+        outputs = self._serve(**{self._input_name: tf.convert_to_tensor(inputs, dtype=tf.float32)})
+        return outputs[self._output_name].numpy()
+
+
+class TFLiteAdapter:
+    """TensorFlow Lite interpreters behind Keras' predict_on_batch
+    
+    Resizing an interpreter's input re-plans and re-allocates all of its
+    tensors, so each batch size gets its own interpreter, allocated once and
+    reused; the least recently used ones are dropped beyond max_interpreters.
+    Integer-quantized inputs and outputs are converted with the tensor's
+    scale and zero point, so callers always pass and get float32.
+    """
+    
+    def __init__(self, path: str, num_threads: Optional[int] = None, model_content: Optional[bytes] = None,
+                 max_interpreters: int = 16):
+        self.path = path
+        self.num_threads = num_threads
+        # Every interpreter runs from the same buffer in place, e.g. one shared by forked workers
+        self._model_source = {'model_content': model_content} if model_content is not None else {'model_path': path}
+        # The micro-batcher caps batch sizes, so ModelManager passes its max_batch_size
+        # to keep one interpreter per size it can produce (16 is the batcher's default)
+        self.max_interpreters = max(1, max_interpreters)
+        self._interpreters: OrderedDict = OrderedDict()  # batch size -> (interpreter, lock), LRU first
+        self._interpreters_lock = threading.Lock()
+        
+        interpreter = tf.lite.Interpreter(num_threads=num_threads, **self._model_source)
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+        self._input_index = input_details['index']
+        self._input_dtype = input_details['dtype']
+        self._input_quantization = input_details['quantization']
+        self._output_index = output_details['index']
+        self._output_quantization = output_details['quantization']
+        self.input_shape = (None, *(int(dim) for dim in input_details['shape'][1:]))
+        self.memory_bytes = len(model_content) if model_content is not None else os.path.getsize(path)
+        self._allocate(interpreter, 1)
+    
+    def _allocate(self, interpreter, batch_size: int):
+        interpreter.resize_tensor_input(self._input_index, [batch_size, *self.input_shape[1:]])
+        interpreter.allocate_tensors()
+        # Interpreters are not thread-safe, but different batch sizes can run concurrently
+        self._interpreters[batch_size] = (interpreter, threading.Lock())
+        while len(self._interpreters) > self.max_interpreters:
+            self._interpreters.popitem(last=False)
+    
+    def _interpreter_for(self, batch_size: int):
+        """(interpreter, lock) allocated for batch_size, created on first use"""
+        with self._interpreters_lock:
+            if batch_size not in self._interpreters:
+                self._allocate(tf.lite.Interpreter(num_threads=self.num_threads, **self._model_source), batch_size)
+            self._interpreters.move_to_end(batch_size)
+            return self._interpreters[batch_size]
+    
+    def predict_on_batch(self, inputs: np.ndarray) -> np.ndarray:
+        inputs = np.asarray(inputs, dtype=np.float32)
+        if self._input_dtype != np.float32:
+            scale, zero_point = self._input_quantization
+            limits = np.iinfo(self._input_dtype)
+            inputs = np.clip(np.round(inputs / scale + zero_point), limits.min, limits.max).astype(self._input_dtype)
+        
+        interpreter, lock = self._interpreter_for(inputs.shape[0])
+        with lock:
+            interpreter.set_tensor(self._input_index, inputs)
+            interpreter.invoke()
+            outputs = interpreter.get_tensor(self._output_index).copy()
+        
+        if outputs.dtype != np.float32:
+            scale, zero_point = self._output_quantization
+            outputs = (outputs.astype(np.float32) - zero_point) * scale
+        return outputs
+
+
+def _as_str(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else str(value)
+
+
+class ModelSnapshot:
+    """A model file's contents read into memory without starting TensorFlow
+    
+    A pre-fork master takes snapshots so every worker builds its model from
+    the same copy-on-write pages instead of reading and parsing the file
+    again. TFLite interpreters run from the shared flatbuffer in place; Keras
+    copies the shared .h5 weight arrays into its own variables.
+    """
+    
+    def __init__(self, path: str, model_format: str, version: str, content: Optional[bytes] = None,
+                 architecture: Optional[str] = None, layer_weights: Optional[Dict[str, List[np.ndarray]]] = None):
+        self.path = path
+        self.model_format = model_format
+        self.version = version
+        self.content = content
+        self.architecture = architecture
+        self.layer_weights = layer_weights or {}
+        self.nbytes = len(content) if content is not None else sum(
+            array.nbytes for arrays in self.layer_weights.values() for array in arrays)
+    
+    @classmethod
+    def read(cls, path: str, model_format: str, version: str) -> 'ModelSnapshot':
+        """Read a TFLite flatbuffer, or a full-model .h5's architecture and per-layer weights"""
+        if model_format == 'tflite':
+            with open(path, 'rb') as f:
+                return cls(path, model_format, version, content=f.read())
+        
+        if model_format != 'keras':
+            raise ValueError(f"{model_format} models cannot be snapshotted")
+        import h5py
+        
+        if not h5py.is_hdf5(path):
+            raise ValueError(f"{path} is not an HDF5 model")
+        with h5py.File(path, 'r') as f:
+            if 'model_config' not in f.attrs:
+                raise ValueError(f"{path} holds weights only")
+            group = f['model_weights'] if 'model_weights' in f else f
+            layer_weights = {}
+            for layer_name in map(_as_str, group.attrs['layer_names']):
+                layer_group = group[layer_name]
+                layer_weights[layer_name] = [np.asarray(layer_group[_as_str(name)])
+                                             for name in layer_group.attrs['weight_names']]
+            return cls(path, model_format, version, architecture=_as_str(f.attrs['model_config']),
+                       layer_weights=layer_weights)
+    
+    def build(self, max_interpreters: int = 16):
+        """A servable model from the snapshot (needs the TensorFlow runtime)"""
+        if self.model_format == 'tflite':
+            return TFLiteAdapter(self.path, model_content=self.content, max_interpreters=max_interpreters)
+        
+        # Keras 3 writes the top-level class of .h5 architectures without its module
+        model = tf.keras.models.model_from_json(self.architecture, custom_objects={
+            'Sequential': tf.keras.Sequential, 'Functional': tf.keras.Model, 'Model': tf.keras.Model
+        })
+        for layer in model.layers:
+            if not layer.weights:
+                continue
+            if layer.name not in self.layer_weights:
+                raise ValueError(f"No weights for layer {layer.name} in the snapshot of {self.path}")
+            # The .h5 loader's order: trainable weights first, so a nested model's
+            # batch-norm statistics come after all of its kernels
+            variables = layer.trainable_weights + layer.non_trainable_weights
+            values = self.layer_weights[layer.name]
+            if len(variables) != len(values):
+                raise ValueError(f"Layer {layer.name} has {len(variables)} weights, "
+                                 f"the snapshot of {self.path} {len(values)}")
+            for variable, value in zip(variables, values):
+                if tuple(variable.shape) != value.shape:
+                    raise ValueError(f"Weight {variable.name} of layer {layer.name} has shape "
+                                     f"{tuple(variable.shape)}, the snapshot {value.shape}")
+                variable.assign(value)
+        return model
+
+
 class ModelManager:
     """Manages loading and inference of ML models"""
     
-    def __init__(self, model_config: Dict):
+    def __init__(self, model_config: Dict, lazy: bool = False,
+                 max_loaded_models: Optional[int] = None, memory_budget_mb: Optional[float] = None,
+                 prefer_optimized: bool = True, warmup_batch_sizes: Optional[List[int]] = None,
+                 background_loading: bool = False, max_batch_size: int = 16):
         self.model_config = model_config
-        self.models = {}
-        self.load_all_models()
+        self.models = OrderedDict()  # Least recently used first
+        self.model_sizes: Dict[str, int] = {}
+        self.model_versions: Dict[str, str] = {}
+        
+        # Load export_models.py artifacts instead of the .h5 when they are up to date
+        self.prefer_optimized = prefer_optimized
+        
+        # Largest forward pass the batcher runs; TFLite models keep an interpreter per size up to it
+        self.max_batch_size = max(1, int(max_batch_size))
+        
+        # Per-class display/treatment tables, built once per model at load time
+        self.class_metadata: Dict[str, 'ClassMetadata'] = {}
+        
+        # In-memory model files from snapshot_models(), loaded instead of the files they match
+        self.snapshots: Dict[str, ModelSnapshot] = {}
+        
+        # Lazy mode loads on first request and evicts idle models beyond the budget
+        self.lazy = lazy
+        self.max_loaded_models = max_loaded_models or None
+        self.memory_budget_mb = memory_budget_mb or None
+        
+        self._lock = threading.RLock()
+        self._loading: Dict[str, threading.Event] = {}
+        
+        # Requests using each model object (by id), so a hot swap can drain the old one
+        self._leases: Dict[int, int] = {}
+        self._released = threading.Condition(self._lock)
+        self._reload_lock = threading.Lock()
+        
+        # Synthetic batches run through every model before it serves, so graph
+        # tracing and kernel selection don't land on the first real requests
+        self.warmup_batch_sizes = sorted({size for size in (warmup_batch_sizes or [1]) if size > 0})
+        self.warmup_seconds: Dict[str, float] = {}
+        
+        # Set once the startup models are loaded and warm; readiness checks wait for it
+        self.ready = threading.Event()
+        
+        if lazy:
+            logger.info("Lazy model loading enabled - models load on first request")
+            self.ready.set()
+        elif background_loading:
+            threading.Thread(target=self.load_all_models, name='model-loader', daemon=True).start()
+        else:
+            self.load_all_models()
     
     def load_all_models(self):
         """Load all available models"""
@@ -28,50 +271,247 @@ class ModelManager:
                 logger.warning(f"⚠️  {config['name']} failed to load")
         
         logger.info(f"Model loading complete. {len(self.models)}/{len(self.model_config)} models loaded.")
+        self.ready.set()
+    
+    def snapshot_models(self):
+        """Read every model file and build the class tables without starting TensorFlow
+        
+        Meant for a pre-fork master: workers then build their models from these
+        shared snapshots instead of each reading and parsing the files.
+        """
+        for model_id, config in self.model_config.items():
+            if model_id not in self.class_metadata:
+                self.class_metadata[model_id] = ClassMetadata(config['classes'])
+            
+            model_path, model_format = self._resolve_model_path(model_id)
+            if model_path is None:
+                continue
+            try:
+                snapshot = ModelSnapshot.read(model_path, model_format, self._file_version(model_path))
+            except Exception as e:
+                logger.info(f"{config['name']} will load from disk in each process: {str(e)}")
+                continue
+            self.snapshots[model_id] = snapshot
+            logger.info(f"Snapshot {config['name']} from {model_path} ({snapshot.nbytes / (1024 * 1024):.1f}MB)")
     
     def load_model(self, model_id: str) -> bool:
-        """Load a specific model"""
+        """Load a specific model, sharing one load between concurrent callers"""
         if model_id not in self.model_config:
             logger.error(f"Unknown model ID: {model_id}")
             return False
         
+        with self._lock:
+            in_flight = self._loading.get(model_id)
+            if in_flight is None:
+                self._loading[model_id] = threading.Event()
+        
+        if in_flight is not None:
+            # Another thread is already deserializing this model
+            in_flight.wait()
+            return model_id in self.models
+        
+        try:
+            model, model_path = self._load_from_disk(model_id)
+            if model is None:
+                return False
+            try:
+                self.warmup_model(model_id, model)
+            except Exception as e:
+                metrics.MODEL_LOADS.inc(model_id=model_id, result='warmup_failed')
+                logger.error(f"{self.model_config[model_id]['name']} failed warmup: {str(e)}")
+                return False
+            
+            with self._lock:
+                self.models[model_id] = model
+                self.models.move_to_end(model_id)
+                self.model_sizes[model_id] = self._estimate_model_bytes(model)
+                self.model_versions[model_id] = self._file_version(model_path)
+                if model_id not in self.class_metadata:
+                    self.class_metadata[model_id] = ClassMetadata(self.model_config[model_id]['classes'])
+                self._evict_idle_models(keep=model_id)
+            return True
+        finally:
+            with self._lock:
+                self._loading.pop(model_id).set()
+    
+    def _resolve_model_path(self, model_id: str) -> Tuple[Optional[str], str]:
+        """(path, format) of the artifact to load: an up-to-date export, else the .h5"""
         config = self.model_config[model_id]
         model_path = config['model_path']
+        source_mtime = os.path.getmtime(model_path) if os.path.exists(model_path) else None
         
-        if not os.path.exists(model_path):
-            logger.warning(f"Model file not found: {model_path}")
-            logger.info(f"To use {config['name']}, place your trained model at: {model_path}")
-            return False
+        # A quantized variant is an explicit choice, so it is used whenever it exists
+        variant = config.get('variant', 'float')
+        if variant != 'float':
+            artifact_path = serving_artifact_path(model_path, 'tflite', variant)
+            if os.path.exists(artifact_path):
+                if source_mtime is not None and os.path.getmtime(artifact_path) < source_mtime:
+                    logger.warning(f"{variant} variant of {model_id} is older than {model_path}; "
+                                   f"re-run quantize_models.py")
+                return artifact_path, 'tflite'
+            logger.warning(f"No {variant} variant for {model_id} at {artifact_path}, using the float model")
+        
+        if self.prefer_optimized:
+            formats = [config['serving_format']] if config.get('serving_format') else SERVING_FORMATS
+            for serving_format in formats:
+                artifact_path = serving_artifact_path(model_path, serving_format)
+                if not os.path.exists(artifact_path):
+                    continue
+                if source_mtime is not None and os.path.getmtime(artifact_path) < source_mtime:
+                    logger.warning(f"Ignoring stale {serving_format} export for {model_id}; re-run export_models.py")
+                    continue
+                return artifact_path, serving_format
+        
+        return (model_path if source_mtime is not None else None), 'keras'
+    
+    def _load_from_disk(self, model_id: str):
+        """Deserialize a model (from its snapshot while that is current), returning (model, path) or (None, None)"""
+        config = self.model_config[model_id]
+        model_path, model_format = self._resolve_model_path(model_id)
+        
+        if model_path is None:
+            logger.warning(f"Model file not found: {config['model_path']}")
+            logger.info(f"To use {config['name']}, place your trained model at: {config['model_path']}")
+            return None, None
+        
+        snapshot = self.snapshots.get(model_id)
+        if snapshot is not None and (snapshot.path, snapshot.version) != (model_path, self._file_version(model_path)):
+            # The file changed since the snapshot was taken (e.g. a hot reload)
+            self.snapshots.pop(model_id, None)
+            snapshot = None
         
         try:
-            # Load model with error handling for different TensorFlow versions
-            self.models[model_id] = tf.keras.models.load_model(
-                model_path,
-                compile=False  # Skip compilation for faster loading
-            )
+            started = time.perf_counter()
+            model = None
+            if snapshot is not None:
+                try:
+                    model = snapshot.build(max_interpreters=self.max_batch_size)
+                except Exception as e:
+                    # The file itself is still loadable the usual way
+                    logger.warning(f"Could not build {config['name']} from its snapshot, "
+                                   f"loading {model_path} instead: {str(e)}")
+                    self.snapshots.pop(model_id, None)
+                    snapshot = None
+            if model is None:
+                model = self._load_file(model_path, model_format)
             
             # Verify model input shape
             expected_shape = (None, *config['image_size'], config.get('input_channels', 3))
-            actual_shape = self.models[model_id].input_shape
+            actual_shape = model.input_shape
             
             if actual_shape != expected_shape:
                 logger.warning(f"Model input shape mismatch. Expected: {expected_shape}, Got: {actual_shape}")
             
-            logger.info(f"Successfully loaded {config['name']} model from {model_path}")
-            return True
-            
+            load_seconds = time.perf_counter() - started
+            metrics.MODEL_LOAD_SECONDS.set(load_seconds, model_id=model_id, format=model_format)
+            metrics.MODEL_LOADS.inc(model_id=model_id, result='loaded')
+            logger.info(f"Successfully loaded {config['name']} model from {model_path}"
+                        f"{' snapshot' if snapshot is not None else ''} in {load_seconds:.2f}s")
+            return model, model_path
+        
         except Exception as e:
+            metrics.MODEL_LOADS.inc(model_id=model_id, result='failed')
             logger.error(f"Failed to load {config['name']} model: {str(e)}")
             logger.error(f"Model path: {model_path}")
-            return False
+            return None, None
+    
+    def _load_file(self, model_path: str, model_format: str):
+        """Deserialize a model artifact of the given format from disk"""
+        if model_format == 'savedmodel':
+            return SavedModelAdapter(model_path)
+        if model_format == 'tflite':
+            return TFLiteAdapter(model_path, max_interpreters=self.max_batch_size)
+        # Load model with error handling for different TensorFlow versions
+        return tf.keras.models.load_model(
+            model_path,
+            compile=False  # Skip compilation for faster loading
+        )
+    
+    @staticmethod
+    def _estimate_model_bytes(model) -> int:
+        """Approximate resident size of a model's weights"""
+        if hasattr(model, 'memory_bytes'):
+            return int(model.memory_bytes)
+        
+        total = 0
+        try:
+            for weight in model.weights:
+                dtype = getattr(weight.dtype, 'as_numpy_dtype', weight.dtype)
+                total += int(np.prod(weight.shape)) * np.dtype(dtype).itemsize
+        except Exception as e:
+            logger.debug(f"Could not estimate model size: {str(e)}")
+        return total
+    
+    def _evict_idle_models(self, keep: Optional[str] = None):
+        """Drop least recently used idle models until the count and memory budgets are met
+        
+        Models with active leases are skipped; the last lease to end retries the eviction.
+        Callers hold self._lock, which also guards the lease counts.
+        """
+        while True:
+            over_count = self.max_loaded_models is not None and len(self.models) > self.max_loaded_models
+            over_memory = (self.memory_budget_mb is not None and
+                           sum(self.model_sizes.values()) > self.memory_budget_mb * 1024 * 1024)
+            if not (over_count or over_memory):
+                return
+            
+            victim = next((model_id for model_id, model in self.models.items()
+                           if model_id != keep and not self._leases.get(id(model))), None)
+            if victim is None:
+                return
+            
+            del self.models[victim]
+            self.model_sizes.pop(victim, None)
+            logger.info(f"Evicted idle model {victim} to stay within the model budget")
+    
+    @staticmethod
+    def _file_version(model_path: str) -> str:
+        """Version tag derived from a model file's modification time and size"""
+        try:
+            if os.path.isdir(model_path):
+                model_path = os.path.join(model_path, 'saved_model.pb')
+            stat = os.stat(model_path)
+            return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        except OSError:
+            return 'missing'
+    
+    def get_model_version(self, model_id: str) -> str:
+        """Version of the loaded model, or of the file a lazy load would pick up"""
+        with self._lock:
+            if model_id in self.models and model_id in self.model_versions:
+                return self.model_versions[model_id]
+        return self.get_disk_version(model_id)
+    
+    def get_class_metadata(self, model_id: str) -> 'ClassMetadata':
+        """Class lookup table of a model, built on first use if the model never loaded"""
+        metadata = self.class_metadata.get(model_id)
+        if metadata is None:
+            metadata = ClassMetadata(self.model_config[model_id]['classes'])
+            with self._lock:
+                self.class_metadata.setdefault(model_id, metadata)
+        return metadata
     
     def get_model(self, model_id: str):
-        """Get a loaded model"""
+        """Get a loaded model, loading it on demand in lazy mode"""
+        with self._lock:
+            model = self.models.get(model_id)
+            if model is not None:
+                self.models.move_to_end(model_id)
+                return model
+        
+        if not self.lazy or model_id not in self.model_config:
+            return None
+        
+        self.load_model(model_id)
         return self.models.get(model_id)
     
     def is_model_available(self, model_id: str) -> bool:
         """Check if model is available"""
-        return model_id in self.models
+        if model_id in self.models:
+            return True
+        # In lazy mode anything with a model file on disk can be loaded on demand
+        return (self.lazy and model_id in self.model_config and
+                self._resolve_model_path(model_id)[0] is not None)
     
     def get_available_models(self) -> List[Dict]:
         """Get list of available models"""
@@ -81,33 +521,498 @@ class ModelManager:
                 'id': model_id,
                 'name': config['name'],
                 'description': config.get('description', ''),
-                'available': model_id in self.models,
+                'available': self.is_model_available(model_id),
+                'loaded': model_id in self.models,
+                'variant': config.get('variant', 'float'),
                 'classes_count': len(config['classes']),
                 'image_size': config['image_size']
             }
             available.append(model_info)
         return available
     
-    def reload_model(self, model_id: str) -> bool:
-        """Reload a specific model"""
-        if model_id in self.models:
-            del self.models[model_id]
-        return self.load_model(model_id)
-
-class ImageProcessor:
-    """Handles image preprocessing and analysis"""
+    def get_memory_usage(self) -> Dict:
+        """Estimated weight memory of the resident models"""
+        with self._lock:
+            sizes = dict(self.model_sizes)
+        return {
+            'models': {model_id: round(size / (1024 * 1024), 1) for model_id, size in sizes.items()},
+            'total_mb': round(sum(sizes.values()) / (1024 * 1024), 1),
+            'budget_mb': self.memory_budget_mb,
+            'max_loaded_models': self.max_loaded_models
+        }
     
-    @staticmethod
-    def preprocess_for_model(image_path: str, target_size: Tuple[int, int]) -> Optional[np.ndarray]:
-        """Preprocess image for model prediction"""
+    @contextmanager
+    def lease(self, model_id: str):
+        """Borrow the current model (or None); a hot swap frees the old version only after its leases end"""
+        model = self.get_model(model_id)
+        if model is None:
+            yield None
+            return
+        
+        with self._lock:
+            model = self.models.get(model_id, model)  # Pick up a swap that landed meanwhile
+            key = id(model)
+            self._leases[key] = self._leases.get(key, 0) + 1
         try:
-            # Read and validate image
-            if not os.path.exists(image_path):
-                logger.error(f"Image file not found: {image_path}")
-                return None
+            yield model
+        finally:
+            with self._released:
+                self._leases[key] -= 1
+                if not self._leases[key]:
+                    del self._leases[key]
+                    self._released.notify_all()
+                    self._evict_idle_models()
+    
+    def warmup_model(self, model_id: str, model) -> float:
+        """Trace the model at every warmup batch size and check its outputs, raising if it cannot serve"""
+        config = self.model_config[model_id]
+        started = time.perf_counter()
+        for batch_size in self.warmup_batch_sizes:
+            inputs = np.zeros((batch_size, *config['image_size'], config.get('input_channels', 3)), dtype=np.float32)
+            outputs = np.asarray(model.predict_on_batch(inputs))
+            expected_shape = (batch_size, len(config['classes']))
+            if outputs.shape != expected_shape:
+                raise ValueError(f"warmup output shape {outputs.shape}, expected {expected_shape}")
+            if not np.all(np.isfinite(outputs)):
+                raise ValueError(f"warmup produced non-finite outputs at batch size {batch_size}")
+        
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self.warmup_seconds[model_id] = seconds
+        metrics.MODEL_WARMUP_SECONDS.set(seconds, model_id=model_id)
+        logger.info(f"Warmed up {model_id} at batch sizes {self.warmup_batch_sizes} in {seconds:.2f}s")
+        return seconds
+    
+    def get_disk_version(self, model_id: str) -> str:
+        """Version of the artifact a (re)load of model_id would pick up now"""
+        model_path, _ = self._resolve_model_path(model_id)
+        return self._file_version(model_path or self.model_config[model_id]['model_path'])
+    
+    def reload_model(self, model_id: str, drain_timeout: float = 30.0) -> bool:
+        """Hot-swap a model for the version on disk without interrupting requests
+        
+        The new version is loaded and warmed up beside the old one and only
+        swapped in once a warmup inference succeeds; on any failure the old
+        version keeps serving. After the swap, requests still holding a lease
+        on the old version finish on it before it is released.
+        """
+        if model_id not in self.model_config:
+            logger.error(f"Unknown model ID: {model_id}")
+            return False
+        
+        with self._reload_lock:
+            # Same single-flight slot as load_model, so a lazy load and a reload
+            # never deserialize the model at once or race to install it
+            waited = False
+            while True:
+                with self._lock:
+                    in_flight = self._loading.get(model_id)
+                    if in_flight is None:
+                        self._loading[model_id] = threading.Event()
+                        break
+                in_flight.wait()
+                waited = True
             
-            # Open and convert image
-            image = Image.open(image_path)
+            try:
+                if waited and model_id in self.models and \
+                        self.model_versions.get(model_id) == self.get_disk_version(model_id):
+                    # The load that just finished already picked up the version on disk
+                    logger.info(f"{model_id} version {self.model_versions[model_id]} was loaded concurrently")
+                    return True
+                
+                started = time.perf_counter()
+                model, model_path = self._load_from_disk(model_id)
+                if model is None:
+                    logger.error(f"Reload of {model_id} failed to load; keeping the current version")
+                    return False
+                try:
+                    self.warmup_model(model_id, model)
+                except Exception as e:
+                    metrics.MODEL_LOADS.inc(model_id=model_id, result='warmup_failed')
+                    logger.error(f"Reload of {model_id} failed warmup ({str(e)}); keeping the current version")
+                    return False
+                
+                with self._lock:
+                    old_model = self.models.get(model_id)
+                    self.models[model_id] = model
+                    self.models.move_to_end(model_id)
+                    self.model_sizes[model_id] = self._estimate_model_bytes(model)
+                    self.model_versions[model_id] = self._file_version(model_path)
+                    if model_id not in self.class_metadata:
+                        self.class_metadata[model_id] = ClassMetadata(self.model_config[model_id]['classes'])
+                    self._evict_idle_models(keep=model_id)
+                logger.info(f"Swapped in {model_id} version {self.model_versions[model_id]} "
+                            f"in {time.perf_counter() - started:.2f}s")
+            finally:
+                with self._lock:
+                    self._loading.pop(model_id).set()
+            
+            # The new version already serves; only the old one's last requests are awaited
+            if old_model is not None:
+                self._drain(model_id, id(old_model), drain_timeout)
+                del old_model
+                gc.collect()  # Keras models hold reference cycles
+            return True
+    
+    def _drain(self, model_id: str, key: int, timeout: float):
+        """Wait for the leases on a swapped-out model object to end"""
+        deadline = time.monotonic() + timeout
+        with self._released:
+            while self._leases.get(key) and time.monotonic() < deadline:
+                self._released.wait(deadline - time.monotonic())
+            in_use = self._leases.get(key, 0)
+        
+        if in_use:
+            logger.warning(f"Old version of {model_id} still has {in_use} requests after {timeout:.0f}s; "
+                           f"it is released when they finish")
+        else:
+            logger.info(f"Drained old version of {model_id}")
+
+class ModelFileWatcher:
+    """Polls the artifacts behind loaded models and hot-swaps any that change
+    
+    A new version is reloaded only once its file has looked the same for two
+    polls, so a model still being copied into MODEL_FOLDER is not picked up
+    half-written. A version that failed to load is not retried until it changes.
+    """
+    
+    def __init__(self, model_manager: ModelManager, interval: float = 5.0):
+        self.model_manager = model_manager
+        self.interval = max(0.5, float(interval))
+        self._pending: Dict[str, str] = {}
+        self._failed: Dict[str, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='model-file-watcher', daemon=True)
+            self._thread.start()
+            logger.info(f"Watching model files every {self.interval:.1f}s")
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def poll(self) -> List[str]:
+        """Check every loaded model once, returning the IDs that were reloaded"""
+        reloaded = []
+        manager = self.model_manager
+        for model_id in list(manager.models):
+            disk_version = manager.get_disk_version(model_id)
+            if disk_version in ('missing', manager.model_versions.get(model_id), self._failed.get(model_id)):
+                self._pending.pop(model_id, None)
+                continue
+            
+            if self._pending.get(model_id) != disk_version:
+                self._pending[model_id] = disk_version  # Wait one more poll for the write to settle
+                continue
+            
+            del self._pending[model_id]
+            logger.info(f"Model file of {model_id} changed; reloading")
+            if manager.reload_model(model_id):
+                self._failed.pop(model_id, None)
+                reloaded.append(model_id)
+            else:
+                self._failed[model_id] = disk_version
+        return reloaded
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Model file watcher poll failed: {str(e)}")
+
+class _InferenceRequest:
+    """A single caller's rows waiting to be scored"""
+    __slots__ = ('inputs', 'future', 'enqueued_at')
+    
+    def __init__(self, inputs: np.ndarray):
+        self.inputs = inputs
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceBatcher:
+    """Groups concurrent inference requests per model into shared forward passes"""
+    
+    _STOP = object()
+    
+    def __init__(self, model_manager: ModelManager, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.model_manager = model_manager
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queues: Dict[str, queue.Queue] = {}
+        self._workers: Dict[str, threading.Thread] = {}
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+    
+    def predict(self, model_id: str, inputs: np.ndarray, timeout: Optional[float] = None) -> np.ndarray:
+        """Score a (n, H, W, C) array and return its (n, num_classes) softmax rows"""
+        return self.submit(model_id, inputs).result(timeout)
+    
+    def submit(self, model_id: str, inputs: np.ndarray) -> Future:
+        """Queue rows for the next batch of model_id and return a Future for the result"""
+        if inputs.ndim == 3:
+            inputs = np.expand_dims(inputs, axis=0)
+        
+        request = _InferenceRequest(inputs)
+        self._get_queue(model_id).put(request)
+        return request.future
+    
+    def stats(self) -> Dict[str, Dict]:
+        """Queue depth and batch size statistics per model"""
+        with self._lock:
+            result = {}
+            for model_id, stats in self._stats.items():
+                batches = stats['batches']
+                result[model_id] = {
+                    'queue_depth': self._queues[model_id].qsize() + stats['carried'],
+                    'requests': stats['requests'],
+                    'rows': stats['rows'],
+                    'batches': batches,
+                    'avg_batch_size': round(stats['rows'] / batches, 2) if batches else 0.0,
+                    'max_batch_size': stats['max_batch_size'],
+                    'batch_size_histogram': dict(sorted(stats['histogram'].items())),
+                    'avg_queue_wait_ms': round(stats['wait_seconds'] / stats['requests'] * 1000, 2) if stats['requests'] else 0.0,
+                    'avg_inference_ms': round(stats['inference_seconds'] / batches * 1000, 2) if batches else 0.0,
+                    'errors': stats['errors']
+                }
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'models': result
+            }
+    
+    def close(self):
+        """Stop all worker threads after the queued requests are served"""
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers.items())
+        for model_id, worker in workers:
+            self._queues[model_id].put(self._STOP)
+            worker.join()
+    
+    def _get_queue(self, model_id: str) -> queue.Queue:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("InferenceBatcher is closed")
+            
+            if model_id not in self._queues:
+                self._queues[model_id] = queue.Queue()
+                self._stats[model_id] = {
+                    'requests': 0, 'rows': 0, 'batches': 0, 'max_batch_size': 0,
+                    'histogram': Counter(), 'wait_seconds': 0.0, 'inference_seconds': 0.0,
+                    'errors': 0, 'carried': 0
+                }
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    args=(model_id,),
+                    name=f"inference-batcher-{model_id}",
+                    daemon=True
+                )
+                self._workers[model_id] = worker
+                worker.start()
+            return self._queues[model_id]
+    
+    def _worker_loop(self, model_id: str):
+        request_queue = self._queues[model_id]
+        carried = None
+        
+        while True:
+            first = carried if carried is not None else request_queue.get()
+            carried = None
+            if first is self._STOP:
+                return
+            
+            batch = [first]
+            rows = len(first.inputs)
+            deadline = time.perf_counter() + self.max_wait
+            
+            # Keep collecting until the batch is full or the wait budget runs out
+            while rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = request_queue.get(timeout=remaining) if remaining > 0 else request_queue.get_nowait()
+                except queue.Empty:
+                    break
+                
+                if request is not self._STOP and rows + len(request.inputs) <= self.max_batch_size:
+                    batch.append(request)
+                    rows += len(request.inputs)
+                    continue
+                
+                # Doesn't fit (or shutdown requested) - it leads the next batch
+                carried = request
+                break
+            
+            with self._lock:
+                self._stats[model_id]['carried'] = 1 if carried is not None else 0
+            
+            self._run_batch(model_id, batch)
+    
+    def _run_batch(self, model_id: str, batch: List[_InferenceRequest]):
+        started = time.perf_counter()
+        stats = self._stats[model_id]
+        
+        try:
+            # The lease keeps a hot reload from releasing this version mid-batch
+            with self.model_manager.lease(model_id) as model, metrics.stage('inference', model_id):
+                if model is None:
+                    raise RuntimeError(f"Model not available: {model_id}")
+                
+                inputs = np.concatenate([request.inputs for request in batch], axis=0)
+                
+                # A single oversized request is scored in max_batch_size chunks
+                outputs = []
+                for start in range(0, len(inputs), self.max_batch_size):
+                    chunk = inputs[start:start + self.max_batch_size]
+                    outputs.append(np.asarray(model.predict_on_batch(chunk)))
+                outputs = np.concatenate(outputs, axis=0)
+        except Exception as e:
+            logger.error(f"Batched inference failed for {model_id}: {str(e)}")
+            metrics.INFERENCE_ERRORS.inc(len(batch), model_id=model_id)
+            with self._lock:
+                stats['errors'] += len(batch)
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        
+        finished = time.perf_counter()
+        with self._lock:
+            stats['requests'] += len(batch)
+            stats['rows'] += len(inputs)
+            stats['batches'] += 1
+            stats['max_batch_size'] = max(stats['max_batch_size'], len(inputs))
+            stats['histogram'][len(inputs)] += 1
+            stats['wait_seconds'] += sum(started - request.enqueued_at for request in batch)
+            stats['inference_seconds'] += finished - started
+        metrics.INFERENCE_BATCH_ROWS.observe(len(inputs), model_id=model_id)
+        for request in batch:
+            metrics.STAGE_SECONDS.observe(started - request.enqueued_at, stage='queue_wait', model_id=model_id)
+        
+        # Hand each caller back its own rows
+        offset = 0
+        for request in batch:
+            count = len(request.inputs)
+            request.future.set_result(outputs[offset:offset + count])
+            offset += count
+        
+        logger.debug(f"Scored batch of {len(inputs)} rows for {model_id} in {(finished - started) * 1000:.1f}ms")
+
+class LeafImage:
+    """An upload decoded once and shared by classification, LAI and severity analysis
+    
+    With analysis_max_side set, JPEGs are decoded at a reduced DCT scale and the
+    colour-mask analyses run on a copy whose longest side is at most that many
+    pixels, either resized ('resize') or sampled every n-th pixel ('stride').
+    """
+    
+    ANALYSIS_MODES = ('resize', 'stride')
+    
+    def __init__(self, image: Image.Image, source: str = '<memory>',
+                 analysis_max_side: Optional[int] = None, analysis_mode: str = 'resize',
+                 full_size: Optional[Tuple[int, int]] = None):
+        if analysis_mode not in self.ANALYSIS_MODES:
+            raise ValueError(f"Unknown analysis mode: {analysis_mode}")
+        
+        self.source = source
+        self.analysis_max_side = analysis_max_side or None
+        self.analysis_mode = analysis_mode
+        self.full_size = full_size or image.size
+        self._image = image
+        self._rgb = None
+        self._hsv = None
+        self._model_inputs = {}
+        self.metrics: Dict[str, float] = {}  # Memoized LAI / severity results
+    
+    @classmethod
+    def _decode(cls, image: Image.Image, source: str, analysis_max_side: Optional[int],
+                analysis_mode: str) -> 'LeafImage':
+        full_size = image.size
+        if analysis_max_side and image.format == 'JPEG':
+            # libjpeg scales by 1/2, 1/4 or 1/8 while decoding, so the
+            # full-size bitmap is never built; the result stays >= the request
+            image.draft('RGB', (analysis_max_side, analysis_max_side))
+        with metrics.stage('decode'):
+            image.load()  # Decode now so every consumer shares the pixels
+        return cls(image, source=source, analysis_max_side=analysis_max_side,
+                   analysis_mode=analysis_mode, full_size=full_size)
+    
+    @classmethod
+    def open(cls, image_path: str, analysis_max_side: Optional[int] = None,
+             analysis_mode: str = 'resize') -> Optional['LeafImage']:
+        """Decode an image file, returning None if it cannot be read"""
+        if not os.path.exists(image_path):
+            logger.error(f"Image file not found: {image_path}")
+            return None
+        
+        try:
+            return cls._decode(Image.open(image_path), image_path, analysis_max_side, analysis_mode)
+        except Exception as e:
+            logger.error(f"Could not read image {image_path}: {str(e)}")
+            return None
+    
+    @classmethod
+    def from_bytes(cls, data, source: str = '<memory>', analysis_max_side: Optional[int] = None,
+                   analysis_mode: str = 'resize') -> Optional['LeafImage']:
+        """Decode an in-memory upload (bytes, memoryview or file-like object)"""
+        try:
+            if hasattr(data, 'read'):
+                data = data.read()
+            return cls._decode(Image.open(io.BytesIO(data)), source, analysis_max_side, analysis_mode)
+        except Exception as e:
+            logger.error(f"Could not decode image {source}: {str(e)}")
+            return None
+    
+    @property
+    def size(self) -> Tuple[int, int]:
+        """(width, height) of the decoded image"""
+        return self._image.size
+    
+    @property
+    def rgb(self) -> np.ndarray:
+        """H x W x 3 uint8 RGB pixels at analysis resolution (alpha dropped)"""
+        if self._rgb is None:
+            image = self._image if self._image.mode == 'RGB' else self._image.convert('RGB')
+            self._rgb = self._reduce_for_analysis(np.asarray(image, dtype=np.uint8))
+        return self._rgb
+    
+    def _reduce_for_analysis(self, rgb: np.ndarray) -> np.ndarray:
+        height, width = rgb.shape[:2]
+        longest = max(height, width)
+        if not self.analysis_max_side or longest <= self.analysis_max_side:
+            return rgb
+        
+        if self.analysis_mode == 'stride':
+            step = -(-longest // self.analysis_max_side)  # Ceiling division
+            return np.ascontiguousarray(rgb[::step, ::step])
+        
+        scale = self.analysis_max_side / longest
+        new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(rgb, new_size, interpolation=cv2.INTER_AREA)
+    
+    @property
+    def hsv(self) -> np.ndarray:
+        """H x W x 3 uint8 OpenCV HSV pixels at analysis resolution"""
+        if self._hsv is None:
+            with metrics.stage('color_convert'):
+                self._hsv = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2HSV)
+        return self._hsv
+    
+    def model_input(self, target_size: Tuple[int, int], fast: bool = False) -> np.ndarray:
+        """Normalized (1, H, W, 3) float32 tensor resized for a model
+        
+        fast trades the LANCZOS filter for a box reduce plus bilinear resize.
+        """
+        key = (target_size, fast)
+        if key not in self._model_inputs:
+            started = time.perf_counter()
+            image = self._image
             
             # Handle different image modes
             if image.mode == 'RGBA':
@@ -119,156 +1024,302 @@ class ImageProcessor:
                 image = image.convert('RGB')
             
             # Resize image
-            image = image.resize(target_size, Image.Resampling.LANCZOS)
+            if fast:
+                # Integer box reduction to within 2x of the target, then a cheap bilinear pass
+                image = image.resize(target_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+            else:
+                image = image.resize(target_size, Image.Resampling.LANCZOS)
             
-            # Convert to numpy array and normalize
+            # Convert to numpy array, normalize and add batch dimension
             image_array = np.array(image, dtype=np.float32) / 255.0
+            self._model_inputs[key] = np.expand_dims(image_array, axis=0)
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage='preprocess',
+                                          model_id=metrics.current_model_label())
+        
+        return self._model_inputs[key]
+
+
+def _as_leaf_image(image) -> Optional[LeafImage]:
+    """Accept either an already decoded LeafImage or an image path"""
+    if isinstance(image, LeafImage):
+        return image
+    return LeafImage.open(image)
+
+
+class ImageProcessor:
+    """Handles image preprocessing and analysis"""
+    
+    # HSV ranges shared by the per-image and batched colour-mask analyses
+    # Green color (leaf area) - adjusted ranges for better leaf detection
+    GREEN_RANGE = (np.array([35, 40, 40]), np.array([80, 255, 255]))
+    # Brown/dead areas
+    BROWN_RANGE = (np.array([8, 50, 20]), np.array([20, 255, 200]))
+    # Yellow/chlorotic areas
+    YELLOW_RANGE = (np.array([20, 100, 100]), np.array([30, 255, 255]))
+    # Dark spots/lesions
+    DARK_RANGE = (np.array([0, 0, 0]), np.array([180, 255, 50]))
+    MORPH_KERNEL = np.ones((3, 3), np.uint8)
+    
+    @staticmethod
+    def preprocess_for_model(image_path: Union[str, LeafImage], target_size: Tuple[int, int],
+                             fast: bool = False) -> Optional[np.ndarray]:
+        """Preprocess image for model prediction
+        
+        With fast=True a JPEG path is decoded at the smallest DCT scale that still
+        covers target_size and finished with a cheap resize instead of LANCZOS.
+        """
+        try:
+            if fast and not isinstance(image_path, LeafImage):
+                leaf_image = LeafImage.open(image_path, analysis_max_side=max(target_size))
+            else:
+                leaf_image = _as_leaf_image(image_path)
+            if leaf_image is None:
+                return None
             
-            # Add batch dimension
-            image_array = np.expand_dims(image_array, axis=0)
+            image_array = leaf_image.model_input(tuple(target_size), fast=fast)
             
             logger.debug(f"Image preprocessed successfully. Shape: {image_array.shape}")
             return image_array
-            
+        
         except Exception as e:
-            logger.error(f"Error preprocessing image {image_path}: {str(e)}")
+            logger.error(f"Error preprocessing image {getattr(image_path, 'source', image_path)}: {str(e)}")
+            return None
+    
+    @staticmethod
+    def preprocess_bytes_for_model(data, target_size: Tuple[int, int], fast: bool = False) -> Optional[np.ndarray]:
+        """Preprocess an in-memory upload for model prediction"""
+        leaf_image = LeafImage.from_bytes(data, analysis_max_side=max(target_size) if fast else None)
+        if leaf_image is None:
             return None
+        return ImageProcessor.preprocess_for_model(leaf_image, target_size, fast=fast)
     
     @staticmethod
-    def calculate_leaf_area_index(image_path: str) -> float:
+    def calculate_leaf_area_index(image_path: Union[str, LeafImage]) -> float:
         """Calculate Leaf Area Index using image processing"""
         try:
-            if not os.path.exists(image_path):
-                logger.error(f"Image file not found for LAI calculation: {image_path}")
+            leaf_image = _as_leaf_image(image_path)
+            if leaf_image is None:
+                logger.error(f"Could not read image for LAI calculation: {image_path}")
                 return 2.0
             
-            # Read image
-            image = cv2.imread(image_path)
-            if image is None:
-                logger.error(f"Could not read image: {image_path}")
-                return 2.0
-            
-            # Convert to HSV for better green detection
-            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            
-            # Define range for green color (leaf area)
-            # Adjusted ranges for better leaf detection
-            lower_green = np.array([35, 40, 40])
-            upper_green = np.array([80, 255, 255])
-            
-            # Create mask for green areas
-            mask = cv2.inRange(hsv, lower_green, upper_green)
-            
-            # Apply morphological operations to clean up the mask
-            kernel = np.ones((3, 3), np.uint8)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-            
-            # Calculate green area ratio
-            green_pixels = cv2.countNonZero(mask)
-            total_pixels = mask.shape[0] * mask.shape[1]
-            
-            if total_pixels == 0:
-                return 2.0
-            
-            green_ratio = green_pixels / total_pixels
-            
-            # Estimate LAI (scaled to typical range)
-            lai = round(green_ratio * 5.0, 1)
-            
-            # Clamp to reasonable LAI range
-            lai = max(0.1, min(lai, 8.0))
-            
-            logger.debug(f"LAI calculated: {lai} (green ratio: {green_ratio:.3f})")
-            return lai
-            
+            if 'leaf_area_index' not in leaf_image.metrics:
+                hsv = leaf_image.hsv
+                with metrics.stage('leaf_area_index'):
+                    leaf_image.metrics['leaf_area_index'] = ImageProcessor.leaf_area_index_from_hsv(hsv)
+            return leaf_image.metrics['leaf_area_index']
+        
         except Exception as e:
-            logger.error(f"Error calculating LAI for {image_path}: {str(e)}")
+            logger.error(f"Error calculating LAI for {getattr(image_path, 'source', image_path)}: {str(e)}")
             return 2.0  # Default reasonable value
     
     @staticmethod
-    def analyze_disease_severity(image_path: str) -> int:
+    def calculate_leaf_area_index_from_bytes(data) -> float:
+        """Calculate Leaf Area Index for an in-memory upload"""
+        leaf_image = LeafImage.from_bytes(data)
+        if leaf_image is None:
+            return 2.0
+        return ImageProcessor.calculate_leaf_area_index(leaf_image)
+    
+    @staticmethod
+    def leaf_area_index_from_hsv(hsv: np.ndarray) -> float:
+        """Calculate Leaf Area Index from an HSV image"""
+        # Create mask for green areas
+        mask = cv2.inRange(hsv, *ImageProcessor.GREEN_RANGE)
+        
+        # Apply morphological operations to clean up the mask
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, ImageProcessor.MORPH_KERNEL)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, ImageProcessor.MORPH_KERNEL)
+        
+        # Calculate green area ratio
+        green_pixels = cv2.countNonZero(mask)
+        total_pixels = mask.shape[0] * mask.shape[1]
+        
+        if total_pixels == 0:
+            return 2.0
+        
+        green_ratio = green_pixels / total_pixels
+        lai = ImageProcessor._lai_from_ratio(green_ratio)
+        
+        logger.debug(f"LAI calculated: {lai} (green ratio: {green_ratio:.3f})")
+        return lai
+    
+    @staticmethod
+    def _lai_from_ratio(green_ratio: float) -> float:
+        """Map a green area ratio to a clamped LAI estimate"""
+        # Estimate LAI (scaled to typical range)
+        lai = round(green_ratio * 5.0, 1)
+        
+        # Clamp to reasonable LAI range
+        return max(0.1, min(lai, 8.0))
+    
+    @staticmethod
+    def analyze_disease_severity(image_path: Union[str, LeafImage]) -> int:
         """Analyze disease severity using image processing"""
         try:
-            if not os.path.exists(image_path):
+            leaf_image = _as_leaf_image(image_path)
+            if leaf_image is None:
                 return 25
             
-            image = cv2.imread(image_path)
-            if image is None:
-                return 25
-            
-            # Convert to HSV for better analysis
-            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            
-            # Define ranges for diseased areas
-            diseased_masks = []
-            
-            # Brown/dead areas
-            lower_brown = np.array([8, 50, 20])
-            upper_brown = np.array([20, 255, 200])
-            brown_mask = cv2.inRange(hsv, lower_brown, upper_brown)
-            diseased_masks.append(brown_mask)
-            
-            # Yellow/chlorotic areas
-            lower_yellow = np.array([20, 100, 100])
-            upper_yellow = np.array([30, 255, 255])
-            yellow_mask = cv2.inRange(hsv, lower_yellow, upper_yellow)
-            diseased_masks.append(yellow_mask)
-            
-            # Dark spots/lesions
-            lower_dark = np.array([0, 0, 0])
-            upper_dark = np.array([180, 255, 50])
-            dark_mask = cv2.inRange(hsv, lower_dark, upper_dark)
-            diseased_masks.append(dark_mask)
-            
-            # Combine all disease masks
-            combined_mask = np.zeros_like(brown_mask)
-            for mask in diseased_masks:
-                combined_mask = cv2.bitwise_or(combined_mask, mask)
-            
-            # Apply morphological operations to clean up
-            kernel = np.ones((3, 3), np.uint8)
-            combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, kernel)
-            
-            # Calculate diseased area ratio
-            diseased_pixels = cv2.countNonZero(combined_mask)
-            total_pixels = combined_mask.shape[0] * combined_mask.shape[1]
-            
-            if total_pixels == 0:
-                return 25
-            
-            diseased_ratio = diseased_pixels / total_pixels
-            severity_percentage = int(diseased_ratio * 100)
-            
-            # Clamp to reasonable range
-            severity_percentage = max(5, min(severity_percentage, 90))
-            
-            logger.debug(f"Disease severity: {severity_percentage}% (diseased ratio: {diseased_ratio:.3f})")
-            return severity_percentage
-            
+            if 'disease_severity' not in leaf_image.metrics:
+                hsv = leaf_image.hsv
+                with metrics.stage('disease_severity'):
+                    leaf_image.metrics['disease_severity'] = ImageProcessor.disease_severity_from_hsv(hsv)
+            return leaf_image.metrics['disease_severity']
+        
         except Exception as e:
-            logger.error(f"Error analyzing disease severity for {image_path}: {str(e)}")
+            logger.error(f"Error analyzing disease severity for {getattr(image_path, 'source', image_path)}: {str(e)}")
+            return 25
+    
+    @staticmethod
+    def analyze_disease_severity_from_bytes(data) -> int:
+        """Analyze disease severity for an in-memory upload"""
+        leaf_image = LeafImage.from_bytes(data)
+        if leaf_image is None:
             return 25
+        return ImageProcessor.analyze_disease_severity(leaf_image)
+    
+    @staticmethod
+    def disease_severity_from_hsv(hsv: np.ndarray) -> int:
+        """Analyze disease severity from an HSV image"""
+        # Combine brown/dead, yellow/chlorotic and dark lesion masks
+        combined_mask = cv2.inRange(hsv, *ImageProcessor.BROWN_RANGE)
+        for lower, upper in (ImageProcessor.YELLOW_RANGE, ImageProcessor.DARK_RANGE):
+            combined_mask = cv2.bitwise_or(combined_mask, cv2.inRange(hsv, lower, upper))
+        
+        # Apply morphological operations to clean up
+        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, ImageProcessor.MORPH_KERNEL)
+        
+        # Calculate diseased area ratio
+        diseased_pixels = cv2.countNonZero(combined_mask)
+        total_pixels = combined_mask.shape[0] * combined_mask.shape[1]
+        
+        if total_pixels == 0:
+            return 25
+        
+        diseased_ratio = diseased_pixels / total_pixels
+        severity_percentage = ImageProcessor._severity_from_ratio(diseased_ratio)
+        
+        logger.debug(f"Disease severity: {severity_percentage}% (diseased ratio: {diseased_ratio:.3f})")
+        return severity_percentage
+    
+    @staticmethod
+    def _severity_from_ratio(diseased_ratio: float) -> int:
+        """Map a diseased area ratio to a clamped severity percentage"""
+        severity_percentage = int(diseased_ratio * 100)
+        
+        # Clamp to reasonable range
+        return max(5, min(severity_percentage, 90))
+    
+    @staticmethod
+    def hsv_stack(images: np.ndarray, color_order: str = 'rgb') -> np.ndarray:
+        """Convert an N x H x W x 3 uint8 stack to HSV with a single OpenCV call"""
+        n, height, width, _ = images.shape
+        code = cv2.COLOR_RGB2HSV if color_order == 'rgb' else cv2.COLOR_BGR2HSV
+        # Colour conversion is per pixel, so the stack can be treated as one tall image
+        flat = np.ascontiguousarray(images, dtype=np.uint8).reshape(n * height, width, 3)
+        return cv2.cvtColor(flat, code).reshape(n, height, width, 3)
+    
+    @staticmethod
+    def color_masks_batch(hsv: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Cleaned green and diseased masks for an N x H x W x 3 HSV stack"""
+        n, height, width, _ = hsv.shape
+        flat = hsv.reshape(n * height, width, 3)
+        
+        # All four range tests run once over the whole stack
+        green = cv2.inRange(flat, *ImageProcessor.GREEN_RANGE)
+        diseased = cv2.inRange(flat, *ImageProcessor.BROWN_RANGE)
+        np.bitwise_or(diseased, cv2.inRange(flat, *ImageProcessor.YELLOW_RANGE), out=diseased)
+        np.bitwise_or(diseased, cv2.inRange(flat, *ImageProcessor.DARK_RANGE), out=diseased)
+        green = green.reshape(n, height, width)
+        diseased = diseased.reshape(n, height, width)
+        
+        # Morphology looks at neighbours, so it must not cross image boundaries
+        kernel = ImageProcessor.MORPH_KERNEL
+        for i in range(n):
+            green[i] = cv2.morphologyEx(
+                cv2.morphologyEx(green[i], cv2.MORPH_OPEN, kernel), cv2.MORPH_CLOSE, kernel
+            )
+            diseased[i] = cv2.morphologyEx(diseased[i], cv2.MORPH_OPEN, kernel)
+        return green, diseased
+    
+    @staticmethod
+    def analyze_color_metrics_batch(images: np.ndarray, color_order: str = 'rgb') -> Tuple[np.ndarray, np.ndarray]:
+        """LAI and disease severity for an N x H x W x 3 stack from one HSV conversion
+        
+        Results are identical to calling calculate_leaf_area_index and
+        analyze_disease_severity on each image.
+        """
+        n, height, width, _ = images.shape
+        total_pixels = height * width
+        if n == 0 or total_pixels == 0:
+            return np.full(n, 2.0), np.full(n, 25, dtype=np.int64)
+        
+        green, diseased = ImageProcessor.color_masks_batch(ImageProcessor.hsv_stack(images, color_order))
+        green_ratios = np.count_nonzero(green.reshape(n, -1), axis=1) / total_pixels
+        diseased_ratios = np.count_nonzero(diseased.reshape(n, -1), axis=1) / total_pixels
+        
+        # Scalar rounding keeps the per-image functions' exact semantics
+        lai = np.array([ImageProcessor._lai_from_ratio(float(ratio)) for ratio in green_ratios])
+        severity = np.array([ImageProcessor._severity_from_ratio(float(ratio)) for ratio in diseased_ratios], dtype=np.int64)
+        return lai, severity
+    
+    @staticmethod
+    def calculate_leaf_area_index_batch(images: np.ndarray, color_order: str = 'rgb') -> np.ndarray:
+        """Leaf Area Index for every image of an N x H x W x 3 stack"""
+        return ImageProcessor.analyze_color_metrics_batch(images, color_order)[0]
+    
+    @staticmethod
+    def analyze_disease_severity_batch(images: np.ndarray, color_order: str = 'rgb') -> np.ndarray:
+        """Disease severity percentage for every image of an N x H x W x 3 stack"""
+        return ImageProcessor.analyze_color_metrics_batch(images, color_order)[1]
+    
+    @staticmethod
+    def fill_color_metrics(leaf_images: List[LeafImage], max_stack: int = 8):
+        """Compute and memoize LAI and severity for many LeafImages, stacking same-sized ones"""
+        groups: Dict[Tuple[int, ...], List[LeafImage]] = {}
+        for leaf_image in leaf_images:
+            if 'leaf_area_index' not in leaf_image.metrics or 'disease_severity' not in leaf_image.metrics:
+                groups.setdefault(leaf_image.rgb.shape, []).append(leaf_image)
+        
+        for group in groups.values():
+            for start in range(0, len(group), max_stack):
+                chunk = group[start:start + max_stack]
+                with metrics.stage('color_metrics_batch'):
+                    lai, severity = ImageProcessor.analyze_color_metrics_batch(
+                        np.stack([leaf_image.rgb for leaf_image in chunk])
+                    )
+                for leaf_image, lai_value, severity_value in zip(chunk, lai, severity):
+                    leaf_image.metrics['leaf_area_index'] = float(lai_value)
+                    leaf_image.metrics['disease_severity'] = int(severity_value)
 
 class PredictionAnalyzer:
     """Analyzes model predictions and generates insights"""
     
     @staticmethod
-    def calculate_damage_percentage(predictions: np.ndarray, classes: List[str], image_path: str = None) -> int:
-        """Calculate damage percentage from predictions"""
+    @metrics.timed('damage_percentage')
+    def calculate_damage_percentage(predictions: np.ndarray, classes: List[str],
+                                    image_path: Union[str, LeafImage, None] = None,
+                                    image_damage: Optional[int] = None) -> int:
+        """Calculate damage percentage from predictions
+        
+        image_path may be an already decoded LeafImage; image_damage supplies a
+        severity computed elsewhere (e.g. in a worker process) instead.
+        """
         try:
             predicted_class_idx = np.argmax(predictions[0])
             predicted_class = classes[predicted_class_idx]
             confidence = float(predictions[0][predicted_class_idx])
             
+            if image_damage is None and image_path:
+                image_damage = ImageProcessor.analyze_disease_severity(image_path)
+            
             # Base calculation on prediction
             if 'healthy' in predicted_class.lower():
                 # For healthy plants, low damage with some uncertainty factor
                 base_damage = max(0, int((1 - confidence) * 20))
                 
                 # Add image analysis for more accurate assessment
-                if image_path:
-                    image_damage = ImageProcessor.analyze_disease_severity(image_path)
+                if image_damage is not None:
                     # Weight image analysis lower for healthy predictions
                     final_damage = int((base_damage * 0.7) + (image_damage * 0.3))
                     return min(25, final_damage)  # Cap healthy damage at 25%
@@ -278,14 +1329,13 @@ class PredictionAnalyzer:
                 # For diseased plants, combine confidence with image analysis
                 base_damage = int(confidence * 60) + 20  # 20-80% range
                 
-                if image_path:
-                    image_damage = ImageProcessor.analyze_disease_severity(image_path)
+                if image_damage is not None:
                     # Weight both factors for diseased predictions
                     final_damage = int((base_damage * 0.6) + (image_damage * 0.4))
                     return min(95, max(15, final_damage))
                 
                 return min(90, base_damage)
-                
+        
         except Exception as e:
             logger.error(f"Error calculating damage percentage: {str(e)}")
             return 30  # Conservative default
@@ -350,10 +1400,23 @@ class PredictionAnalyzer:
                     break
             
             return formatted if formatted else "Unknown Disease"
-            
+        
         except Exception as e:
             logger.error(f"Error formatting disease name {predicted_class}: {str(e)}")
             return "Disease Detected"
+    
+    @staticmethod
+    def selection_score(predictions: np.ndarray) -> float:
+        """Top-class confidence above chance (1 / number of classes), scaled to 0..1
+        
+        Raw maxima are not comparable across models with different class
+        counts: a uniform guess already scores 0.5 with two classes.
+        """
+        probabilities = np.asarray(predictions).reshape(-1)
+        chance = 1.0 / len(probabilities)
+        if chance >= 1.0:
+            return 0.0
+        return float((np.max(probabilities) - chance) / (1.0 - chance))
 
 # Comprehensive disease treatment recommendations
 TREATMENT_RECOMMENDATIONS = {
@@ -442,7 +1505,107 @@ def get_treatment_recommendation(predicted_class: str) -> str:
                 return f"{treatment}\n\nGeneral recommendation based on disease type. Consult local experts for specific treatment protocols."
         
         return TREATMENT_RECOMMENDATIONS['default_diseased']
-        
+    
     except Exception as e:
         logger.error(f"Error getting treatment recommendation for {predicted_class}: {str(e)}")
-        return TREATMENT_RECOMMENDATIONS['default_diseased']
\ No newline at end of file
+        return TREATMENT_RECOMMENDATIONS['default_diseased']
+
+class ClassMetadata:
+    """Display fields of one model's classes, resolved once and indexed by class index
+    
+    Replaces the per-prediction string processing of PredictionAnalyzer and
+    get_treatment_recommendation with array lookups right after argmax.
+    """
+    
+    SEVERITY_THRESHOLDS = np.array([15, 30, 55, 75])
+    SEVERITY_LEVELS = np.array(['Minimal', 'Mild', 'Moderate', 'Severe', 'Critical'], dtype=object)
+    
+    def __init__(self, classes: List[str]):
+        self.classes = np.array(classes, dtype=object)
+        self.is_healthy = np.array(['healthy' in name.lower() for name in classes], dtype=bool)
+        self.health_status = np.where(self.is_healthy, 'Healthy', 'Diseased').astype(object)
+        self.display_name = np.array([PredictionAnalyzer.format_disease_name(name) for name in classes], dtype=object)
+        self.crop = np.array([name.split('_')[0] for name in classes], dtype=object)
+        self.treatment = np.array([get_treatment_recommendation(name) for name in classes], dtype=object)
+        self.label = np.array([self.display_label(name) for name in classes], dtype=object)
+    
+    @staticmethod
+    def display_label(class_name: str) -> str:
+        """Human-readable name for any class, healthy ones included"""
+        disease = PredictionAnalyzer.format_disease_name(class_name)
+        if disease is None:
+            return f"Healthy {class_name.split('_')[0].capitalize()}"
+        return disease
+    
+    def __len__(self) -> int:
+        return len(self.classes)
+    
+    @metrics.timed('postprocess')
+    def summarize(self, predictions: np.ndarray, image_damage: Optional[np.ndarray] = None) -> List[Dict]:
+        """Response fields for every row of an (n, num_classes) prediction matrix
+        
+        Damage, severity and confidence follow PredictionAnalyzer exactly, computed
+        for the whole batch at once; image_damage holds per-row disease severity.
+        """
+        predictions = np.asarray(predictions)
+        rows = np.arange(len(predictions))
+        class_index = np.argmax(predictions, axis=1)
+        confidence = predictions[rows, class_index].astype(np.float64)
+        healthy = self.is_healthy[class_index]
+        
+        # Same arithmetic as calculate_damage_percentage, floor == int() for these non-negative values
+        healthy_base = np.maximum(0, np.floor((1 - confidence) * 20))
+        diseased_base = np.floor(confidence * 60) + 20
+        if image_damage is None:
+            damage = np.where(healthy, healthy_base, np.minimum(90, diseased_base))
+        else:
+            image_damage = np.asarray(image_damage, dtype=np.float64)
+            damage = np.where(
+                healthy,
+                np.minimum(25, np.floor(healthy_base * 0.7 + image_damage * 0.3)),
+                np.clip(np.floor(diseased_base * 0.6 + image_damage * 0.4), 15, 95)
+            )
+        damage = damage.astype(np.int64)
+        severity = self.SEVERITY_LEVELS[np.searchsorted(self.SEVERITY_THRESHOLDS, damage, side='right')]
+        # Python's round() to match the single-image responses digit for digit
+        confidence_pct = [round(value * 100, 1) for value in confidence.tolist()]
+        
+        columns = zip(self.classes[class_index], self.health_status[class_index], damage.tolist(), severity,
+                      self.display_name[class_index], self.treatment[class_index], confidence_pct)
+        return [{
+            'healthStatus': health_status,
+            'damagePercentage': damage_percentage,
+            'severityLevel': severity_level,
+            'detectedDisease': disease,
+            'recommendation': treatment,
+            'confidence': confidence_value,
+            'predicted_class': predicted_class
+        } for predicted_class, health_status, damage_percentage, severity_level, disease, treatment, confidence_value
+            in columns]
+    
+    @metrics.timed('top_k')
+    def top_k(self, predictions: np.ndarray, k: int, threshold: float = 0.0) -> List[List[Dict]]:
+        """Ranked (class, confidence %, display name) lists for every row of a prediction matrix
+        
+        Uses argpartition so only k columns per row are sorted. The top class is
+        always listed; the others only when their probability reaches threshold.
+        """
+        predictions = np.asarray(predictions)
+        k = max(1, min(int(k), predictions.shape[1]))
+        candidates = np.argpartition(-predictions, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(predictions, candidates, axis=1)
+        
+        # Rank by descending score, ties by class index as argmax does
+        order = np.lexsort((candidates, -scores), axis=-1)
+        indices = np.take_along_axis(candidates, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1).astype(np.float64)
+        keep = scores >= threshold
+        keep[:, 0] = True
+        
+        names = self.classes[indices].tolist()
+        labels = self.label[indices].tolist()
+        keep = keep.tolist()
+        scores = scores.tolist()
+        return [[{'class': name, 'confidence': round(score * 100, 1), 'displayName': label}
+                 for name, score, label, kept in zip(row_names, row_scores, row_labels, row_keep) if kept]
+                for row_names, row_scores, row_labels, row_keep in zip(names, scores, labels, keep)]
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class PredictionCache:
+    """Content-addressed cache of analysis results keyed by image hash and model version"""
+    
+    def __init__(self, max_entries: int = 1024, disk_dir: Optional[str] = None):
+        self.max_entries = max(0, int(max_entries))
+        self.disk_dir = disk_dir or None
+        self._entries = OrderedDict()  # Least recently used first
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0,
+            'stores': 0, 'evictions': 0, 'disk_errors': 0
+        }
+        
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+    
+    @staticmethod
+    def make_key(image_bytes: bytes, model_id: str, model_version: str) -> str:
+        """Build the cache key for an image, model and model version"""
+        image_digest = hashlib.sha256(image_bytes).hexdigest()
+        return hashlib.sha256(f"{model_id}:{model_version}:{image_digest}".encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """Look up a result, returning (result, tier) or (None, None) on a miss"""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                self._counters['memory_hits'] += 1
+                return result, 'memory'
+        
+        result = self._read_disk(key)
+        with self._lock:
+            if result is None:
+                self._counters['misses'] += 1
+                return None, None
+            
+            # Promote disk hits into the in-process tier
+            self._counters['hits'] += 1
+            self._counters['disk_hits'] += 1
+            self._store_memory(key, result)
+            return result, 'disk'
+    
+    def put(self, key: str, result: Dict):
+        """Store a result in every enabled tier"""
+        with self._lock:
+            self._counters['stores'] += 1
+            self._store_memory(key, result)
+        self._write_disk(key, result)
+    
+    def clear(self):
+        """Drop the in-process tier"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': round(self._counters['hits'] / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk_enabled': self.disk_dir is not None
+            }
+    
+    def _store_memory(self, key: str, result: Dict):
+        if self.max_entries == 0:
+            return
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+    
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+    
+    def _read_disk(self, key: str) -> Optional[Dict]:
+        if not self.disk_dir:
+            return None
+        
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {str(e)}")
+            with self._lock:
+                self._counters['disk_errors'] += 1
+            return None
+    
+    def _write_disk(self, key: str, result: Dict):
+        if not self.disk_dir:
+            return
+        
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so readers never see a partial entry
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not write cache entry {path}: {str(e)}")
+            with self._lock:
+                self._counters['disk_errors'] += 1
@@ -0,0 +1,154 @@
+import cProfile
+import io
+import itertools
+import logging
+import os
+import pstats
+import re
+import shutil
+import tarfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+PROFILE_FORMATS = {
+    'prof': ('.prof', 'application/octet-stream'),
+    'text': ('.txt', 'text/plain; charset=utf-8'),
+    'tf': ('.tf', 'application/gzip')
+}
+
+class RequestProfiler:
+    """cProfile (and optionally TensorFlow trace) captures of single requests, opted into or sampled 1-in-N"""
+    
+    def __init__(self, directory: str, sample_every: int = 0, tf_trace: bool = False,
+                 max_profiles: int = 100, summary_lines: int = 60):
+        self.directory = directory
+        self.sample_every = max(0, int(sample_every))
+        self.tf_trace = tf_trace
+        self.max_profiles = max(1, int(max_profiles))
+        self.summary_lines = summary_lines
+        self._counter = itertools.count(1)
+        # One capture at a time: profilers and the TF trace are process-wide
+        self._active = threading.Lock()
+    
+    def should_profile(self, requested: bool = False) -> bool:
+        """Whether to profile a request: an explicit ask, or every sample_every-th request"""
+        if requested:
+            return True
+        if not self.sample_every:
+            return False
+        return next(self._counter) % self.sample_every == 0
+    
+    @contextmanager
+    def profile(self, label: str):
+        """Profile the calling thread for the block, yielding the profile ID (None while another capture runs)"""
+        if not self._active.acquire(blocking=False):
+            yield None
+            return
+        
+        try:
+            profile_id = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}-{re.sub(r'[^A-Za-z0-9_-]', '_', label)}"
+            os.makedirs(self.directory, exist_ok=True)
+            tf_dir = self._start_tf_trace(profile_id) if self.tf_trace else None
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                yield profile_id
+            finally:
+                profiler.disable()
+                seconds = time.perf_counter() - started
+                if tf_dir:
+                    self._stop_tf_trace()
+                self._save(profile_id, label, profiler, seconds)
+        finally:
+            self._active.release()
+    
+    def _start_tf_trace(self, profile_id: str) -> Optional[str]:
+        import tensorflow as tf
+        
+        tf_dir = os.path.join(self.directory, profile_id + '.tf')
+        try:
+            tf.profiler.experimental.start(tf_dir)
+            return tf_dir
+        except Exception as e:
+            logger.warning(f"TensorFlow trace not started: {str(e)}")
+            return None
+    
+    def _stop_tf_trace(self):
+        import tensorflow as tf
+        
+        try:
+            tf.profiler.experimental.stop()
+        except Exception as e:
+            logger.warning(f"TensorFlow trace not saved: {str(e)}")
+    
+    def _save(self, profile_id: str, label: str, profiler: cProfile.Profile, seconds: float):
+        """Write the raw stats and a cumulative-time summary, then prune old captures"""
+        base = os.path.join(self.directory, profile_id)
+        try:
+            profiler.dump_stats(base + '.prof')
+            summary = io.StringIO()
+            summary.write(f"{label} in process {os.getpid()}: {seconds * 1000:.1f}ms\n\n")
+            pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(self.summary_lines)
+            with open(base + '.txt', 'w') as f:
+                f.write(summary.getvalue())
+            logger.info(f"Saved profile {profile_id} ({seconds * 1000:.1f}ms)")
+        except Exception as e:
+            logger.warning(f"Failed to save profile {profile_id}: {str(e)}")
+        self._prune()
+    
+    def _prune(self):
+        for profile in self.list_profiles()[self.max_profiles:]:
+            base = os.path.join(self.directory, profile['id'])
+            for extension in ('.prof', '.txt'):
+                if os.path.exists(base + extension):
+                    os.remove(base + extension)
+            shutil.rmtree(base + '.tf', ignore_errors=True)
+    
+    def list_profiles(self) -> List[Dict]:
+        """Saved captures, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.prof'):
+                continue
+            path = os.path.join(self.directory, name)
+            profile_id = name[:-len('.prof')]
+            stat = os.stat(path)
+            profiles.append({
+                'id': profile_id,
+                'created': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds'),
+                'size_bytes': stat.st_size,
+                'tf_trace': os.path.isdir(os.path.join(self.directory, profile_id + '.tf'))
+            })
+        profiles.sort(key=lambda profile: profile['id'], reverse=True)
+        return profiles
+    
+    def export(self, profile_id: str, kind: str = 'prof') -> Optional[Tuple[str, bytes, str]]:
+        """(filename, data, content type) of one capture, or None if it does not exist"""
+        if kind not in PROFILE_FORMATS or not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        extension, content_type = PROFILE_FORMATS[kind]
+        path = os.path.join(self.directory, profile_id + extension)
+        
+        if kind == 'tf':
+            # The TensorFlow trace is a directory; ship it as a tarball for TensorBoard
+            if not os.path.isdir(path):
+                return None
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+                archive.add(path, arcname=profile_id + extension)
+            return profile_id + '.tf.tar.gz', buffer.getvalue(), content_type
+        
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            return profile_id + extension, f.read(), content_type
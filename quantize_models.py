@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Post-training quantization of MODEL_CONFIG models
+Writes dynamic-range and full-int8 TFLite variants next to each .h5 (the int8
+one calibrated on sample images) and reports top-1 agreement, confidence
+drift, size and latency of every variant against the float model. Select a
+variant per model with 'variant' in MODEL_CONFIG or MODEL_VARIANTS=model1=int8.
+
+Example:
+    python quantize_models.py --model model1 --calibration samples/train --samples samples/val
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import Dict, List
+
+import numpy as np
+import tensorflow as tf
+
+from config import Config
+from export_models import export_tflite, median_latency_ms
+from model_utils import MODEL_VARIANTS, ImageProcessor, TFLiteAdapter, serving_artifact_path
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('quantize_models')
+
+QUANTIZED_VARIANTS = [variant for variant in MODEL_VARIANTS if variant != 'float']
+
+def list_images(directory: str) -> List[str]:
+    return sorted(os.path.join(root, name) for root, _, files in os.walk(directory) for name in files
+                  if name.rsplit('.', 1)[-1].lower() in Config.ALLOWED_EXTENSIONS)
+
+def load_images(paths: List[str], config: Dict, count: int) -> np.ndarray:
+    """Preprocessed images, topped up with synthetic leaves when too few samples are given"""
+    size = tuple(config['image_size'])
+    tensors = [tensor for tensor in (ImageProcessor.preprocess_for_model(path, size) for path in paths[:count])
+               if tensor is not None]
+    
+    if len(tensors) < count:
+        from benchmarks.samples import synthetic_jpeg
+        logger.warning(f"Only {len(tensors)} sample images; adding {count - len(tensors)} synthetic leaves "
+                       f"(real images give a more faithful calibration and report)")
+        for seed in range(count - len(tensors)):
+            tensors.append(ImageProcessor.preprocess_bytes_for_model(synthetic_jpeg(0.3, seed), size))
+    return np.concatenate(tensors, axis=0)
+
+def compare(float_outputs: np.ndarray, outputs: np.ndarray) -> Dict:
+    """Top-1 agreement and drift of the float model's top-class confidence"""
+    top1 = np.argmax(float_outputs, axis=1)
+    rows = np.arange(len(top1))
+    drift = np.abs(outputs[rows, top1] - float_outputs[rows, top1])
+    return {
+        'top1_agreement': float(np.mean(np.argmax(outputs, axis=1) == top1)),
+        'mean_confidence_drift': float(drift.mean()),
+        'max_confidence_drift': float(drift.max())
+    }
+
+def quantize_model(model_id: str, config: Dict, variants: List[str], calibration: np.ndarray,
+                   evaluation: np.ndarray, repeat: int) -> List[Dict]:
+    """Write the quantized variants of one model and compare them with the float model"""
+    model_path = config['model_path']
+    model = tf.keras.models.load_model(model_path, compile=False)
+    float_outputs = np.asarray(model.predict_on_batch(evaluation))
+    batch = evaluation[:16]
+    
+    rows = [{
+        'variant': 'float',
+        'size_mb': os.path.getsize(model_path) / (1024 * 1024),
+        'ms_per_image': median_latency_ms(model, batch, repeat),
+        'top1_agreement': 1.0, 'mean_confidence_drift': 0.0, 'max_confidence_drift': 0.0
+    }]
+    
+    def representative_data():
+        for index in range(len(calibration)):
+            yield [calibration[index:index + 1]]
+    
+    for variant in variants:
+        artifact_path = serving_artifact_path(model_path, 'tflite', variant)
+        export_tflite(model, artifact_path, quantization=variant, representative_data=representative_data)
+        logger.info(f"Wrote {variant} variant of {model_id} to {artifact_path}")
+        
+        quantized = TFLiteAdapter(artifact_path)
+        rows.append({
+            'variant': variant,
+            'size_mb': os.path.getsize(artifact_path) / (1024 * 1024),
+            'ms_per_image': median_latency_ms(quantized, batch, repeat),
+            **compare(float_outputs, quantized.predict_on_batch(evaluation))
+        })
+    return rows
+
+def print_report(model_id: str, rows: List[Dict], evaluated: int):
+    print(f"\n{model_id} ({evaluated} evaluation images)")
+    print(f"  {'variant':<10}{'size MB':>9}{'ms/img':>9}{'speedup':>9}{'top-1':>8}{'drift':>9}{'max drift':>11}")
+    reference_ms = rows[0]['ms_per_image']
+    for row in rows:
+        print(f"  {row['variant']:<10}{row['size_mb']:>9.2f}{row['ms_per_image']:>9.2f}"
+              f"{reference_ms / row['ms_per_image']:>8.1f}x{row['top1_agreement'] * 100:>7.1f}%"
+              f"{row['mean_confidence_drift']:>9.4f}{row['max_confidence_drift']:>11.4f}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Write quantized model variants and report their accuracy drift')
+    parser.add_argument('--model', nargs='+', help='Model IDs to quantize (default: all with a .h5 file)')
+    parser.add_argument('--variant', nargs='+', choices=QUANTIZED_VARIANTS, default=QUANTIZED_VARIANTS,
+                        help='Variants to write (default: dynamic int8)')
+    parser.add_argument('--calibration', help='Directory of representative images for int8 calibration')
+    parser.add_argument('--calibration-count', type=int, default=100, help='Calibration images (default: 100)')
+    parser.add_argument('--samples', help='Directory of evaluation images (default: the calibration directory)')
+    parser.add_argument('--sample-count', type=int, default=200, help='Evaluation images (default: 200)')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed runs for latency (default: 10)')
+    args = parser.parse_args(argv)
+    
+    model_ids = args.model or [model_id for model_id, config in Config.MODEL_CONFIG.items()
+                               if os.path.exists(config['model_path'])]
+    calibration_paths = list_images(args.calibration) if args.calibration else []
+    sample_dir = args.samples or args.calibration
+    sample_paths = list_images(sample_dir) if sample_dir else []
+    
+    exit_code = 0
+    for model_id in model_ids:
+        config = Config.MODEL_CONFIG.get(model_id)
+        if config is None or not os.path.exists(config['model_path']):
+            logger.error(f"Skipping {model_id}: no model file")
+            exit_code = 1
+            continue
+        
+        try:
+            calibration = load_images(calibration_paths, config, args.calibration_count)
+            evaluation = load_images(sample_paths, config, min(args.sample_count, max(len(sample_paths), 16)))
+            rows = quantize_model(model_id, config, args.variant, calibration, evaluation, args.repeat)
+        except Exception as e:
+            logger.error(f"Failed to quantize {model_id}: {str(e)}")
+            exit_code = 1
+            continue
+        print_report(model_id, rows, len(evaluation))
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
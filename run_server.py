@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Production launcher: gunicorn with a preloaded master and pinned workers
+The master imports the application, TensorFlow and OpenCV, builds the model
+class tables and reads every model file into memory (.h5 weights as numpy
+arrays, TFLite flatbuffers as bytes), then freezes it all out of the garbage
+collector so forked workers share those pages copy-on-write. TensorFlow's
+runtime is not fork-safe (a worker forked after a model was loaded hangs on
+its first predict), so each worker builds its models from the shared
+snapshots right after the fork, with intra-op and inter-op thread counts and
+CPU affinity limited to its share of the cores. TFLite interpreters run from
+the shared buffer; Keras copies the weights into per-worker variables.
+
+Run with:
+    WEB_WORKERS=4 WEB_THREADS=8 python run_server.py
+"""
+import gc
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from metrics import process_memory
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('run_server')
+
+def env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+CPU_IDS = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+WORKERS = max(1, env_int('WEB_WORKERS', 2))
+THREADS = max(1, env_int('WEB_THREADS', 4))
+# Each worker gets an equal slice of the cores for TensorFlow and OpenCV thread pools
+CORES_PER_WORKER = max(1, len(CPU_IDS) // WORKERS)
+INTRA_OP_THREADS = env_int('WORKER_INTRA_OP_THREADS', CORES_PER_WORKER)
+INTER_OP_THREADS = env_int('WORKER_INTER_OP_THREADS', 1)
+PIN_WORKERS = os.environ.get('WORKER_CPU_PINNING', 'true').lower() in ('1', 'true', 'yes') and len(CPU_IDS) >= WORKERS
+
+# Workers build models after the fork; keep the import in the master from initializing TensorFlow
+EAGER_MODEL_LOADING = os.environ.get('MODEL_LAZY_LOADING', 'false').lower() not in ('1', 'true', 'yes')
+os.environ['MODEL_LAZY_LOADING'] = 'true'
+
+def report_memory(master_pid: int, worker_pids: List[int]):
+    """Log per-process and total memory; PSS splits shared pages between the processes using them"""
+    total = {'rss_mb': 0.0, 'pss_mb': 0.0}
+    for label, pid in [('master', master_pid)] + [(f'worker {pid}', pid) for pid in worker_pids]:
+        memory = process_memory(pid)
+        if memory is None:
+            logger.info(f"{label}: memory unavailable")
+            continue
+        total['rss_mb'] += memory['rss_mb']
+        total['pss_mb'] += memory['pss_mb']
+        logger.info(f"{label}: RSS {memory['rss_mb']:.0f}MB, PSS {memory['pss_mb']:.0f}MB, "
+                    f"shared {memory['shared_mb']:.0f}MB, private {memory['private_mb']:.0f}MB")
+    logger.info(f"Total: PSS {total['pss_mb']:.0f}MB (RSS sum {total['rss_mb']:.0f}MB double-counts shared pages)")
+
+def preload():
+    """Import everything workers share and snapshot the models without starting TensorFlow"""
+    started = time.perf_counter()
+    import lazy_imports
+    import server
+    
+    # TensorFlow and OpenCV otherwise load on first use; importing them here lets
+    # every worker share their pages (importing does not start the TF runtime)
+    if not server.app.config['MOCK_MODE']:
+        lazy_imports.preload()
+        # Weights and class tables are read once here; workers build models from them
+        server.model_manager.snapshot_models()
+    
+    # Objects created so far are never collected; keeping the collector off
+    # their pages stops it from un-sharing them in every worker
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded application in {time.perf_counter() - started:.1f}s "
+                f"({gc.get_freeze_count()} objects frozen)")
+    return server
+
+def build_options(ready_workers) -> Dict:
+    """gunicorn settings and hooks for the preloaded, pinned worker pool"""
+    # Core slice of each live worker, keyed by gunicorn's per-worker age (master side)
+    slots: Dict[int, int] = {}
+    
+    def pre_fork(arbiter, worker):
+        # A replacement takes the slice its predecessor freed, never a live worker's
+        free = sorted(set(range(WORKERS)) - set(slots.values()))
+        worker.slot = free[0] if free else None
+        if worker.slot is not None:
+            slots[worker.age] = worker.slot
+    
+    def child_exit(arbiter, worker):
+        slots.pop(worker.age, None)
+    
+    def post_fork(arbiter, worker):
+        # Workers beyond WORKERS (e.g. added with TTIN) run unpinned
+        if PIN_WORKERS and worker.slot is not None:
+            cpus = CPU_IDS[worker.slot * CORES_PER_WORKER:(worker.slot + 1) * CORES_PER_WORKER]
+            os.sched_setaffinity(0, cpus)
+        
+        # Thread pools are sized before TensorFlow's runtime starts in this process
+        import cv2
+        import tensorflow as tf
+        cv2.setNumThreads(INTRA_OP_THREADS)
+        tf.config.threading.set_intra_op_parallelism_threads(INTRA_OP_THREADS)
+        tf.config.threading.set_inter_op_parallelism_threads(INTER_OP_THREADS)
+    
+    def post_worker_init(worker):
+        import server
+        started = time.perf_counter()
+        if not server.app.config['MOCK_MODE'] and EAGER_MODEL_LOADING:
+            server.model_manager.load_all_models()
+            server.model_manager.lazy = False
+        server.start_model_watcher()
+        pinned = sorted(os.sched_getaffinity(0)) if PIN_WORKERS and worker.slot is not None else 'all'
+        logger.info(f"Worker {os.getpid()} ready in {time.perf_counter() - started:.1f}s "
+                    f"(slot {worker.slot}, cpus {pinned}, {INTRA_OP_THREADS} intra-op / {INTER_OP_THREADS} inter-op threads)")
+        with ready_workers.get_lock():
+            ready_workers.value += 1
+    
+    def when_ready(arbiter):
+        def report_when_workers_ready():
+            deadline = time.monotonic() + 300
+            while ready_workers.value < WORKERS and time.monotonic() < deadline:
+                time.sleep(0.5)
+            report_memory(os.getpid(), sorted(arbiter.WORKERS))
+        
+        threading.Thread(target=report_when_workers_ready, name='memory-report', daemon=True).start()
+    
+    return {
+        'bind': f"0.0.0.0:{env_int('PORT', 5000)}",
+        'workers': WORKERS,
+        'threads': THREADS,
+        'worker_class': 'gthread',
+        'timeout': env_int('WEB_TIMEOUT', 120),
+        'preload_app': True,
+        'pre_fork': pre_fork,
+        'child_exit': child_exit,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'when_ready': when_ready
+    }
+
+def main() -> int:
+    from gunicorn.app.base import BaseApplication
+    
+    server = preload()
+    ready_workers = multiprocessing.Value('i', 0)
+    
+    class LeafHealthApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+        
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            return server.app
+    
+    logger.info(f"Starting {WORKERS} workers x {THREADS} threads on {len(CPU_IDS)} cores "
+                f"(pinning {'on' if PIN_WORKERS else 'off'})")
+    LeafHealthApplication(build_options(ready_workers)).run()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
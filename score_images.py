@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Offline bulk scoring of leaf image archives
+Walks directories (or a file list), decodes and analyses images in a process
+pool, runs inference in large batches and writes CSV, JSONL or Parquet results.
+
+Example:
+    python score_images.py archive/2024 --model model1 --output scores.jsonl --resume
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set
+
+import numpy as np
+
+from config import Config
+from model_utils import (
+    ModelManager, ImageProcessor, LeafImage, ClassMetadata, MODEL_VARIANTS
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('score_images')
+
+OUTPUT_FIELDS = [
+    'path', 'model_id', 'predicted_class', 'confidence', 'healthStatus', 'damagePercentage',
+    'severityLevel', 'leafAreaIndex', 'detectedDisease', 'recommendation', 'topPredictions', 'error'
+]
+
+def flat_value(value):
+    """Column value for CSV and Parquet, which hold the ranked predictions as a JSON string"""
+    return json.dumps(value) if isinstance(value, list) else value
+
+def iter_image_paths(inputs: List[str], file_list: Optional[str]) -> Iterator[str]:
+    """Yield image paths from directories, individual files and an optional file list"""
+    allowed = Config.ALLOWED_EXTENSIONS
+    
+    def is_image(path):
+        return '.' in path and path.rsplit('.', 1)[1].lower() in allowed
+    
+    for entry in inputs:
+        if os.path.isdir(entry):
+            for root, dirs, files in os.walk(entry):
+                dirs.sort()
+                for name in sorted(files):
+                    if is_image(name):
+                        yield os.path.join(root, name)
+        elif os.path.isfile(entry):
+            yield entry
+        else:
+            logger.warning(f"Skipping missing input: {entry}")
+    
+    if file_list:
+        with open(file_list, 'r', encoding='utf-8') as f:
+            for line in f:
+                path = line.strip()
+                if path and not path.startswith('#'):
+                    yield path
+
+def prepare_images(paths: List[str], image_size, analysis_max_side: Optional[int] = None,
+                   analysis_mode: str = 'resize', fast: bool = False) -> List[Dict]:
+    """Decode, preprocess and colour-analyse a chunk of images (runs in a worker process)"""
+    prepared = []
+    leaf_images = []
+    for path in paths:
+        leaf_image = LeafImage.open(path, analysis_max_side=analysis_max_side, analysis_mode=analysis_mode)
+        if leaf_image is None:
+            prepared.append({'path': path, 'error': 'Could not read image'})
+            continue
+        leaf_images.append(leaf_image)
+        prepared.append({'path': path, 'tensor': leaf_image.model_input(tuple(image_size), fast=fast)})
+    
+    # Same-sized images in the chunk share one stacked HSV/mask pass
+    ImageProcessor.fill_color_metrics(leaf_images)
+    metrics = iter(leaf_images)
+    for item in prepared:
+        if 'error' not in item:
+            leaf_image = next(metrics)
+            item['leaf_area_index'] = leaf_image.metrics['leaf_area_index']
+            item['disease_severity'] = leaf_image.metrics['disease_severity']
+    return prepared
+
+def prepare_in_pool(pool, paths: List[str], image_size, window: int, chunk_size: int,
+                    analysis_max_side: Optional[int] = None, analysis_mode: str = 'resize',
+                    fast: bool = False) -> Iterator[Dict]:
+    """Prepare images in order, keeping at most `window` chunks of decoded tensors in flight"""
+    pending = deque()
+    
+    def next_results():
+        chunk, future = pending.popleft()
+        try:
+            return future.result()
+        except Exception as e:
+            return [{'path': path, 'error': str(e)} for path in chunk]
+    
+    for start in range(0, len(paths), chunk_size):
+        chunk = paths[start:start + chunk_size]
+        pending.append((chunk, pool.submit(prepare_images, chunk, image_size, analysis_max_side, analysis_mode, fast)))
+        if len(pending) >= window:
+            yield from next_results()
+    
+    while pending:
+        yield from next_results()
+
+class ResultWriter:
+    """Writes result rows to a CSV, JSONL or Parquet output, replacing it unless appending"""
+    
+    def __init__(self, output_path: str, output_format: str, append: bool = False):
+        self.output_path = output_path
+        self.output_format = output_format
+        self._part = 0
+        mode = 'a' if append else 'w'
+        
+        if output_format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise SystemExit("Parquet output requires pyarrow: pip install pyarrow")
+            # A directory of part files, so every flushed batch survives a crash
+            os.makedirs(output_path, exist_ok=True)
+            parts = sorted(name for name in os.listdir(output_path) if name.endswith('.parquet'))
+            if not append:
+                for name in parts:
+                    os.remove(os.path.join(output_path, name))
+                parts = []
+            self._part = len(parts)
+        elif output_format == 'csv':
+            write_header = not append or not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+            self._file = open(output_path, mode, newline='', encoding='utf-8')
+            self._csv = csv.DictWriter(self._file, fieldnames=OUTPUT_FIELDS)
+            if write_header:
+                self._csv.writeheader()
+        else:
+            self._file = open(output_path, mode, encoding='utf-8')
+    
+    def already_scored(self) -> Set[str]:
+        """Successfully scored paths in an existing output, for --resume (failures are retried)"""
+        if self.output_format == 'parquet':
+            import pyarrow.parquet as pq
+            scored = set()
+            for name in os.listdir(self.output_path):
+                if name.endswith('.parquet'):
+                    table = pq.read_table(os.path.join(self.output_path, name), columns=['path', 'error'])
+                    scored.update(path for path, error in zip(table.column('path').to_pylist(),
+                                                              table.column('error').to_pylist()) if not error)
+            return scored
+        
+        scored = set()
+        with open(self.output_path, 'r', encoding='utf-8') as f:
+            if self.output_format == 'csv':
+                scored.update(row['path'] for row in csv.DictReader(f) if row.get('path') and not row.get('error'))
+            else:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Partially written last line from an interrupted run
+                    if record.get('path') and not record.get('error'):
+                        scored.add(record['path'])
+        return scored
+    
+    def write(self, rows: List[Dict]):
+        """Write and flush a batch of rows"""
+        if not rows:
+            return
+        
+        if self.output_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            columns = {field: [flat_value(row.get(field)) for row in rows] for field in OUTPUT_FIELDS}
+            part_path = os.path.join(self.output_path, f"part-{self._part:05d}.parquet")
+            pq.write_table(pa.table(columns), part_path)
+            self._part += 1
+            return
+        
+        for row in rows:
+            if self.output_format == 'csv':
+                self._csv.writerow({field: flat_value(row.get(field)) for field in OUTPUT_FIELDS})
+            else:
+                self._file.write(json.dumps(row) + '\n')
+        self._file.flush()
+    
+    def close(self):
+        if self.output_format != 'parquet':
+            self._file.close()
+
+def build_rows(model_id: str, metadata: ClassMetadata, predictions: np.ndarray, batch: List[Dict],
+               top_k: int = 0, threshold: float = 0.0) -> List[Dict]:
+    """Convert a batch's predictions and colour metrics into output rows with one table lookup"""
+    summaries = metadata.summarize(predictions, [prepared['disease_severity'] for prepared in batch])
+    ranked = metadata.top_k(predictions, top_k, threshold) if top_k > 0 else [None] * len(batch)
+    return [{
+        'path': prepared['path'],
+        'model_id': model_id,
+        **summary,
+        'leafAreaIndex': prepared['leaf_area_index'],
+        'topPredictions': top_predictions,
+        'error': None
+    } for summary, top_predictions, prepared in zip(summaries, ranked, batch)]
+
+def score(args) -> int:
+    """Score every input image and write the results, returning a process exit code"""
+    model_config = Config.MODEL_CONFIG
+    if args.model not in model_config:
+        logger.error(f"Unknown model: {args.model}. Choose from: {', '.join(model_config)}")
+        return 2
+    config = dict(model_config[args.model], variant=args.variant)
+    
+    output_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if output_format not in ('csv', 'jsonl', 'parquet'):
+        logger.error(f"Unsupported output format: {output_format}")
+        return 2
+    
+    # Spawned workers start from a clean interpreter: forking after TensorFlow has
+    # started its thread pools can deadlock the children and copies the model into each
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        return score_with_pool(args, pool, config, output_format)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def score_with_pool(args, pool, config: Dict, output_format: str) -> int:
+    """Load the model, then score the inputs with images prepared in pool"""
+    # Every batch but the last has args.batch_size rows, so that is the shape worth tracing up front
+    model_manager = ModelManager({args.model: config}, lazy=True, warmup_batch_sizes=[args.batch_size])
+    model = model_manager.get_model(args.model)
+    if model is None:
+        logger.error(f"Could not load {config['name']} from {config['model_path']}")
+        return 1
+    metadata = model_manager.get_class_metadata(args.model)
+    
+    # Read what is already scored before the writer replaces a non-resumed output
+    resuming = args.resume and os.path.exists(args.output)
+    writer = ResultWriter(args.output, output_format, append=resuming)
+    skip = writer.already_scored() if resuming else set()
+    if skip:
+        logger.info(f"Resuming: {len(skip)} images already scored")
+    
+    paths = [path for path in iter_image_paths(args.inputs, args.file_list) if path not in skip]
+    logger.info(f"Scoring {len(paths)} images with {config['name']} "
+                f"(batch size {args.batch_size}, {args.workers} workers)")
+    
+    started = time.perf_counter()
+    inference_seconds = 0.0
+    scored = failed = 0
+    batch: List[Dict] = []
+    error_rows: List[Dict] = []  # Written with the next flush to avoid tiny output parts
+    
+    def flush(batch):
+        nonlocal inference_seconds, scored
+        rows = []
+        if batch:
+            inference_started = time.perf_counter()
+            predictions = np.asarray(model.predict_on_batch(np.concatenate([item['tensor'] for item in batch], axis=0)))
+            inference_seconds += time.perf_counter() - inference_started
+            rows = build_rows(args.model, metadata, predictions, batch, args.top_k, args.threshold)
+        writer.write(error_rows + rows)
+        error_rows.clear()
+        scored += len(batch)
+    
+    try:
+        # Bounded so memory stays flat when decoding outpaces inference
+        chunk_size = 8
+        window = max(args.batch_size * 2 // chunk_size, args.workers * 2)
+        prepared_images = prepare_in_pool(pool, paths, config['image_size'], window, chunk_size,
+                                          args.analysis_max_side or None, args.analysis_mode,
+                                          args.fast_preprocess)
+        for prepared in prepared_images:
+            if 'error' in prepared:
+                error_rows.append({'path': prepared['path'], 'model_id': args.model, 'error': prepared['error']})
+                failed += 1
+                continue
+            
+            batch.append(prepared)
+            if len(batch) >= args.batch_size:
+                flush(batch)
+                batch = []
+                elapsed = time.perf_counter() - started
+                logger.info(f"{scored + failed}/{len(paths)} images, {scored / elapsed:.1f} images/sec")
+        
+        if batch or error_rows:
+            flush(batch)
+    finally:
+        writer.close()
+    
+    elapsed = time.perf_counter() - started
+    throughput = scored / elapsed if elapsed > 0 else 0.0
+    print("\n" + "=" * 50)
+    print(f"Scored:      {scored} images ({failed} failed, {len(skip)} skipped)")
+    print(f"Wall time:   {elapsed:.1f}s")
+    print(f"Throughput:  {throughput:.1f} images/sec")
+    print(f"Inference:   {inference_seconds:.1f}s "
+          f"({scored / inference_seconds if inference_seconds else 0.0:.1f} images/sec model-only)")
+    print(f"Output:      {args.output} ({output_format})")
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Bulk-score leaf images offline with a trained model')
+    parser.add_argument('inputs', nargs='*', help='Image files or directories to walk recursively')
+    parser.add_argument('--file-list', help='Text file with one image path per line')
+    parser.add_argument('--model', default='model1', help='Model ID from MODEL_CONFIG (default: model1)')
+    parser.add_argument('--variant', choices=list(MODEL_VARIANTS), default='float',
+                        help='Model variant; quantized ones come from quantize_models.py (default: float)')
+    parser.add_argument('--output', required=True, help='Output path (.csv, .jsonl or a .parquet directory)')
+    parser.add_argument('--format', choices=['csv', 'jsonl', 'parquet'], help='Output format (default: from extension)')
+    parser.add_argument('--batch-size', type=int, default=64, help='Images per inference batch (default: 64)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Decode/preprocess processes')
+    parser.add_argument('--analysis-max-side', type=int, default=0,
+                        help='Longest side for colour-mask metrics; large JPEGs decode reduced (default: full resolution)')
+    parser.add_argument('--analysis-mode', choices=list(LeafImage.ANALYSIS_MODES), default='resize',
+                        help='How images are reduced for colour-mask metrics (default: resize)')
+    parser.add_argument('--fast-preprocess', action='store_true',
+                        help='Box-reduce plus bilinear resize for model input instead of LANCZOS')
+    parser.add_argument('--top-k', type=int, default=0,
+                        help='Ranked classes per image in topPredictions (default: 0, column left empty)')
+    parser.add_argument('--threshold', type=float, default=0.0,
+                        help='Minimum probability for ranked classes after the first (default: 0.0)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Append to the output, skipping images already scored (default: replace it)')
+    args = parser.parse_args(argv)
+    
+    if not args.inputs and not args.file_list:
+        parser.error('Provide at least one input path or --file-list')
+    
+    return score(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
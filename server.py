@@ -1,17 +1,28 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Request, current_app, request, jsonify, render_template, Response, stream_with_context
 from flask_cors import CORS
-import tensorflow as tf
 import numpy as np
-from PIL import Image
 import io
 import os
+import hmac
 import json
-import cv2
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
 import logging
 from datetime import datetime
 import random
 import time
+import contextvars
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from model_utils import (ModelManager, ModelFileWatcher, ImageProcessor, InferenceBatcher, LeafImage, ClassMetadata,
+                         PredictionAnalyzer, MODEL_VARIANTS)
+from prediction_cache import PredictionCache
+import metrics
+import lazy_imports
+from profiling import RequestProfiler
 
 # Configure logging
 logging.basicConfig(
@@ -20,7 +31,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Multi-image routes accept bodies up to BATCH_MAX_CONTENT_LENGTH instead of MAX_CONTENT_LENGTH
+BATCH_ENDPOINTS = ('analyze_leaf_batch', 'analyze_leaf_stream')
+
+class UploadRequest(Request):
+    """Request whose body limit depends on whether the route takes one image or many"""
+    
+    @property
+    def max_content_length(self):
+        if self.endpoint in BATCH_ENDPOINTS:
+            return current_app.config['BATCH_MAX_CONTENT_LENGTH']
+        return current_app.config['MAX_CONTENT_LENGTH']
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app)
 
 # Configuration
@@ -30,6 +54,93 @@ class Config:
     UPLOAD_FOLDER = 'uploads'
     MODEL_FOLDER = 'models'
     
+    # Serve simulated results unless real models are requested
+    MOCK_MODE = os.environ.get('MOCK_MODE', 'true').lower() in ('1', 'true', 'yes')
+    
+    # Lazy model loading with LRU eviction (0 means unlimited)
+    MODEL_LAZY_LOADING = os.environ.get('MODEL_LAZY_LOADING', 'false').lower() in ('1', 'true', 'yes')
+    MODEL_MAX_LOADED = int(os.environ.get('MODEL_MAX_LOADED', 0))
+    MODEL_MEMORY_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', 0))
+    
+    # Serve export_models.py artifacts (SavedModel / TFLite) over the .h5 files when present
+    MODEL_PREFER_OPTIMIZED = os.environ.get('MODEL_PREFER_OPTIMIZED', 'true').lower() in ('1', 'true', 'yes')
+    
+    # Hot reload: poll MODEL_FOLDER every N seconds (0 disables) and wait up to
+    # MODEL_RELOAD_DRAIN_SECONDS for requests on the old version to finish
+    MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 0))
+    MODEL_RELOAD_DRAIN_SECONDS = float(os.environ.get('MODEL_RELOAD_DRAIN_SECONDS', 30))
+    
+    # Shared secret for /api/admin/* in the X-Admin-Token header (unset disables them)
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    
+    # cProfile single /api/analyze-leaf requests: admins opt in with X-Profile: 1
+    # or ?profile=1, and every PROFILE_SAMPLE_EVERY-th request is sampled (0 disables)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+    PROFILE_SAMPLE_EVERY = int(os.environ.get('PROFILE_SAMPLE_EVERY', 0))
+    PROFILE_TF_TRACE = os.environ.get('PROFILE_TF_TRACE', 'false').lower() in ('1', 'true', 'yes')
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 100))
+    
+    # Quantized variants from quantize_models.py per model, e.g. "model1=int8,model3=dynamic"
+    MODEL_VARIANTS = dict(entry.strip().split('=', 1) for entry in os.environ.get('MODEL_VARIANTS', '').split(',')
+                          if '=' in entry)
+    
+    # Prediction cache keyed by image hash and model version (0 entries disables it)
+    PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 1024))
+    PREDICTION_CACHE_DIR = os.environ.get('PREDICTION_CACHE_DIR', '')
+    
+    # Multi-image batch analysis
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp', 'tiff'}
+    BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 256))
+    # Request body limit of the batch and streaming routes; each image (archive
+    # entries measured decompressed) and the batch total are capped separately
+    BATCH_MAX_CONTENT_LENGTH = int(os.environ.get('BATCH_MAX_CONTENT_LENGTH', 256 * 1024 * 1024))
+    BATCH_MAX_IMAGE_BYTES = int(os.environ.get('BATCH_MAX_IMAGE_BYTES', 16 * 1024 * 1024))
+    BATCH_MAX_TOTAL_BYTES = int(os.environ.get('BATCH_MAX_TOTAL_BYTES', 1024 * 1024 * 1024))
+    DECODE_WORKERS = int(os.environ.get('DECODE_WORKERS', os.cpu_count() or 4))
+    COLOR_METRICS_STACK_SIZE = int(os.environ.get('COLOR_METRICS_STACK_SIZE', 8))
+    
+    # Longest side used for colour-mask metrics (0 analyses at full resolution)
+    ANALYSIS_MAX_SIDE = int(os.environ.get('ANALYSIS_MAX_SIDE', 0))
+    ANALYSIS_MODE = os.environ.get('ANALYSIS_MODE', 'resize')
+    
+    # Box-reduce plus bilinear resize for model input instead of LANCZOS
+    PREPROCESS_FAST = os.environ.get('PREPROCESS_FAST', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Streaming batch analysis: images per chunk and chunks in flight per request
+    STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', os.environ.get('INFERENCE_MAX_BATCH_SIZE', 16)))
+    STREAM_MAX_IN_FLIGHT = int(os.environ.get('STREAM_MAX_IN_FLIGHT', 2))
+    # Streams hold only a few chunks in memory, so they allow larger jobs than /batch;
+    # BATCH_MAX_IMAGE_BYTES still caps every image
+    STREAM_MAX_IMAGES = int(os.environ.get('STREAM_MAX_IMAGES', 10000))
+    STREAM_MAX_TOTAL_BYTES = int(os.environ.get('STREAM_MAX_TOTAL_BYTES', 8 * 1024 * 1024 * 1024))
+    
+    # Async serving mode (asgi_server.py): analysis threads and admitted requests before 503
+    ASYNC_WORKERS = int(os.environ.get('ASYNC_WORKERS', os.cpu_count() or 4))
+    ASYNC_MAX_PENDING = int(os.environ.get('ASYNC_MAX_PENDING', 64))
+    ASYNC_RETRY_AFTER = int(os.environ.get('ASYNC_RETRY_AFTER', 1))
+    
+    # 'auto' model: score one decoded image against every model and keep the best class
+    AUTO_MODEL_ID = 'auto'
+    AUTO_TOP_K = int(os.environ.get('AUTO_TOP_K', 3))
+    
+    # Ranked alternatives in every response: up to MAX_PREDICTIONS classes, the
+    # top one always and the others at or above PREDICTION_THRESHOLD probability
+    PREDICTION_THRESHOLD = float(os.environ.get('PREDICTION_THRESHOLD', 0.1))
+    MAX_PREDICTIONS = int(os.environ.get('MAX_PREDICTIONS', 5))
+    
+    # Dynamic micro-batching of concurrent inference requests
+    INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 16))
+    INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 5))
+    
+    # Batch sizes every model is traced at before serving; /api/health reports
+    # ready only after startup warmup, which can run behind a live server
+    MODEL_WARMUP_BATCH_SIZES = [int(size) for size in os.environ.get(
+        'MODEL_WARMUP_BATCH_SIZES', f'1,{INFERENCE_MAX_BATCH_SIZE}').split(',') if size.strip()]
+    MODEL_BACKGROUND_LOADING = os.environ.get('MODEL_BACKGROUND_LOADING', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Prometheus metrics at /metrics; disabling skips recording on the hot paths
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    
     # Model configurations
     MODEL_CONFIG = {
         'model1': {
@@ -85,6 +196,12 @@ class Config:
 # Load configuration
 app.config.from_object(Config)
 
+for model_id, variant in app.config['MODEL_VARIANTS'].items():
+    if model_id in app.config['MODEL_CONFIG'] and variant in MODEL_VARIANTS:
+        app.config['MODEL_CONFIG'][model_id]['variant'] = variant
+    else:
+        logger.warning(f"Ignoring MODEL_VARIANTS entry {model_id}={variant}")
+
 # Ensure directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['MODEL_FOLDER'], exist_ok=True)
@@ -113,8 +230,69 @@ class MockModelManager:
             available.append(model_info)
         return available
 
-# Initialize mock model manager
-model_manager = MockModelManager(app.config['MODEL_CONFIG'])
+# Initialize model manager
+if app.config['MOCK_MODE']:
+    model_manager = MockModelManager(app.config['MODEL_CONFIG'])
+    inference_batcher = None
+    prediction_cache = None
+else:
+    model_manager = ModelManager(
+        app.config['MODEL_CONFIG'],
+        lazy=app.config['MODEL_LAZY_LOADING'],
+        max_loaded_models=app.config['MODEL_MAX_LOADED'],
+        memory_budget_mb=app.config['MODEL_MEMORY_BUDGET_MB'],
+        prefer_optimized=app.config['MODEL_PREFER_OPTIMIZED'],
+        warmup_batch_sizes=app.config['MODEL_WARMUP_BATCH_SIZES'],
+        background_loading=app.config['MODEL_BACKGROUND_LOADING'],
+        max_batch_size=app.config['INFERENCE_MAX_BATCH_SIZE']
+    )
+    inference_batcher = InferenceBatcher(
+        model_manager,
+        max_batch_size=app.config['INFERENCE_MAX_BATCH_SIZE'],
+        max_wait_ms=app.config['INFERENCE_MAX_WAIT_MS']
+    )
+    if app.config['PREDICTION_CACHE_SIZE'] > 0 or app.config['PREDICTION_CACHE_DIR']:
+        prediction_cache = PredictionCache(
+            max_entries=app.config['PREDICTION_CACHE_SIZE'],
+            disk_dir=app.config['PREDICTION_CACHE_DIR']
+        )
+    else:
+        prediction_cache = None
+
+if app.config['ANALYSIS_MODE'] not in LeafImage.ANALYSIS_MODES:
+    logger.warning(f"Unknown ANALYSIS_MODE {app.config['ANALYSIS_MODE']!r}, using 'resize'")
+    app.config['ANALYSIS_MODE'] = 'resize'
+if app.config['ANALYSIS_MAX_SIDE']:
+    # JPEG draft decoding also feeds the model tensor, so keep it above the model input size
+    min_side = max(max(config['image_size']) for config in app.config['MODEL_CONFIG'].values())
+    if app.config['ANALYSIS_MAX_SIDE'] < min_side:
+        logger.warning(f"ANALYSIS_MAX_SIDE raised to {min_side} to match the largest model input")
+        app.config['ANALYSIS_MAX_SIDE'] = min_side
+    logger.info(f"Colour analysis at max side {app.config['ANALYSIS_MAX_SIDE']} ({app.config['ANALYSIS_MODE']})")
+
+metrics.set_enabled(app.config['METRICS_ENABLED'])
+
+request_profiler = RequestProfiler(
+    app.config['PROFILE_DIR'],
+    sample_every=app.config['PROFILE_SAMPLE_EVERY'],
+    tf_trace=app.config['PROFILE_TF_TRACE'],
+    max_profiles=app.config['PROFILE_MAX_FILES']
+)
+
+# Started per serving process (not at import, so gunicorn's master forks without the thread)
+model_watcher = None
+
+def start_model_watcher():
+    """Start polling MODEL_FOLDER for changed model files when MODEL_WATCH_INTERVAL is set"""
+    global model_watcher
+    if app.config['MOCK_MODE'] or app.config['MODEL_WATCH_INTERVAL'] <= 0 or model_watcher is not None:
+        return
+    model_watcher = ModelFileWatcher(model_manager, interval=app.config['MODEL_WATCH_INTERVAL'])
+    model_watcher.start()
+
+# Decoding and OpenCV analysis release the GIL, so a thread pool scales across cores
+decode_executor = ThreadPoolExecutor(max_workers=app.config['DECODE_WORKERS'], thread_name_prefix='decode')
+stream_executor = ThreadPoolExecutor(max_workers=max(1, app.config['STREAM_MAX_IN_FLIGHT']), thread_name_prefix='stream')
 
 # Treatment recommendations
 TREATMENT_RECOMMENDATIONS = {
@@ -149,9 +327,438 @@ def index():
         <p><a href="/api/health">Check API Health</a></p>
         """
 
+def allowed_file(filename):
+    """Check whether a filename has an allowed image extension"""
+    file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    return file_extension in app.config['ALLOWED_EXTENSIONS']
+
+def generate_mock_analysis(model_id, delay=2):
+    """Build a simulated analysis result for mock mode"""
+    # Simulate processing delay
+    time.sleep(delay)
+    
+    # 'auto' simulates whichever model would have scored best
+    auto = model_id == app.config['AUTO_MODEL_ID']
+    if auto:
+        model_id = random.choice(list(app.config['MODEL_CONFIG']))
+    
+    # Get model config for mock response
+    config = app.config['MODEL_CONFIG'][model_id]
+    
+    # Generate realistic mock results
+    mock_diseases = {
+        'model1': ['apple_scab', 'tomato_early_blight', 'corn_common_rust', 'apple_healthy', 'tomato_healthy'],
+        'model2': ['wheat_stripe_rust', 'rice_blast', 'cotton_bacterial_blight', 'wheat_healthy', 'rice_healthy'], 
+        'model3': ['banana_black_sigatoka', 'banana_panama_disease', 'banana_healthy']
+    }
+    
+    diseases = mock_diseases.get(model_id, config['classes'])
+    selected_disease = random.choice(diseases)
+    is_healthy = 'healthy' in selected_disease.lower()
+    
+    # Calculate mock metrics
+    if is_healthy:
+        damage_percentage = random.randint(0, 15)
+        severity_level = 'Minimal'
+        health_status = 'Healthy'
+        detected_disease = None
+    else:
+        damage_percentage = random.randint(25, 75)
+        if damage_percentage < 30:
+            severity_level = 'Mild'
+        elif damage_percentage < 55:
+            severity_level = 'Moderate'
+        else:
+            severity_level = 'Severe'
+        health_status = 'Diseased'
+        # Format disease name
+        parts = selected_disease.split('_')[1:]
+        detected_disease = ' '.join(word.capitalize() for word in parts)
+    
+    # Mock response
+    response = {
+        'healthStatus': health_status,
+        'damagePercentage': damage_percentage,
+        'severityLevel': severity_level,
+        'leafAreaIndex': str(round(random.uniform(1.5, 4.0), 1)),
+        'detectedDisease': detected_disease,
+        'recommendation': get_treatment_recommendation(selected_disease),
+        'confidence': round(random.uniform(75, 95), 1),
+        'model_used': config['name'],
+        'predicted_class': selected_disease
+    }
+    response['topPredictions'] = [{
+        'class': selected_disease,
+        'confidence': response['confidence'],
+        'displayName': ClassMetadata.display_label(selected_disease)
+    }]
+    if auto:
+        response['model_id'] = model_id
+    return response
+
+def decode_upload(image_bytes, filename):
+    """Decode uploaded bytes at the configured analysis resolution"""
+    return LeafImage.from_bytes(
+        image_bytes, source=filename,
+        analysis_max_side=app.config['ANALYSIS_MAX_SIDE'] or None,
+        analysis_mode=app.config['ANALYSIS_MODE']
+    )
+
+def cache_version(model_id):
+    """Model version plus analysis settings, so changing either invalidates cached results"""
+    if model_id == app.config['AUTO_MODEL_ID']:
+        version = ','.join(f"{candidate}={model_manager.get_model_version(candidate)}"
+                           for candidate in auto_candidate_models())
+    else:
+        version = model_manager.get_model_version(model_id)
+    if app.config['ANALYSIS_MAX_SIDE']:
+        version = f"{version}:{app.config['ANALYSIS_MODE']}{app.config['ANALYSIS_MAX_SIDE']}"
+    if app.config['PREPROCESS_FAST']:
+        version = f"{version}:fast"
+    return f"{version}:top{app.config['MAX_PREDICTIONS']}@{app.config['PREDICTION_THRESHOLD']}"
+
+def prepare_leaf_image(image_bytes, filename, image_size):
+    """Decode an upload and precompute everything except inference"""
+    leaf_image = decode_upload(image_bytes, filename)
+    if leaf_image is None:
+        raise ValueError('Could not read image')
+    
+    if ImageProcessor.preprocess_for_model(leaf_image, image_size, fast=app.config['PREPROCESS_FAST']) is None:
+        raise ValueError('Could not process image')
+    return leaf_image
+
+def build_analysis_response(model_id, predictions, leaf_image):
+    """Turn one image's (1, num_classes) predictions into the API response"""
+    return build_analysis_responses(model_id, predictions, [leaf_image])[0]
+
+def build_analysis_responses(model_id, predictions, leaf_images):
+    """Turn (n, num_classes) predictions into API responses with one class-table lookup"""
+    config = app.config['MODEL_CONFIG'][model_id]
+    image_damage = [ImageProcessor.analyze_disease_severity(leaf_image) for leaf_image in leaf_images]
+    
+    metadata = model_manager.get_class_metadata(model_id)
+    responses = metadata.summarize(predictions, image_damage)
+    top_predictions = metadata.top_k(predictions, app.config['MAX_PREDICTIONS'], app.config['PREDICTION_THRESHOLD'])
+    for response, ranked, leaf_image in zip(responses, top_predictions, leaf_images):
+        response['leafAreaIndex'] = str(ImageProcessor.calculate_leaf_area_index(leaf_image))
+        response['model_used'] = config['name']
+        response['topPredictions'] = ranked
+    return responses
+
+def predict_inline(model_id, inputs):
+    """Score inputs on the calling thread instead of the micro-batcher's worker thread"""
+    with model_manager.lease(model_id) as model, metrics.stage('inference', model_id):
+        if model is None:
+            raise RuntimeError(f"Model not available: {model_id}")
+        return np.asarray(model.predict_on_batch(inputs))
+
+def submit_inference(model_id, inputs, inline=False):
+    """Future for a forward pass: batched with concurrent requests, or run inline (profiled requests)"""
+    if not inline:
+        return inference_batcher.submit(model_id, inputs)
+    future = Future()
+    try:
+        future.set_result(predict_inline(model_id, inputs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def run_model_analysis(model_id, image_bytes, filename, inline=False):
+    """Run the real model and image analysis pipeline on uploaded image bytes"""
+    config = app.config['MODEL_CONFIG'][model_id]
+    
+    # Decode straight from the request buffer; classification, severity
+    # and LAI all share the decoded pixels and nothing touches the disk
+    leaf_image = decode_upload(image_bytes, filename)
+    if leaf_image is None:
+        raise ValueError('Could not read image')
+    
+    image_array = ImageProcessor.preprocess_for_model(leaf_image, config['image_size'], fast=app.config['PREPROCESS_FAST'])
+    if image_array is None:
+        raise ValueError('Could not process image')
+    
+    # Concurrent requests for the same model share one forward pass
+    predictions = submit_inference(model_id, image_array, inline).result()
+    return build_analysis_response(model_id, predictions, leaf_image)
+
+def is_known_model(model_id):
+    """A configured model ID or the 'auto' selector"""
+    return model_id in app.config['MODEL_CONFIG'] or model_id == app.config['AUTO_MODEL_ID']
+
+def is_model_ready(model_id):
+    """Whether a request for model_id (or 'auto') can be served"""
+    if model_id == app.config['AUTO_MODEL_ID']:
+        return bool(auto_candidate_models())
+    return model_manager.is_model_available(model_id)
+
+def auto_candidate_models():
+    """Models 'auto' scores against: the resident ones, or every available one when none is loaded yet"""
+    loaded = [model_id for model_id in app.config['MODEL_CONFIG'] if model_id in model_manager.models]
+    return loaded or [model_id for model_id in app.config['MODEL_CONFIG'] if model_manager.is_model_available(model_id)]
+
+def top_classes(model_id, predictions, k):
+    """Top-k (class, confidence %, display name) of one model's (1, num_classes) predictions"""
+    return model_manager.get_class_metadata(model_id).top_k(predictions, k)[0]
+
+def run_auto_analysis(image_bytes, filename, inline=False):
+    """Decode once and score the shared tensor against every candidate model concurrently"""
+    leaf_image = decode_upload(image_bytes, filename)
+    if leaf_image is None:
+        raise ValueError('Could not read image')
+    
+    candidates = auto_candidate_models()
+    if not candidates:
+        raise ValueError('No models available')
+    
+    # Models with the same input size share one tensor; each model's batcher
+    # runs its forward pass in parallel with the others
+    futures = {}
+    for model_id in candidates:
+        config = app.config['MODEL_CONFIG'][model_id]
+        image_array = ImageProcessor.preprocess_for_model(leaf_image, config['image_size'], fast=app.config['PREPROCESS_FAST'])
+        if image_array is None:
+            raise ValueError('Could not process image')
+        futures[model_id] = submit_inference(model_id, image_array, inline)
+    
+    predictions = {}
+    for model_id, future in futures.items():
+        try:
+            predictions[model_id] = future.result()
+        except Exception as e:
+            logger.warning(f"Auto analysis skipped {model_id}: {str(e)}")
+    if not predictions:
+        raise ValueError('Every model failed to score the image')
+    
+    # Confidence above chance, so models with few classes are not favoured
+    scores = {model_id: PredictionAnalyzer.selection_score(model_predictions[0])
+              for model_id, model_predictions in predictions.items()}
+    best_model_id = max(scores, key=scores.get)
+    response = build_analysis_response(best_model_id, predictions[best_model_id], leaf_image)
+    response['model_id'] = best_model_id
+    response['models'] = [{
+        'model_id': model_id,
+        'model_used': app.config['MODEL_CONFIG'][model_id]['name'],
+        'selection_score': round(scores[model_id], 4),
+        'top_predictions': top_classes(model_id, model_predictions, app.config['AUTO_TOP_K'])
+    } for model_id, model_predictions in predictions.items()]
+    return response
+
+def analyze_upload(model_id, image_bytes, filename, use_cache=True, inline=False):
+    """Analyze one upload through the prediction cache, returning (response, X-Cache value, cache tier)"""
+    with metrics.model_label(model_id):
+        cache_key = None
+        if prediction_cache is not None and use_cache:
+            with metrics.stage('cache_lookup'):
+                cache_key = PredictionCache.make_key(image_bytes, model_id, cache_version(model_id))
+                cached, tier = prediction_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Cache hit ({tier}) for {filename} with model: {model_id}")
+                return cached, 'HIT', tier
+        
+        if model_id == app.config['AUTO_MODEL_ID']:
+            response = run_auto_analysis(image_bytes, filename, inline)
+        else:
+            response = run_model_analysis(model_id, image_bytes, filename, inline)
+        if cache_key is not None:
+            prediction_cache.put(cache_key, response)
+    
+    logger.info(f"Analysis completed: {response['healthStatus']}, {response['damagePercentage']}% damage")
+    return response, 'MISS' if cache_key is not None else 'BYPASS', None
+
+def profile_requested(flag, token):
+    """Whether an admin asked for this request to be profiled (X-Profile header or ?profile=)"""
+    return flag is not None and flag.lower() in ('1', 'true', 'yes') and admin_authorized(token)
+
+def analyze_upload_profiled(model_id, image_bytes, filename, requested):
+    """analyze_upload under the request profiler, returning its result plus the profile ID
+    
+    cProfile only sees the thread it runs on, so a profiled request runs its
+    forward pass inline rather than on the batcher's thread. When another
+    capture is running, the request is served as usual and unprofiled.
+    """
+    with request_profiler.profile(model_id) as profile_id:
+        if profile_id is None:
+            response, cache_status, tier = analyze_upload(model_id, image_bytes, filename)
+        else:
+            # An explicit profile skips the cache lookup so the full pipeline is captured
+            response, cache_status, tier = analyze_upload(model_id, image_bytes, filename,
+                                                          use_cache=not requested, inline=True)
+    return response, cache_status, tier, profile_id
+
+class UploadLimitError(Exception):
+    """A batch upload broke a size or count limit; status_code is the HTTP status to answer with"""
+    
+    def __init__(self, message, status_code=413):
+        super().__init__(message)
+        self.status_code = status_code
+
+def format_mb(size):
+    return f"{size / (1024 * 1024):.0f}MB"
+
+def read_limited(stream, name, declared_size, max_bytes):
+    """Read one image, rejecting it by its declared size first and never reading past max_bytes"""
+    if declared_size is not None and declared_size > max_bytes:
+        raise UploadLimitError(f'{name} is larger than {format_mb(max_bytes)}')
+    data = stream.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise UploadLimitError(f'{name} is larger than {format_mb(max_bytes)}')
+    return data
+
+def iter_archive_images(stream, max_image_bytes):
+    """Yield (filename, bytes) for each image inside an uploaded zip or tar archive stream"""
+    if zipfile.is_zipfile(stream):
+        stream.seek(0)
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and allowed_file(info.filename):
+                    with archive.open(info) as entry:
+                        yield info.filename, read_limited(entry, info.filename, info.file_size, max_image_bytes)
+        return
+    
+    stream.seek(0)
+    with tarfile.open(fileobj=stream, mode='r:*') as archive:
+        for member in archive:
+            if member.isfile() and allowed_file(member.name):
+                yield member.name, read_limited(archive.extractfile(member), member.name, member.size, max_image_bytes)
+
+def get_upload_streams(detach=False):
+    """Collect (field, filename, stream) for the multipart 'images' files and 'archive'
+    
+    With detach=True the caller takes ownership of the streams, so they stay
+    readable after the view returns and the request closes its files.
+    """
+    uploads = []
+    for field in ('images', 'archive'):
+        for upload in request.files.getlist(field):
+            if upload.filename:
+                uploads.append((field, upload.filename, upload.stream))
+                if detach:
+                    upload.stream = io.BytesIO()
+    return uploads
+
+def iter_upload_entries(uploads, max_image_bytes):
+    for field, filename, stream in uploads:
+        if field == 'archive':
+            yield from iter_archive_images(stream, max_image_bytes)
+        else:
+            yield filename, read_limited(stream, filename, None, max_image_bytes)
+
+def iter_batch_uploads(uploads, max_images=None, max_total_bytes=None):
+    """Lazily yield (filename, bytes) pairs from collected upload streams
+    
+    Stops with UploadLimitError as soon as an image exceeds BATCH_MAX_IMAGE_BYTES,
+    more than max_images arrive or their bytes exceed max_total_bytes, so an
+    archive bomb is never decompressed past the limits.
+    """
+    count = total = 0
+    for filename, data in iter_upload_entries(uploads, app.config['BATCH_MAX_IMAGE_BYTES']):
+        count += 1
+        total += len(data)
+        if max_images is not None and count > max_images:
+            raise UploadLimitError(f'Too many images. Maximum per batch: {max_images}', 400)
+        if max_total_bytes is not None and total > max_total_bytes:
+            raise UploadLimitError(f'Images exceed {format_mb(max_total_bytes)} in total')
+        yield filename, data
+
+def iter_chunks(items, chunk_size):
+    """Group an iterable into lists of at most chunk_size items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def analyze_batch(model_id, items):
+    """Analyze many (filename, bytes) uploads, INFERENCE_MAX_BATCH_SIZE images per forward pass"""
+    chunk_size = max(1, app.config['INFERENCE_MAX_BATCH_SIZE'])
+    results = []
+    with metrics.model_label(model_id):
+        # Each chunk's decoded images are released before the next chunk is decoded,
+        # so peak memory is bounded by the chunk rather than the whole request
+        for chunk in iter_chunks(items, chunk_size):
+            results.extend(_analyze_batch(model_id, chunk))
+    return results
+
+def submit_in_context(executor, func, *args):
+    """Submit func to a pool with the caller's context variables (the metrics model label)"""
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+def _analyze_batch(model_id, items):
+    config = app.config['MODEL_CONFIG'][model_id]
+    image_size = tuple(config['image_size'])
+    results = [None] * len(items)
+    cache_keys = {}
+    pending = {}
+    
+    for index, (filename, image_bytes) in enumerate(items):
+        if not allowed_file(filename):
+            results[index] = {'filename': filename, 'error': 'Invalid file type'}
+            continue
+        
+        if prediction_cache is not None:
+            with metrics.stage('cache_lookup'):
+                cache_keys[index] = PredictionCache.make_key(image_bytes, model_id, cache_version(model_id))
+                cached, _ = prediction_cache.get(cache_keys[index])
+            if cached is not None:
+                results[index] = {'filename': filename, **cached}
+                continue
+        
+        pending[index] = submit_in_context(decode_executor, prepare_leaf_image, image_bytes, filename, image_size)
+    
+    # Per-item decode failures are reported without failing the batch
+    leaf_images = {}
+    for index, future in pending.items():
+        try:
+            leaf_images[index] = future.result()
+        except Exception as e:
+            results[index] = {'filename': items[index][0], 'error': str(e)}
+    
+    if leaf_images:
+        order = list(leaf_images)
+        fast = app.config['PREPROCESS_FAST']
+        batch = np.concatenate([leaf_images[index].model_input(image_size, fast=fast) for index in order], axis=0)
+        
+        # Same-sized images share one HSV conversion and mask pass per stack;
+        # the colour analysis (and its RGB conversion) overlaps with inference on the decode pool
+        by_shape = sorted(leaf_images.values(), key=lambda leaf_image: leaf_image.size)
+        metric_jobs = [submit_in_context(decode_executor, ImageProcessor.fill_color_metrics, group)
+                       for group in iter_chunks(by_shape, app.config['COLOR_METRICS_STACK_SIZE'])]
+        
+        try:
+            predictions = inference_batcher.predict(model_id, batch)
+        except Exception as e:
+            logger.error(f"Batch inference failed for {model_id}: {str(e)}")
+            for index in order:
+                results[index] = {'filename': items[index][0], 'error': f'Inference failed: {str(e)}'}
+            return results
+        
+        for job in metric_jobs:
+            try:
+                job.result()
+            except Exception as e:
+                # Missing metrics are recomputed per image when building the response
+                logger.warning(f"Batched colour analysis failed: {str(e)}")
+        
+        try:
+            responses = build_analysis_responses(model_id, predictions, [leaf_images[index] for index in order])
+        except Exception as e:
+            for index in order:
+                results[index] = {'filename': items[index][0], 'error': str(e)}
+            return results
+        
+        for index, response in zip(order, responses):
+            if index in cache_keys:
+                prediction_cache.put(cache_keys[index], response)
+            results[index] = {'filename': items[index][0], **response}
+    
+    return results
+
 @app.route('/api/analyze-leaf', methods=['POST'])
 def analyze_leaf():
-    """Main endpoint for leaf analysis - Mock version for testing"""
+    """Main endpoint for leaf analysis"""
     try:
         logger.info("Received analysis request")
         
@@ -163,74 +770,182 @@ def analyze_leaf():
         if image_file.filename == '':
             return jsonify({'error': 'No image selected'}), 400
         
-        # Get model ID
+        # Get model ID ('auto' picks the best model for the image)
         model_id = request.form.get('model', 'model1')
-        if model_id not in app.config['MODEL_CONFIG']:
+        if not is_known_model(model_id):
             return jsonify({'error': f'Invalid model: {model_id}'}), 400
         
         # Validate file type
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'bmp', 'tiff'}
-        file_extension = image_file.filename.rsplit('.', 1)[1].lower() if '.' in image_file.filename else ''
-        if file_extension not in allowed_extensions:
-            return jsonify({'error': f'Invalid file type. Allowed: {", ".join(allowed_extensions)}'}), 400
+        if not allowed_file(image_file.filename):
+            return jsonify({'error': f'Invalid file type. Allowed: {", ".join(app.config["ALLOWED_EXTENSIONS"])}'}), 400
+        
+        if not is_model_ready(model_id):
+            return jsonify({'error': f'Model not loaded: {model_id}'}), 503
         
         logger.info(f"Processing image: {image_file.filename} with model: {model_id}")
         
-        # Simulate processing delay
-        time.sleep(2)
+        if app.config['MOCK_MODE']:
+            response = generate_mock_analysis(model_id)
+            logger.info(f"Analysis completed: {response['healthStatus']}, {response['damagePercentage']}% damage")
+            return jsonify(response)
         
-        # Get model config for mock response
-        config = app.config['MODEL_CONFIG'][model_id]
+        profile_id = None
+        requested = profile_requested(request.headers.get('X-Profile', request.args.get('profile')),
+                                      request.headers.get('X-Admin-Token'))
+        # A profiled request runs its forward pass on this thread so the capture includes it
+        if request_profiler.should_profile(requested):
+            response, cache_status, tier, profile_id = analyze_upload_profiled(
+                model_id, image_file.read(), image_file.filename, requested)
+        else:
+            response, cache_status, tier = analyze_upload(model_id, image_file.read(), image_file.filename)
+        result = jsonify(response)
+        result.headers['X-Cache'] = cache_status
+        if tier:
+            result.headers['X-Cache-Tier'] = tier
+        if profile_id:
+            result.headers['X-Profile-Id'] = profile_id
+        return result
+    
+    except HTTPException:
+        raise  # e.g. 413 from the body size limit
+    except Exception as e:
+        logger.error(f"Error in analyze_leaf: {str(e)}")
+        return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
+
+@app.route('/api/analyze-leaf/batch', methods=['POST'])
+def analyze_leaf_batch():
+    """Analyze many images (multipart 'images' files or a zip/tar 'archive') with one model"""
+    try:
+        model_id = request.form.get('model', 'model1')
+        if model_id not in app.config['MODEL_CONFIG']:
+            return jsonify({'error': f'Invalid model: {model_id}'}), 400
         
-        # Generate realistic mock results
-        mock_diseases = {
-            'model1': ['apple_scab', 'tomato_early_blight', 'corn_common_rust', 'apple_healthy', 'tomato_healthy'],
-            'model2': ['wheat_stripe_rust', 'rice_blast', 'cotton_bacterial_blight', 'wheat_healthy', 'rice_healthy'], 
-            'model3': ['banana_black_sigatoka', 'banana_panama_disease', 'banana_healthy']
-        }
+        if not model_manager.is_model_available(model_id):
+            return jsonify({'error': f'Model not loaded: {model_id}'}), 503
         
-        diseases = mock_diseases.get(model_id, config['classes'])
-        selected_disease = random.choice(diseases)
-        is_healthy = 'healthy' in selected_disease.lower()
+        try:
+            items = list(iter_batch_uploads(get_upload_streams(), max_images=app.config['BATCH_MAX_IMAGES'],
+                                            max_total_bytes=app.config['BATCH_MAX_TOTAL_BYTES']))
+        except (tarfile.TarError, zipfile.BadZipFile) as e:
+            return jsonify({'error': f'Could not read archive: {str(e)}'}), 400
+        except UploadLimitError as e:
+            return jsonify({'error': str(e)}), e.status_code
         
-        # Calculate mock metrics
-        if is_healthy:
-            damage_percentage = random.randint(0, 15)
-            severity_level = 'Minimal'
-            health_status = 'Healthy'
-            detected_disease = None
-        else:
-            damage_percentage = random.randint(25, 75)
-            if damage_percentage < 30:
-                severity_level = 'Mild'
-            elif damage_percentage < 55:
-                severity_level = 'Moderate'
-            else:
-                severity_level = 'Severe'
-            health_status = 'Diseased'
-            # Format disease name
-            parts = selected_disease.split('_')[1:]
-            detected_disease = ' '.join(word.capitalize() for word in parts)
+        if not items:
+            return jsonify({'error': 'No image files provided'}), 400
         
-        # Mock response
-        response = {
-            'healthStatus': health_status,
-            'damagePercentage': damage_percentage,
-            'severityLevel': severity_level,
-            'leafAreaIndex': str(round(random.uniform(1.5, 4.0), 1)),
-            'detectedDisease': detected_disease,
-            'recommendation': get_treatment_recommendation(selected_disease),
-            'confidence': round(random.uniform(75, 95), 1),
-            'model_used': config['name'],
-            'predicted_class': selected_disease
-        }
+        logger.info(f"Processing batch of {len(items)} images with model: {model_id}")
         
-        logger.info(f"Mock analysis completed: {health_status}, {damage_percentage}% damage")
-        return jsonify(response)
+        if app.config['MOCK_MODE']:
+            time.sleep(2)  # Simulate one processing delay for the whole batch
+            results = [{'filename': filename, **generate_mock_analysis(model_id, delay=0)} for filename, _ in items]
+        else:
+            results = analyze_batch(model_id, items)
         
+        failed = sum(1 for result in results if 'error' in result)
+        logger.info(f"Batch analysis completed: {len(results) - failed} succeeded, {failed} failed")
+        return jsonify({
+            'model_id': model_id,
+            'count': len(results),
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'results': results
+        })
+    
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in analyze_leaf: {str(e)}")
-        return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
+        logger.error(f"Error in analyze_leaf_batch: {str(e)}")
+        return jsonify({'error': f'Batch analysis failed: {str(e)}'}), 500
+
+def analyze_chunk(model_id, chunk):
+    """Analyze one chunk of a streaming job, turning a chunk-wide failure into per-item errors"""
+    try:
+        if app.config['MOCK_MODE']:
+            return [{'filename': filename, **generate_mock_analysis(model_id, delay=0)} for filename, _ in chunk]
+        return analyze_batch(model_id, chunk)
+    except Exception as e:
+        logger.error(f"Streaming chunk failed for {model_id}: {str(e)}")
+        return [{'filename': filename, 'error': str(e)} for filename, _ in chunk]
+
+def format_stream_event(payload, event, use_sse):
+    """Serialize one streamed record as an NDJSON line or a server-sent event"""
+    data = json.dumps(payload)
+    if use_sse:
+        return f"event: {event}\ndata: {data}\n\n"
+    return data + "\n"
+
+@app.route('/api/analyze-leaf/stream', methods=['POST'])
+def analyze_leaf_stream():
+    """Analyze many images and stream each result as soon as its chunk finishes"""
+    model_id = request.form.get('model', 'model1')
+    if model_id not in app.config['MODEL_CONFIG']:
+        return jsonify({'error': f'Invalid model: {model_id}'}), 400
+    
+    if not model_manager.is_model_available(model_id):
+        return jsonify({'error': f'Model not loaded: {model_id}'}), 503
+    
+    uploads = get_upload_streams(detach=True)
+    if not uploads:
+        return jsonify({'error': 'No image files provided'}), 400
+    
+    use_sse = (request.args.get('format') == 'sse' or
+               'text/event-stream' in request.headers.get('Accept', ''))
+    chunk_size = max(1, app.config['STREAM_CHUNK_SIZE'])
+    max_in_flight = max(1, app.config['STREAM_MAX_IN_FLIGHT'])
+    
+    def generate():
+        # Only max_in_flight chunks are decoded/scored at once, so memory stays
+        # flat no matter how many images the job contains
+        window = deque()
+        totals = {'count': 0, 'succeeded': 0, 'failed': 0}
+        
+        def drain_oldest():
+            start_index, future = window.popleft()
+            for offset, result in enumerate(future.result()):
+                totals['count'] += 1
+                totals['failed' if 'error' in result else 'succeeded'] += 1
+                yield format_stream_event({'index': start_index + offset, **result}, 'result', use_sse)
+        
+        read_errors = []
+        
+        def read_until_error(items):
+            # Stop reading at a bad archive or a limit, but still score what was read
+            try:
+                yield from items
+            except (tarfile.TarError, zipfile.BadZipFile) as e:
+                read_errors.append(f'Could not read archive: {str(e)}')
+            except UploadLimitError as e:
+                read_errors.append(str(e))
+        
+        next_index = 0
+        try:
+            items = iter_batch_uploads(uploads, max_images=app.config['STREAM_MAX_IMAGES'],
+                                       max_total_bytes=app.config['STREAM_MAX_TOTAL_BYTES'])
+            for chunk in iter_chunks(read_until_error(items), chunk_size):
+                window.append((next_index, stream_executor.submit(analyze_chunk, model_id, chunk)))
+                next_index += len(chunk)
+                while len(window) >= max_in_flight:
+                    yield from drain_oldest()
+        finally:
+            for _, _, stream in uploads:
+                stream.close()
+        
+        for error in read_errors:
+            yield format_stream_event({'error': error}, 'error', use_sse)
+        
+        while window:
+            yield from drain_oldest()
+        
+        logger.info(f"Streaming analysis completed: {totals['succeeded']} succeeded, {totals['failed']} failed")
+        yield format_stream_event({'summary': {'model_id': model_id, **totals}}, 'summary', use_sse)
+    
+    logger.info(f"Streaming batch analysis with model: {model_id}")
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/models', methods=['GET'])
 def get_available_models():
@@ -242,28 +957,204 @@ def get_available_models():
         logger.error(f"Error getting models: {str(e)}")
         return jsonify({'error': 'Failed to get models list'}), 500
 
+def admin_authorized(token):
+    """Whether a request carries the configured admin token"""
+    expected = app.config['ADMIN_TOKEN']
+    return bool(expected) and hmac.compare_digest((token or '').encode(), expected.encode())
+
+def reload_model(model_id):
+    """Hot-swap one model, returning (response body, status code)"""
+    if model_id not in app.config['MODEL_CONFIG']:
+        return {'error': f'Invalid model: {model_id}'}, 404
+    if app.config['MOCK_MODE']:
+        return {'error': 'Model reload is not available in mock mode'}, 400
+    
+    started = time.perf_counter()
+    if not model_manager.reload_model(model_id, drain_timeout=app.config['MODEL_RELOAD_DRAIN_SECONDS']):
+        return {'error': f'Reload of {model_id} failed; the previous version is still serving'}, 500
+    return {
+        'model_id': model_id,
+        'version': model_manager.get_model_version(model_id),
+        'seconds': round(time.perf_counter() - started, 2)
+    }, 200
+
+@app.route('/api/admin/models/<model_id>/reload', methods=['POST'])
+def admin_reload_model(model_id):
+    """Load, warm up and atomically swap in the model file currently on disk"""
+    if not admin_authorized(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Admin token required'}), 403
+    body, status_code = reload_model(model_id)
+    return jsonify(body), status_code
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def admin_list_profiles():
+    """Saved request profiles, newest first"""
+    if not admin_authorized(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Admin token required'}), 403
+    return jsonify({
+        'sample_every': request_profiler.sample_every,
+        'tf_trace': request_profiler.tf_trace,
+        'profiles': request_profiler.list_profiles()
+    })
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def admin_download_profile(profile_id):
+    """Download a profile as raw cProfile stats (?format=prof), a text summary (text) or a TF trace (tf)"""
+    if not admin_authorized(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Admin token required'}), 403
+    exported = request_profiler.export(profile_id, request.args.get('format', 'prof'))
+    if exported is None:
+        return jsonify({'error': f'Profile not found: {profile_id}'}), 404
+    filename, data, content_type = exported
+    return Response(data, content_type=content_type,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/api/inference/stats', methods=['GET'])
+def inference_stats():
+    """Queue depth and batch size statistics of the inference batcher"""
+    if inference_batcher is None:
+        return jsonify({'mode': 'mock_testing', 'batching': None})
+    return jsonify({'mode': 'live', 'batching': inference_batcher.stats()})
+
+def serving_mode():
+    """Name of the current serving mode"""
+    return 'mock_testing' if app.config['MOCK_MODE'] else 'live'
+
+def models_ready():
+    """Whether startup model loading and warmup have finished"""
+    return app.config['MOCK_MODE'] or model_manager.ready.is_set()
+
+def count_loaded_models():
+    """Number of models ready to serve requests"""
+    if app.config['MOCK_MODE']:
+        return len(app.config['MODEL_CONFIG'])
+    return len(model_manager.models)
+
+CACHE_EVENTS = ('hits', 'memory_hits', 'disk_hits', 'misses', 'stores', 'evictions')
+
+def cache_event_counts():
+    """Prediction cache counters keyed for the metrics counter"""
+    if prediction_cache is None:
+        return None
+    stats = prediction_cache.stats()
+    return {(event,): stats.get(event, 0) for event in CACHE_EVENTS}
+
+def inference_queue_depths():
+    """Per-model batcher queue depth keyed for the metrics gauge"""
+    if inference_batcher is None:
+        return None
+    return {(model_id,): stats['queue_depth'] for model_id, stats in inference_batcher.stats()['models'].items()}
+
+def model_memory_bytes():
+    """Estimated weight bytes per resident model keyed for the metrics gauge"""
+    if app.config['MOCK_MODE']:
+        return None
+    return {(model_id,): size for model_id, size in dict(model_manager.model_sizes).items()}
+
+metrics.MODELS_LOADED.set_function(count_loaded_models)
+metrics.INFERENCE_QUEUE_DEPTH.set_function(inference_queue_depths)
+metrics.MODEL_MEMORY_BYTES.set_function(model_memory_bytes)
+metrics.CACHE_EVENTS.set_function(cache_event_counts)
+
+def request_route():
+    """URL rule of the current request, so path parameters do not explode label cardinality"""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    if not app.config['METRICS_ENABLED']:
+        return
+    request.environ['metrics.started'] = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc(route=request_route())
+
+@app.after_request
+def record_request_metrics(response):
+    started = request.environ.get('metrics.started')
+    if started is not None:
+        route = request_route()
+        metrics.HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - started, route=route)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if request.environ.pop('metrics.started', None) is not None:
+        metrics.HTTP_IN_FLIGHT.dec(route=request_route())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of this process's metrics"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of the prediction cache"""
+    if prediction_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **prediction_cache.stats()})
+
 @app.route('/api/status', methods=['GET'])
 def status():
     """API status endpoint"""
-    return jsonify({
+    status_info = {
         'status': 'running',
-        'models_loaded': 3,  # Mock value
+        'models_loaded': count_loaded_models(),
         'timestamp': datetime.now().isoformat(),
-        'mode': 'mock_testing'
-    })
+        'mode': serving_mode()
+    }
+    if not app.config['MOCK_MODE']:
+        status_info['model_memory'] = model_manager.get_memory_usage()
+        status_info['model_warmup_seconds'] = {model_id: round(seconds, 2)
+                                               for model_id, seconds in model_manager.warmup_seconds.items()}
+    status_info['lazy_import_seconds'] = {name: round(seconds, 2)
+                                          for name, seconds in lazy_imports.import_seconds().items()}
+    return jsonify(status_info)
+
+def liveness():
+    """Liveness body: the process is up and serving requests, whatever the model state"""
+    return {
+        'status': 'alive',
+        'uptime_seconds': round(time.time() - metrics.PROCESS_START_TIME, 1),
+        'mode': serving_mode()
+    }
+
+def readiness():
+    """Readiness body and status code: 503 until startup model loading and warmup finish"""
+    ready = models_ready()
+    return {
+        'status': 'ready' if ready else 'warming_up',
+        'ready': ready,
+        'models_loaded': count_loaded_models(),
+        'total_models': len(app.config['MODEL_CONFIG']),
+        'mode': serving_mode()
+    }, 200 if ready else 503
+
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: restart the process only if this stops answering"""
+    return jsonify(liveness())
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: route traffic here only once it answers 200"""
+    body, status_code = readiness()
+    return jsonify(body), status_code
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
+        # Not ready (503) until warmup finishes, so load balancers skip cold workers
+        ready = models_ready()
         return jsonify({
-            'status': 'healthy',
-            'models_loaded': 3,  # Mock value
+            'status': 'healthy' if ready else 'warming_up',
+            'ready': ready,
+            'models_loaded': count_loaded_models(),
             'total_models': len(app.config['MODEL_CONFIG']),
             'upload_folder_exists': os.path.exists(app.config['UPLOAD_FOLDER']),
             'model_folder_exists': os.path.exists(app.config['MODEL_FOLDER']),
-            'mode': 'mock_testing'
-        })
+            'mode': serving_mode()
+        }), 200 if ready else 503
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         return jsonify({
@@ -276,7 +1167,7 @@ def test_endpoint():
     """Test endpoint for API connectivity"""
     return jsonify({
         'message': 'API is working!',
-        'tensorflow_version': tf.__version__,
+        'tensorflow_version': lazy_imports.module_version('tensorflow'),
         'models_initialized': True,
         'timestamp': datetime.now().isoformat()
     })
@@ -301,7 +1192,7 @@ def serve_app_js():
 def file_too_large(error):
     return jsonify({
         'error': 'File too large',
-        'max_size': f"{app.config['MAX_CONTENT_LENGTH'] / (1024*1024):.0f}MB"
+        'max_size': format_mb(request.max_content_length)
     }), 413
 
 @app.errorhandler(404)
@@ -317,12 +1208,18 @@ def internal_error(error):
 
 if __name__ == '__main__':
     logger.info("Starting AI Leaf Health Assessment Backend...")
-    logger.info(f"TensorFlow version: {tf.__version__}")
-    logger.info("Running in MOCK MODE - using simulated models for testing")
+    logger.info(f"TensorFlow version: {lazy_imports.module_version('tensorflow')}")
+    if app.config['MOCK_MODE']:
+        logger.info("Running in MOCK MODE - using simulated models for testing")
+    else:
+        logger.info(f"Running with live models ({count_loaded_models()} loaded, "
+                    f"batching up to {app.config['INFERENCE_MAX_BATCH_SIZE']} requests "
+                    f"within {app.config['INFERENCE_MAX_WAIT_MS']}ms)")
     
     # Create directories if they don't exist
     os.makedirs('uploads', exist_ok=True)
     os.makedirs('models', exist_ok=True)
+    start_model_watcher()
     
     # Start Flask app
     port = int(os.environ.get('PORT', 5000))
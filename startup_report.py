@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Cold-start report for the leaf analysis server
+Imports the server in a fresh interpreter under `python -X importtime` and
+reports import time per top-level package (flask, numpy, tensorflow, ...),
+the total import time and, with --ready, the time until startup model loading
+and warmup finish. Packages that load on first use are listed separately.
+
+Example:
+    MOCK_MODE=true python startup_report.py
+    MOCK_MODE=false MODEL_BACKGROUND_LOADING=true python startup_report.py --ready --json startup.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)$')
+RESULT_PREFIX = 'STARTUP_REPORT '
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module} as target
+import_seconds = time.perf_counter() - started
+ready_seconds = None
+if {wait_ready} and hasattr(target, 'model_manager'):
+    target.model_manager.ready.wait({timeout})
+    ready_seconds = time.perf_counter() - started
+lazy = sys.modules.get('lazy_imports')
+print({prefix!r} + json.dumps({{
+    'import_seconds': import_seconds,
+    'ready_seconds': ready_seconds,
+    'deferred': lazy.declared_modules() if lazy else {{}}
+}}), flush=True)
+"""
+
+def parse_import_times(stderr: str) -> List[Dict]:
+    """Rows of `-X importtime` output as module name and self/cumulative microseconds"""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            rows.append({
+                'module': match.group(3),
+                'self_us': int(match.group(1)),
+                'cumulative_us': int(match.group(2))
+            })
+    return rows
+
+def by_package(rows: List[Dict]) -> List[Dict]:
+    """Self time summed per top-level package, slowest first"""
+    packages: Dict[str, Dict] = {}
+    for row in rows:
+        name = row['module'].split('.')[0]
+        package = packages.setdefault(name, {'package': name, 'seconds': 0.0, 'modules': 0})
+        package['seconds'] += row['self_us'] / 1e6
+        package['modules'] += 1
+    return sorted(packages.values(), key=lambda package: package['seconds'], reverse=True)
+
+def run_probe(module: str, wait_ready: bool, timeout: float) -> Dict:
+    """Import module in a child interpreter (in the current directory, for relative model paths)"""
+    code = PROBE.format(module=module, wait_ready=wait_ready, timeout=timeout, prefix=RESULT_PREFIX)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                      env.get('PYTHONPATH')]))
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        env=env, capture_output=True, text=True, timeout=timeout + 120
+    )
+    result = next((json.loads(line[len(RESULT_PREFIX):]) for line in completed.stdout.splitlines()
+                   if line.startswith(RESULT_PREFIX)), None)
+    if completed.returncode != 0 or result is None:
+        tail = '\n'.join(line for line in completed.stderr.splitlines() if not IMPORT_LINE.match(line))[-2000:]
+        raise RuntimeError(f"Importing {module} failed (exit {completed.returncode}):\n{tail}")
+    result['packages'] = by_package(parse_import_times(completed.stderr))
+    return result
+
+def print_report(module: str, result: Dict, top: int):
+    print(f"Imported {module} in {result['import_seconds']:.2f}s")
+    if result['ready_seconds'] is not None:
+        print(f"Ready (models loaded and warmed up) after {result['ready_seconds']:.2f}s")
+    
+    total = sum(package['seconds'] for package in result['packages']) or 1.0
+    print(f"\n{'package':<28}{'import ms':>11}{'share':>8}{'modules':>9}")
+    for package in result['packages'][:top]:
+        print(f"{package['package']:<28}{package['seconds'] * 1000:>11.1f}"
+              f"{package['seconds'] / total * 100:>7.1f}%{package['modules']:>9}")
+    
+    deferred = [name for name, loaded in result['deferred'].items() if not loaded]
+    loaded = [name for name, loaded in result['deferred'].items() if loaded]
+    if deferred:
+        print(f"\nDeferred until first use: {', '.join(deferred)}")
+    if loaded:
+        print(f"Lazy but already imported during startup: {', '.join(loaded)}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Report per-package import time of a cold server start')
+    parser.add_argument('--module', default='server', help='Module to import (default: server)')
+    parser.add_argument('--ready', action='store_true',
+                        help='Also wait until startup model loading and warmup finish')
+    parser.add_argument('--timeout', type=float, default=300, help='Seconds to wait for readiness (default: 300)')
+    parser.add_argument('--top', type=int, default=20, help='Packages to list (default: 20)')
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+    args = parser.parse_args(argv)
+    
+    try:
+        result = run_probe(args.module, args.ready, args.timeout)
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print_report(args.module, result, args.top)
+    
+    if args.json:
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'module': args.module,
+            'mock_mode': os.environ.get('MOCK_MODE'),
+            **result
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.json}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
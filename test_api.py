@@ -42,6 +42,9 @@ def test_health_check():
             print(f"   Models loaded: {data.get('models_loaded')}")
             print(f"   Total models: {data.get('total_models')}")
             return True
+        elif response.status_code == 503 and response.json().get('status') == 'warming_up':
+            print("⏳ Server is up but models are still warming up; retry shortly")
+            return False
         else:
             print(f"❌ Health check failed: {response.status_code}")
             return False
@@ -166,6 +169,365 @@ def test_cors():
     except Exception as e:
         print(f"   ❌ CORS test error: {str(e)}")
 
+def test_inference_stats():
+    """Test the inference batching statistics endpoint"""
+    print("\n6. Testing Inference Stats Endpoint...")
+    try:
+        response = requests.get(f"{API_BASE_URL}/api/inference/stats")
+        if response.status_code == 200:
+            data = response.json()
+            batching = data.get('batching')
+            print(f"   ✅ Inference stats available (mode: {data.get('mode')})")
+            if batching:
+                for model_id, stats in batching.get('models', {}).items():
+                    print(f"      {model_id}: {stats['batches']} batches, "
+                          f"avg size {stats['avg_batch_size']}, queue depth {stats['queue_depth']}")
+        else:
+            print(f"   ❌ Inference stats failed: {response.status_code}")
+    except Exception as e:
+        print(f"   ❌ Inference stats error: {str(e)}")
+
+def test_prediction_cache():
+    """Test that a repeated upload is served from the prediction cache"""
+    print("\n7. Testing Prediction Cache...")
+    test_image = create_test_image()
+    try:
+        cache_headers = []
+        for _ in range(2):
+            with open(test_image, 'rb') as f:
+                response = requests.post(
+                    f"{API_BASE_URL}/api/analyze-leaf",
+                    files={'image': f},
+                    data={'model': 'model1'}
+                )
+            cache_headers.append(response.headers.get('X-Cache'))
+        
+        if cache_headers[1] == 'HIT':
+            print("   ✅ Repeated upload served from cache")
+        elif None in cache_headers:
+            print("   ⚠️  Prediction cache not active (mock mode or disabled)")
+        else:
+            print(f"   ❌ Unexpected cache headers: {cache_headers}")
+        
+        stats = requests.get(f"{API_BASE_URL}/api/cache/stats").json()
+        if stats.get('enabled'):
+            print(f"      Hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {stats['hit_rate']}")
+    except Exception as e:
+        print(f"   ❌ Prediction cache error: {str(e)}")
+
+def test_batch_endpoint():
+    """Test the multi-image batch analysis endpoint"""
+    print("\n8. Testing Batch Analyze Endpoint...")
+    test_image = create_test_image()
+    try:
+        with open(test_image, 'rb') as f:
+            image_bytes = f.read()
+        
+        # Two valid images and one corrupt one; the bad item must not fail the batch
+        files = [
+            ('images', ('leaf_a.jpg', image_bytes, 'image/jpeg')),
+            ('images', ('leaf_b.jpg', image_bytes, 'image/jpeg')),
+            ('images', ('broken.jpg', b'not an image', 'image/jpeg'))
+        ]
+        response = requests.post(
+            f"{API_BASE_URL}/api/analyze-leaf/batch",
+            files=files,
+            data={'model': 'model1'}
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            print(f"   ✅ Batch analysis returned {data['count']} results "
+                  f"({data['succeeded']} succeeded, {data['failed']} failed)")
+            for result in data['results']:
+                outcome = result.get('error') or result.get('healthStatus')
+                print(f"      {result['filename']}: {outcome}")
+        else:
+            print(f"   ❌ Batch analysis failed: {response.status_code}")
+    except Exception as e:
+        print(f"   ❌ Batch analysis error: {str(e)}")
+
+def test_stream_endpoint():
+    """Test the streaming NDJSON batch analysis endpoint"""
+    print("\n9. Testing Streaming Analyze Endpoint...")
+    test_image = create_test_image()
+    try:
+        with open(test_image, 'rb') as f:
+            image_bytes = f.read()
+        
+        files = [('images', (f'leaf_{i}.jpg', image_bytes, 'image/jpeg')) for i in range(5)]
+        response = requests.post(
+            f"{API_BASE_URL}/api/analyze-leaf/stream",
+            files=files,
+            data={'model': 'model1'},
+            stream=True
+        )
+        
+        if response.status_code != 200:
+            print(f"   ❌ Streaming analysis failed: {response.status_code}")
+            return
+        
+        results = 0
+        summary = None
+        for line in response.iter_lines():
+            if not line:
+                continue
+            record = json.loads(line)
+            if 'summary' in record:
+                summary = record['summary']
+            else:
+                results += 1
+        
+        if summary and summary['count'] == results == 5:
+            print(f"   ✅ Streamed {results} results ({summary['failed']} failed)")
+        else:
+            print(f"   ⚠️  Unexpected stream contents: {results} results, summary {summary}")
+    except Exception as e:
+        print(f"   ❌ Streaming analysis error: {str(e)}")
+
+def test_auto_model():
+    """Test that the 'auto' model picks the best match across all models"""
+    print("\n10. Testing Auto Model Selection...")
+    test_image = create_test_image()
+    try:
+        with open(test_image, 'rb') as f:
+            response = requests.post(
+                f"{API_BASE_URL}/api/analyze-leaf",
+                files={'image': f},
+                data={'model': 'auto'}
+            )
+        
+        if response.status_code != 200:
+            print(f"   ❌ Auto analysis failed: {response.status_code} {response.text}")
+            return
+        
+        result = response.json()
+        print(f"   ✅ Selected {result.get('model_id')}: {result.get('predicted_class')} ({result.get('confidence')}%)")
+        for model in result.get('models', []):
+            top = ', '.join(f"{p['class']} {p['confidence']}%" for p in model['top_predictions'])
+            print(f"      {model['model_id']}: {top}")
+    except Exception as e:
+        print(f"   ❌ Auto analysis error: {str(e)}")
+
+def test_admin_reload():
+    """Test that model reload requires the admin token and hot-swaps when given it"""
+    print("\n11. Testing Admin Model Reload...")
+    try:
+        response = requests.post(f"{API_BASE_URL}/api/admin/models/model1/reload")
+        if response.status_code == 403:
+            print("   ✅ Reload without admin token rejected")
+        else:
+            print(f"   ❌ Expected 403 without admin token, got {response.status_code}")
+        
+        admin_token = os.environ.get('ADMIN_TOKEN')
+        if not admin_token:
+            print("   ⚠️  Set ADMIN_TOKEN to also test an authorized reload")
+            return
+        
+        response = requests.post(f"{API_BASE_URL}/api/admin/models/model1/reload",
+                                 headers={'X-Admin-Token': admin_token})
+        if response.status_code == 200:
+            result = response.json()
+            print(f"   ✅ Reloaded model1 (version {result['version']}) in {result['seconds']}s")
+        else:
+            print(f"   ⚠️  Reload returned {response.status_code}: {response.json().get('error')}")
+    except Exception as e:
+        print(f"   ❌ Admin reload error: {str(e)}")
+
+def test_metrics():
+    """Test the Prometheus metrics endpoint"""
+    print("\n12. Testing Metrics Endpoint...")
+    try:
+        response = requests.get(f"{API_BASE_URL}/metrics")
+        if response.status_code != 200:
+            print(f"   ❌ Metrics failed: {response.status_code}")
+            return
+        
+        names = {line.split('{')[0].split()[0] for line in response.text.splitlines()
+                 if line and not line.startswith('#')}
+        expected = ['leaf_http_requests_total', 'leaf_http_request_duration_seconds_count', 'process_memory_bytes',
+                    'process_cpu_seconds_total']
+        missing = [name for name in expected if name not in names]
+        if missing:
+            print(f"   ❌ Metrics missing: {', '.join(missing)}")
+        else:
+            print(f"   ✅ Metrics exposed ({len(names)} series names)")
+        if 'leaf_stage_duration_seconds_count' in names:
+            print("   ✅ Pipeline stage timings recorded")
+    except Exception as e:
+        print(f"   ❌ Metrics error: {str(e)}")
+
+def test_profiling():
+    """Test that request profiling needs the admin token and captures a downloadable profile"""
+    print("\n13. Testing Request Profiling...")
+    test_image = create_test_image()
+    try:
+        with open(test_image, 'rb') as f:
+            response = requests.post(f"{API_BASE_URL}/api/analyze-leaf", files={'image': f},
+                                     data={'model': 'model1'}, headers={'X-Profile': '1'})
+        if 'X-Profile-Id' not in response.headers:
+            print("   ✅ Profile request without admin token ignored")
+        else:
+            print("   ⚠️  Request profiled without admin token (sampling may be enabled)")
+        
+        admin_token = os.environ.get('ADMIN_TOKEN')
+        if not admin_token:
+            print("   ⚠️  Set ADMIN_TOKEN to also test a profiled request")
+            return
+        
+        headers = {'X-Admin-Token': admin_token}
+        with open(test_image, 'rb') as f:
+            response = requests.post(f"{API_BASE_URL}/api/analyze-leaf", files={'image': f},
+                                     data={'model': 'model1'}, headers={**headers, 'X-Profile': '1'})
+        profile_id = response.headers.get('X-Profile-Id')
+        if not profile_id:
+            print(f"   ⚠️  No profile captured (status {response.status_code}, mock mode does not profile)")
+            return
+        
+        profiles = requests.get(f"{API_BASE_URL}/api/admin/profiles", headers=headers).json()['profiles']
+        summary = requests.get(f"{API_BASE_URL}/api/admin/profiles/{profile_id}",
+                               params={'format': 'text'}, headers=headers)
+        if any(profile['id'] == profile_id for profile in profiles) and summary.status_code == 200:
+            print(f"   ✅ Profile {profile_id} listed and downloadable")
+            print(f"      {summary.text.splitlines()[0]}")
+        else:
+            print(f"   ❌ Profile {profile_id} not available (download status {summary.status_code})")
+    except Exception as e:
+        print(f"   ❌ Profiling error: {str(e)}")
+
+def test_probes():
+    """Test the separate liveness and readiness endpoints"""
+    print("\n14. Testing Liveness and Readiness Probes...")
+    try:
+        response = requests.get(f"{API_BASE_URL}/api/health/live")
+        if response.status_code == 200 and response.json().get('status') == 'alive':
+            print(f"   ✅ Liveness probe passed (uptime {response.json().get('uptime_seconds')}s)")
+        else:
+            print(f"   ❌ Liveness probe failed: {response.status_code}")
+        
+        response = requests.get(f"{API_BASE_URL}/api/health/ready")
+        if response.status_code == 200:
+            print(f"   ✅ Readiness probe passed ({response.json().get('models_loaded')} models loaded)")
+        elif response.status_code == 503:
+            print("   ⏳ Readiness probe reports warming up")
+        else:
+            print(f"   ❌ Readiness probe failed: {response.status_code}")
+    except Exception as e:
+        print(f"   ❌ Probe error: {str(e)}")
+
+def color_metrics_test_images():
+    """Synthetic leaves from healthy to heavily diseased, in two sizes"""
+    rng = np.random.default_rng(7)
+    images = []
+    for index, (height, width) in enumerate([(96, 128)] * 4 + [(64, 64)] * 2):
+        hue = rng.integers(35, 85, size=(height, width))  # OpenCV hue range of green
+        pixels = np.stack([hue, rng.integers(60, 255, size=(height, width)),
+                           rng.integers(60, 255, size=(height, width))], axis=-1).astype(np.uint8)
+        image = Image.fromarray(pixels, 'HSV').convert('RGB')
+        # Brown, yellow and dark lesions covering more area in later images
+        array = np.array(image)
+        for spot in range(index * 3):
+            y, x = rng.integers(0, height - 12), rng.integers(0, width - 12)
+            array[y:y + 12, x:x + 12] = [(139, 69, 19), (220, 200, 40), (20, 20, 20)][spot % 3]
+        images.append(Image.fromarray(array))
+    return images
+
+def test_color_metrics_parity():
+    """Test that batch LAI and severity equal the per-image functions (runs in-process)"""
+    print("\n15. Testing Batch Colour Metrics Parity...")
+    try:
+        from model_utils import ImageProcessor, LeafImage
+        
+        images = color_metrics_test_images()
+        expected = [(ImageProcessor.calculate_leaf_area_index(LeafImage(image)),
+                     ImageProcessor.analyze_disease_severity(LeafImage(image))) for image in images]
+        
+        same_size = [image for image in images if image.size == images[0].size]
+        lai, severity = ImageProcessor.analyze_color_metrics_batch(np.stack([np.asarray(image) for image in same_size]))
+        stacked = [(float(value), int(percent)) for value, percent in zip(lai, severity)]
+        
+        leaf_images = [LeafImage(image) for image in images]
+        ImageProcessor.fill_color_metrics(leaf_images, max_stack=3)
+        filled = [(leaf_image.metrics['leaf_area_index'], leaf_image.metrics['disease_severity'])
+                  for leaf_image in leaf_images]
+        
+        if stacked == expected[:len(same_size)] and filled == expected:
+            print(f"   ✅ Batch results match per-image results on {len(images)} images: {expected}")
+            return True
+        print(f"   ❌ Mismatch: per-image {expected}, stacked {stacked}, filled {filled}")
+        return False
+    except Exception as e:
+        print(f"   ❌ Parity check error: {str(e)}")
+        return False
+
+def test_model_snapshot_nested():
+    """Test that a backbone nested in a Sequential loads from its snapshot (runs in-process)"""
+    print("\n16. Testing Model Snapshot of a Nested Model...")
+    try:
+        import tempfile
+        import tensorflow as tf
+        from model_utils import ModelManager, ModelSnapshot
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'nested.h5')
+            backbone = tf.keras.applications.MobileNetV2(input_shape=(96, 96, 3), alpha=0.35,
+                                                         include_top=False, weights=None, pooling='avg')
+            model = tf.keras.Sequential([tf.keras.Input((96, 96, 3)), backbone,
+                                         tf.keras.layers.Dense(4, activation='softmax')])
+            inputs = np.random.default_rng(3).random((2, 96, 96, 3), dtype=np.float32)
+            # Non-default batch-norm statistics, so a mixed-up weight order changes the output
+            model.predict_on_batch(inputs)
+            for layer in backbone.layers:
+                if isinstance(layer, tf.keras.layers.BatchNormalization):
+                    layer.moving_variance.assign(np.full(layer.moving_variance.shape, 2.0, dtype=np.float32))
+            model.save(path)
+            expected = model.predict_on_batch(inputs)
+            
+            manager = ModelManager({'nested': {'name': 'Nested', 'model_path': path, 'image_size': (96, 96),
+                                               'classes': ['a_healthy', 'a_b', 'a_c', 'a_d']}}, lazy=True)
+            manager.snapshot_models()
+            snapshot = manager.snapshots.get('nested')
+            built = snapshot.build() if snapshot is not None else None
+            difference = float(np.abs(np.asarray(built.predict_on_batch(inputs)) - expected).max()) if built else None
+            
+            # A snapshot that cannot be built falls back to loading the file
+            manager.snapshots['nested'] = ModelSnapshot(path, 'keras', snapshot.version,
+                                                        architecture=snapshot.architecture, layer_weights={})
+            fallback = manager.get_model('nested')
+        
+        if difference is not None and difference < 1e-5 and fallback is not None:
+            print(f"   ✅ Snapshot matches the saved model (max diff {difference:.1e}); broken snapshots fall back")
+            return True
+        print(f"   ❌ Snapshot diff {difference}, fallback loaded: {fallback is not None}")
+        return False
+    except Exception as e:
+        print(f"   ❌ Snapshot check error: {str(e)}")
+        return False
+
+def test_auto_selection_score():
+    """Test that auto selection does not favour models with few classes (runs in-process)"""
+    print("\n17. Testing Auto Model Selection Across Class Counts...")
+    try:
+        from model_utils import PredictionAnalyzer
+        
+        # Stub outputs: an unsure two-class model and a confident 38-class model
+        two_class = np.array([[0.55, 0.45]])
+        many_class = np.full((1, 38), 0.5 / 37)
+        many_class[0, 7] = 0.5
+        predictions = {'two_class': two_class, 'many_class': many_class}
+        
+        scores = {model_id: PredictionAnalyzer.selection_score(output[0]) for model_id, output in predictions.items()}
+        best = max(scores, key=scores.get)
+        raw_best = max(predictions, key=lambda model_id: float(np.max(predictions[model_id][0])))
+        if best == 'many_class' and raw_best == 'two_class' and abs(scores['two_class'] - 0.1) < 1e-9:
+            print(f"   ✅ Picked the 38-class model over the unsure two-class one: {scores}")
+            return True
+        print(f"   ❌ Picked {best} with scores {scores}")
+        return False
+    except Exception as e:
+        print(f"   ❌ Selection score error: {str(e)}")
+        return False
+
 def main():
     """Main test function"""
     print("🧪 AI Leaf Health Assessment API Test Suite")
@@ -191,6 +553,18 @@ def main():
         test_analyze_endpoint(available_models)
         test_error_handling()
         test_cors()
+        test_inference_stats()
+        test_prediction_cache()
+        test_batch_endpoint()
+        test_stream_endpoint()
+        test_auto_model()
+        test_admin_reload()
+        test_metrics()
+        test_profiling()
+        test_probes()
+    test_color_metrics_parity()
+    test_model_snapshot_nested()
+    test_auto_selection_score()
     
     print("\n" + "=" * 50)
     print("🏁 Test suite completed!")